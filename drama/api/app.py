@@ -11,7 +11,12 @@ from drama import __version__
 from drama.api.routes.workflow import router
 from drama.api.security import get_api_key
 from drama.config import settings
-from drama.database import close_db_connection, create_db_connection
+from drama.database import (
+    close_async_db_connection,
+    close_db_connection,
+    create_async_db_connection,
+    create_db_connection,
+)
 from drama.logger import get_logger
 
 app = FastAPI(
@@ -25,7 +30,9 @@ app = FastAPI(
 # events
 
 app.add_event_handler("startup", create_db_connection)
+app.add_event_handler("startup", create_async_db_connection)
 app.add_event_handler("shutdown", close_db_connection)
+app.add_event_handler("shutdown", close_async_db_connection)
 
 
 # cors settings
@@ -0,0 +1,49 @@
+import hashlib
+import time
+from typing import Hashable, List, Optional, Tuple
+
+from drama.servo import LRUCache
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of serialized responses (along with their ETag) which expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.ttl = ttl
+        self._responses = LRUCache(maxsize)
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, bytes]]:
+        """
+        Returns `(etag, body)` of cached response, or `None` if not cached (or expired).
+        """
+        cached = self._responses.get(key)
+        if cached is None or cached[0] < time.monotonic():
+            return None
+        return cached[1], cached[2]
+
+    def put(self, key: Hashable, etag: str, body: bytes) -> None:
+        self._responses.put(key, (time.monotonic() + self.ttl, etag, body))
+
+    def invalidate(self, key: Hashable) -> None:
+        self._responses.pop(key)
+
+
+def compute_etag(*versions) -> str:
+    """
+    Returns strong entity tag from the versions of a resource.
+    """
+    digest = hashlib.sha1(":".join(str(version) for version in versions).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """
+    Checks `etag` against the (comma-separated) tags of an `If-None-Match` header, using weak comparison.
+    """
+    if not if_none_match:
+        return False
+
+    tags: List[str] = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
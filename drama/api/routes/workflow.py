@@ -1,21 +1,47 @@
 import math
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from kafka import KafkaConsumer, KafkaProducer
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from kafka import KafkaConsumer
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
 
+from drama.api.cache import ResponseCache, compute_etag, etag_matches
 from drama.config import settings
-from drama.database import get_db_connection
+from drama.database import get_async_db_connection, get_db_connection
 from drama.logger import get_logger
-from drama.manager import TaskManager, WorkflowManager
+from drama.manager import AsyncEventManager, AsyncTaskManager, AsyncWorkflowManager
 from drama.models.workflow import *
+from drama.transport.helpers import get_available_transport
+from drama.worker.dag import CyclicWorkflowError, DuplicateTaskError, MissingInputError
 from drama.worker.scheduler import Scheduler
 
 logger = get_logger(__name__)
 
 router = APIRouter()
 
+TERMINAL_WORKFLOW_STATUSES = (WorkflowStatus.STATUS_DONE, WorkflowStatus.STATUS_FAILED, WorkflowStatus.STATUS_REVOKED)
+
+# responses of finished workflows, which (almost) never change
+status_cache = ResponseCache(maxsize=settings.STATUS_CACHE_SIZE, ttl=settings.STATUS_CACHE_TTL)
+
+
+def _is_settled(workflow: WorkflowInDb) -> bool:
+    """
+    Checks if `workflow` finished and none of its tasks are still pending or running. Failed and revoked
+    workflows finish as soon as one of their tasks fails or they are revoked, but their tasks keep changing.
+    """
+    if workflow.status not in TERMINAL_WORKFLOW_STATUSES:
+        return False
+
+    return all(
+        workflow.task_counts.get(TaskStatus(task_status).value, 0) <= 0
+        for task_status in (TaskStatus.STATUS_PENDING, TaskStatus.STATUS_RUNNING)
+    )
+
 
 @router.post(
     "/run",
@@ -23,7 +49,7 @@ router = APIRouter()
     tags=["workflow"],
     response_model=WorkflowInDb,
     response_model_exclude_unset=True,
-    responses={400: {"description": "x-token header invalid"}},
+    responses={400: {"description": "x-token header invalid or workflow is not valid"}},
 )
 async def run(workflow_request: Workflow) -> WorkflowInDb:
     """
@@ -31,7 +57,11 @@ async def run(workflow_request: Workflow) -> WorkflowInDb:
     """
     logger.info("Received workflow request")
     with Scheduler() as scheduler:
-        w = scheduler.run(workflow_request)
+        try:
+            # scheduler blocks on database and broker, so it runs outside the event loop
+            w = await run_in_threadpool(scheduler.run, workflow_request)
+        except (CyclicWorkflowError, MissingInputError, DuplicateTaskError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
     return w
 
 
@@ -40,25 +70,141 @@ async def run(workflow_request: Workflow) -> WorkflowInDb:
     name="Get workflow execution status",
     tags=["workflow"],
     response_model=WorkflowInDb,
-    responses={400: {"description": "x-token header invalid"}},
+    responses={304: {"description": "Workflow not modified"}, 400: {"description": "x-token header invalid"}},
 )
 async def status(
     id: str,
-    db=Depends(get_db_connection),
-) -> WorkflowInDb:
+    if_none_match: Optional[str] = Header(None),
+    db=Depends(get_async_db_connection),
+) -> Response:
     """
     Returns execution status from execution id.
+    Responses carry an `ETag`, so that clients can poll with `If-None-Match` and get `304` while nothing changes.
     """
-    workflow = WorkflowManager(db).find_one(id=id)
+    cached = status_cache.get(id)
+    if cached:
+        etag, body = cached
+        if etag_matches(etag, if_none_match):
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
-    if not workflow:
+    workflow_in_db = await AsyncWorkflowManager(db).find_one_raw(id=id)
+
+    if not workflow_in_db:
         raise HTTPException(status_code=404, detail=f"Workflow {id} not found")
     else:
         logger.info(f"Found workflow from execution id {id}")
 
-    workflow.tasks = TaskManager(db).find(parent=id)
+    # every task transition bumps the version of task counters
+    etag = compute_etag(
+        workflow_in_db.get("updated_at"), workflow_in_db.get("task_counts_seq"), workflow_in_db.get("is_revoked")
+    )
+    if etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers={"ETag": etag})
 
-    return workflow
+    workflow = WorkflowInDb(**workflow_in_db)
+    workflow.tasks = await AsyncTaskManager(db).find(parent=id)
+
+    response = JSONResponse(content=jsonable_encoder(workflow), headers={"ETag": etag})
+
+    if _is_settled(workflow):
+        status_cache.put(id, etag, response.body)
+
+    return response
+
+
+@router.get(
+    "/events",
+    name="Stream workflow status changes",
+    tags=["workflow"],
+    responses={400: {"description": "x-token header invalid or event id is not valid"}},
+)
+async def events(
+    id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    db=Depends(get_async_db_connection),
+) -> StreamingResponse:
+    """
+    Streams task (and resulting workflow) status transitions as Server-Sent Events, until the workflow finishes.
+    Clients resume from the last received event thought the `Last-Event-ID` header, which browsers send on reconnection.
+    """
+    workflow = await AsyncWorkflowManager(db).find_one(id=id, projection=["status"])
+
+    if not workflow:
+        raise HTTPException(status_code=404, detail=f"Workflow {id} not found")
+
+    following = AsyncEventManager(db).follow(workflow_id=id, last_event_id=last_event_id)
+
+    try:
+        # checks event id before the response starts
+        first_event = await following.__anext__()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def _stream():
+        event = first_event
+        while True:
+            if event is None:
+                # every event of finished workflows has already been sent
+                if workflow.status in TERMINAL_WORKFLOW_STATUSES or await request.is_disconnected():
+                    break
+                # comment lines keep idle connections open
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {event.seq}\nevent: transition\ndata: {event.json(exclude={'seq'})}\n\n"
+                if event.workflow_status in TERMINAL_WORKFLOW_STATUSES:
+                    break
+            event = await following.__anext__()
+        await following.aclose()
+
+    return StreamingResponse(_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get(
+    "/list",
+    name="List workflows",
+    tags=["workflow"],
+    response_model=WorkflowPage,
+    response_model_exclude_unset=True,
+    responses={400: {"description": "x-token header invalid or cursor is not valid"}},
+)
+async def list_workflows(
+    author: Optional[str] = None,
+    label: Optional[str] = None,
+    status: Optional[WorkflowStatus] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    fields: Optional[List[str]] = Query(None),
+    db=Depends(get_async_db_connection),
+) -> WorkflowPage:
+    """
+    Lists workflows (without their tasks), newest first. Results are paginated: pass the returned `next_cursor`
+    as `cursor` to get the next page. Use `fields` to only include some fields of workflows.
+    """
+    query = {}
+    if author:
+        query["metadata.author"] = author
+    if label:
+        query["labels"] = label
+    if status:
+        query["status"] = status.value
+
+    try:
+        workflows, next_cursor = await AsyncWorkflowManager(db).find_page(
+            limit=limit,
+            cursor=cursor,
+            projection=fields,
+            created_after=created_after,
+            created_before=created_before,
+            **query,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return WorkflowPage(workflows=workflows, next_cursor=next_cursor)
 
 
 @router.post(
@@ -71,12 +217,12 @@ async def status(
 )
 async def cancel_or_revoke(
     id: str,
-    db=Depends(get_db_connection),
+    db=Depends(get_async_db_connection),
 ) -> WorkflowInDb:
     """
     Revokes the execution of a workflow, i.e., cancel the execution of pending tasks.
     """
-    workflow = WorkflowManager(db).find_one(id=id)
+    workflow = await AsyncWorkflowManager(db).find_one(id=id)
 
     if not workflow:
         raise HTTPException(status_code=404, detail=f"Workflow {id} not found")
@@ -84,8 +230,9 @@ async def cancel_or_revoke(
         logger.info(f"Found workflow from execution id {id}")
 
     if not workflow.is_revoked:
+        status_cache.invalidate(id)
         with Scheduler() as scheduler:
-            workflow = scheduler.revoke(workflow_id=workflow.id)
+            workflow = await run_in_threadpool(scheduler.revoke, workflow_id=workflow.id)
 
     return workflow
 
@@ -105,6 +252,10 @@ async def component(
     """
     Sends a message though a Kafka topic. Useful for components that reads from a Kafka topic to allow interactivity from the user.
     """
-    producer = KafkaProducer(bootstrap_servers=[settings.KAFKA_CONN])
-    producer.send(topic=f"{id}-{component}", value=bytes(message, "utf-8"))
-    producer.close()
+    transport = get_available_transport()
+
+    def _send():
+        transport.send(topic=f"{id}-{component}", key=None, value=bytes(message, "utf-8"))
+        transport.flush()
+
+    await run_in_threadpool(_send)
@@ -18,8 +18,7 @@ def execute(pcs: Process, **kwargs):
     input_file_delimiter = input_file["delimiter"]
     input_file_resource = input_file["resource"]
 
-    filepath = pcs.storage.get_file(input_file_resource)
-
-    with open(filepath, "r") as reader:
+    # rows are streamed from storage instead of downloading the whole file first
+    with pcs.storage.open(input_file_resource, "r", encoding=input_file.get("encoding")) as reader:
         for row in csv.reader(reader, delimiter=input_file_delimiter):
             pcs.info(row)
@@ -1,15 +1,21 @@
+from typing import TYPE_CHECKING
+
 from dramatiq import get_logger
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient
 from pymongo.database import Database
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo.errors import CollectionInvalid, ServerSelectionTimeoutError
 
 from drama.config import settings
 
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
 logger = get_logger(__name__)
 
 
 class DataBase:
     client: MongoClient = None
+    async_client: "AsyncIOMotorClient" = None
 
 
 db = DataBase()
@@ -25,10 +31,44 @@ def create_db_connection() -> Database:
         raise ConnectionError(f"Could not connect to database with connection string {settings.MONGO_DNS}")
 
     db.client = client
+    ensure_indexes(db.client.titan)
 
     return db.client.titan
 
 
+def ensure_indexes(database: Database) -> None:
+    """
+    Creates the indexes required by managers, unless they already exist.
+    """
+    database.dramatask.create_index("id", unique=True)
+    database.dramatask.create_index("parent")
+    database.dramatask.create_index("status")
+    database.dramatask.create_index("created_at")
+    # mean durations are aggregated per module over done tasks, whose dates are also kept in the index
+    database.dramatask.create_index(
+        [("module", ASCENDING), ("status", ASCENDING), ("started_at", ASCENDING), ("updated_at", ASCENDING)]
+    )
+
+    database.dramaworkflow.create_index("id", unique=True)
+
+    # listings are sorted by (created_at, id) keys, optionally filtered by status, author or label
+    listing_keys = [("created_at", DESCENDING), ("id", DESCENDING)]
+    database.dramaworkflow.create_index(listing_keys)
+    database.dramaworkflow.create_index([("status", ASCENDING), *listing_keys])
+    database.dramaworkflow.create_index([("metadata.author", ASCENDING), *listing_keys])
+    database.dramaworkflow.create_index([("labels", ASCENDING), *listing_keys])
+
+    database.dramaschema.create_index("id", unique=True)
+
+    # events are read with tailable cursors, which require a capped collection (and do not use indexes)
+    if "dramaevent" not in database.list_collection_names():
+        try:
+            database.create_collection("dramaevent", capped=True, size=settings.EVENTS_CAPPED_SIZE)
+        except CollectionInvalid:
+            # created by another process in the meantime
+            pass
+
+
 def close_db_connection() -> None:
     logger.debug("Clossing connection with database")
     db.client.close()
@@ -39,3 +79,28 @@ def get_db_connection() -> Database:
         logger.debug("Client not connected")
         create_db_connection()
     return db.client.titan
+
+
+def create_async_db_connection() -> "AsyncIOMotorDatabase":
+    # only the api requires motor, workers use blocking clients
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    logger.debug("Connecting to database (asyncio) for the first time")
+    # connection is lazily established by the first operation, so this does not block the event loop
+    db.async_client = AsyncIOMotorClient(settings.MONGO_DNS)
+
+    return db.async_client.titan
+
+
+def close_async_db_connection() -> None:
+    logger.debug("Clossing connection (asyncio) with database")
+    if db.async_client:
+        db.async_client.close()
+        db.async_client = None
+
+
+def get_async_db_connection() -> "AsyncIOMotorDatabase":
+    if not db.async_client:
+        logger.debug("Client (asyncio) not connected")
+        create_async_db_connection()
+    return db.async_client.titan
@@ -1,6 +1,7 @@
-from dataclasses import MISSING, Field, asdict, dataclass, field
+import weakref
+from dataclasses import MISSING, Field, dataclass, field
 from enum import Enum
-from typing import List, Optional, Type, Union
+from typing import Any, Callable, List, Optional, Tuple, Type, Union
 
 
 class AtomicType(Enum):
@@ -87,12 +88,80 @@ def _as_dict(field: Field) -> dict:
     return v
 
 
+def _datatype(data: Union[DataType, Type[DataType]]) -> Type[DataType]:
+    """
+    Returns the class of the data type, whether `data` is an instance or the class itself.
+    """
+    return data if isinstance(data, type) else type(data)
+
+
+# field extractors are computed once per data type class
+_extractors: "weakref.WeakKeyDictionary[type, List[Tuple[str, Callable[[Any], Any]]]]" = weakref.WeakKeyDictionary()
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _get_dict_or_none(value: Optional[DataType]) -> Optional[dict]:
+    return get_dict(value) if value is not None else None
+
+
+def _get_dicts(values: Optional[list]) -> Optional[list]:
+    return [get_dict(value) for value in values] if values is not None else None
+
+
+def _extractor(datatype: Type[DataType]) -> List[Tuple[str, Callable[[Any], Any]]]:
+    """
+    Returns a list of (field name, converter) pairs for the data type.
+    Only nested data types are converted, the rest of values are taken as they are.
+    """
+    extractor = _extractors.get(datatype)
+
+    if extractor is None:
+        extractor = []
+        for _field in _fields(datatype).values():
+            field_type = _field.metadata.get("type")
+            if field_type == AtomicType.List and not isinstance(_field.metadata["items"], AtomicType):
+                extractor.append((_field.name, _get_dicts))
+            elif field_type == DataType:
+                extractor.append((_field.name, _get_dict_or_none))
+            else:
+                extractor.append((_field.name, _identity))
+        _extractors[datatype] = extractor
+
+    return extractor
+
+
 def get_dict(data: DataType) -> dict:
     """
     Returns a dictionary associated with the data type.
+    Unlike `dataclasses.asdict`, values are not deep-copied.
     :returns: Dictionary of the class.
     """
-    return asdict(data)
+    return {name: convert(getattr(data, name)) for name, convert in _extractor(type(data))}
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, str):
+        # e.g., string enums
+        return str.__str__(value)
+    if not isinstance(value, (bytes, bool, int, float)) and hasattr(value, "encode"):
+        # objects written to string fields are encoded by Avro, e.g., resources
+        return value.encode().decode()
+    return value
+
+
+def get_plain_dict(data: DataType) -> dict:
+    """
+    Returns a dictionary of the data type as deserialized from Avro, i.e., containers are copied and objects
+    in string fields (such as resources) are converted to strings.
+    """
+    return _plain(get_dict(data))
 
 
 def _get_fields_schema(fields: dict) -> list:
@@ -108,23 +177,38 @@ def _get_fields_schema(fields: dict) -> list:
     return _fields
 
 
-def get_schema(data: DataType) -> dict:
+# generated schemas are cached per data type class, along with the configuration they were generated from
+_schemas: "weakref.WeakKeyDictionary[type, Tuple[tuple, dict]]" = weakref.WeakKeyDictionary()
+
+
+def get_schema(data: Union[DataType, Type[DataType]]) -> dict:
     """
     Returns the Avro schema associated with the DataType.
+    Schemas only depend on the class, hence they are generated once and cached until its `Config` changes.
     :returns: Avro Schema of the class.
     """
-    schema = getattr(data.Config, "schema", None)
+    datatype = _datatype(data)
+
+    schema = getattr(datatype.Config, "schema", None)
     if schema:
         return schema
 
-    fields: dict = _fields(data)
+    config = (getattr(datatype.Config, "namespace", None), getattr(datatype.Config, "name", None))
+
+    cached = _schemas.get(datatype)
+    if cached is not None and cached[0] == config:
+        return cached[1]
+
+    fields: dict = _fields(datatype)
     fields_schema = _get_fields_schema(fields)
 
     schema = dict(
-        namespace=getattr(data.Config, "namespace", None) or data.__module__,
-        name=getattr(data.Config, "name", None) or data.__class__.__name__,
+        namespace=config[0] or datatype.__module__,
+        name=config[1] or datatype.__name__,
         type="record",
         fields=fields_schema,
     )
 
+    _schemas[datatype] = (config, schema)
+
     return schema
@@ -1,10 +1,21 @@
+import asyncio
+import base64
+import json
 from abc import ABC
-from typing import List, Optional, Tuple
+from collections import defaultdict
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Dict, List, Optional, Set, Tuple
 
+from pymongo import ASCENDING, DESCENDING, CursorType, ReturnDocument, UpdateOne
 from pymongo.database import Database
 
-from drama.database import get_db_connection
-from drama.models.workflow import TaskInDb, WorkflowInDb
+from drama.config import settings
+from drama.database import get_async_db_connection, get_db_connection
+from drama.models.task import TaskStatus
+from drama.models.workflow import TaskInDb, WorkflowEvent, WorkflowInDb, WorkflowStatus
+
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorDatabase
 
 
 class _BaseManager(ABC):
@@ -15,29 +26,64 @@ class _BaseManager(ABC):
     def __init__(self, db: Optional[Database] = None):
         self.database = db or get_db_connection()
 
+    @staticmethod
+    def _projection(fields: Optional[List[str]]) -> Optional[dict]:
+        """
+        Returns projection which only includes `fields` (and the `id`), or `None` to return whole documents.
+        """
+        if fields is None:
+            return None
+        return {"_id": False, "id": True, **{field: True for field in fields}}
+
+
+class _AsyncBaseManager(ABC):
+    """
+    Base manager with asyncio database connection, for use within the event loop.
+    """
+
+    def __init__(self, db: Optional["AsyncIOMotorDatabase"] = None):
+        self.database = db or get_async_db_connection()
+
+    _projection = staticmethod(_BaseManager._projection)
+
 
 class TaskManager(_BaseManager):
-    def find(self, **query):
+    def find(self, projection: Optional[List[str]] = None, **query) -> List[TaskInDb]:
         """
         Get task(s) from database based on `query`.
+        Only `projection` fields are retrieved if given.
         """
-        tasks: dict = self.database.dramatask.find(query)
         tasks_in_db = []
 
-        for task in tasks:
+        for task in self.find_raw(projection, **query):
             tasks_in_db.append(TaskInDb(**task))
 
         return tasks_in_db
 
-    def find_one(self, **query):
+    def find_raw(self, projection: Optional[List[str]] = None, **query) -> List[dict]:
+        """
+        Get task(s) from database based on `query`, as they are stored (i.e., without validation). See `find`.
+        """
+        return list(self.database.dramatask.find(query, projection=self._projection(projection)))
+
+    def find_one(self, projection: Optional[List[str]] = None, **query) -> Optional[TaskInDb]:
         """
         Get task from database based on `query`.
+        Only `projection` fields are retrieved if given.
         """
-        task_in_db: dict = self.database.dramatask.find_one(query)
+        task_in_db = self.find_one_raw(projection, **query)
 
         if task_in_db:
             return TaskInDb(**task_in_db)
 
+        return None
+
+    def find_one_raw(self, projection: Optional[List[str]] = None, **query) -> Optional[dict]:
+        """
+        Get task from database based on `query`, as it is stored (i.e., without validation). See `find_one`.
+        """
+        return self.database.dramatask.find_one(query, projection=self._projection(projection))
+
     def create_or_update_from_id(self, task_id: str, **extra_fields) -> TaskInDb:
         """
         Create (or update with `extra_fields`) task from database based on unique `task_id`.
@@ -53,19 +99,98 @@ class TaskManager(_BaseManager):
 
         return task
 
+    def update_status(self, task_id: str, status: TaskStatus, **extra_fields) -> Optional[TaskInDb]:
+        """
+        Sets task `status` (along with `extra_fields`) and returns the task as it was *before* the update,
+        so that callers know both the previous status and the workflow of the task within a single round trip.
+        """
+        task = TaskInDb(id=task_id, status=status, **extra_fields)
+
+        task_in_db = self.database.dramatask.find_one_and_update(
+            {"id": task_id},
+            {"$set": task.dict(exclude_unset=True)},
+            projection=self._projection(["name", "parent", "status"]),
+            return_document=ReturnDocument.BEFORE,
+        )
+
+        if task_in_db:
+            return TaskInDb(**task_in_db)
+
+        return None
+
+    def bulk_create_or_update(self, tasks: List[TaskInDb], extra_fields: Optional[Dict[str, dict]] = None) -> None:
+        """
+        Create (or update) `tasks` within a single round trip. `extra_fields` maps task ids to fields which
+        are stored along with the task but are not part of its model (e.g., held messages).
+        """
+        extra_fields = extra_fields or {}
+
+        requests = [
+            UpdateOne(
+                {"id": task.id},
+                {"$set": {**task.dict(exclude_unset=True), **extra_fields.get(task.id, {})}},
+                upsert=True,
+            )
+            for task in tasks
+        ]
+
+        if requests:
+            self.database.dramatask.bulk_write(requests, ordered=False)
+
+    def release(self, parent: str, upstream_name: str) -> List[dict]:
+        """
+        Marks task `upstream_name` from workflow `parent` as started, and returns the held messages of
+        those tasks which are no longer waiting for any other task.
+        Releasing the same task again (e.g., on retries) has no effect.
+        """
+        ready = []
+
+        for task in self.find_raw(parent=parent, pending_upstream=upstream_name, projection=[]):
+            # only one update can remove the last upstream task, hence every message is returned once
+            task_in_db = self.database.dramatask.find_one_and_update(
+                {"id": task["id"], "pending_upstream": upstream_name},
+                {"$pull": {"pending_upstream": upstream_name}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if task_in_db and not task_in_db["pending_upstream"]:
+                ready.append(task_in_db["message"])
+
+        return ready
+
+    def mean_durations(self, modules: List[str]) -> Dict[str, float]:
+        """
+        Returns mean duration (in seconds) of successfully executed tasks per module.
+        """
+        pipeline = [
+            {"$match": {"module": {"$in": modules}, "status": TaskStatus.STATUS_DONE, "started_at": {"$ne": None}}},
+            {"$group": {"_id": "$module", "duration": {"$avg": {"$subtract": ["$updated_at", "$started_at"]}}}},
+        ]
+
+        # subtracting dates returns milliseconds
+        return {
+            duration["_id"]: duration["duration"] / 1000 for duration in self.database.dramatask.aggregate(pipeline)
+        }
+
 
 class WorkflowManager(_BaseManager):
-    def find_one(self, **query) -> Optional[WorkflowInDb]:
+    def find_one(self, projection: Optional[List[str]] = None, **query) -> Optional[WorkflowInDb]:
         """
         Get workflow from database based on `query`.
+        Only `projection` fields are retrieved if given.
         """
-        workflow_in_db: dict = self.database.dramaworkflow.find_one(query)
+        workflow_in_db = self.find_one_raw(projection, **query)
 
         if workflow_in_db:
             return WorkflowInDb(**workflow_in_db)
 
         return None
 
+    def find_one_raw(self, projection: Optional[List[str]] = None, **query) -> Optional[dict]:
+        """
+        Get workflow from database based on `query`, as it is stored (i.e., without validation). See `find_one`.
+        """
+        return self.database.dramaworkflow.find_one(query, projection=self._projection(projection))
+
     def create_or_update_from_id(self, workflow_id: str, **extra_fields) -> WorkflowInDb:
         """
         Create (or update with `extra_fields`) workflow from database based on unique `workflow_id`.
@@ -80,3 +205,215 @@ class WorkflowManager(_BaseManager):
         )
 
         return workflow
+
+    def count_tasks(
+        self,
+        workflow_id: str,
+        from_status: Optional[TaskStatus] = None,
+        to_status: Optional[TaskStatus] = None,
+        amount: int = 1,
+    ) -> Tuple[Optional[WorkflowInDb], int]:
+        """
+        Atomically moves `amount` tasks of workflow from `from_status` to `to_status` in its task counters.
+        Returns updated workflow along with the version of its counters.
+        """
+        counters: Dict[str, int] = defaultdict(int)
+        if from_status:
+            counters[f"task_counts.{TaskStatus(from_status).value}"] -= amount
+        if to_status:
+            counters[f"task_counts.{TaskStatus(to_status).value}"] += amount
+
+        workflow_in_db = self.database.dramaworkflow.find_one_and_update(
+            {"id": workflow_id},
+            {"$inc": {**counters, "task_counts_seq": 1}},
+            projection=self._projection(["is_revoked", "task_counts", "task_counts_seq"]),
+            return_document=ReturnDocument.AFTER,
+        )
+
+        if workflow_in_db:
+            return WorkflowInDb(**workflow_in_db), workflow_in_db["task_counts_seq"]
+
+        return None, 0
+
+    def set_status(self, workflow_id: str, status: WorkflowStatus, seq: int) -> bool:
+        """
+        Sets workflow `status`, derived from version `seq` of its task counters, unless a status derived
+        from a later version was already set. Returns whether the status was set.
+        """
+        result = self.database.dramaworkflow.update_one(
+            {"id": workflow_id, "status_seq": {"$not": {"$gte": seq}}},
+            {"$set": {"status": status, "status_seq": seq, "updated_at": datetime.now()}},
+        )
+
+        return result.modified_count > 0
+
+
+class EventManager(_BaseManager):
+    def publish(self, event: WorkflowEvent) -> None:
+        """
+        Publishes `event` to clients watching its workflow.
+        """
+        self.database.dramaevent.insert_one(event.dict())
+
+
+class AsyncTaskManager(_AsyncBaseManager):
+    async def find(self, projection: Optional[List[str]] = None, **query) -> List[TaskInDb]:
+        """
+        Get task(s) from database based on `query`. See `TaskManager.find`.
+        """
+        return [TaskInDb(**task) for task in await self.find_raw(projection, **query)]
+
+    async def find_raw(self, projection: Optional[List[str]] = None, **query) -> List[dict]:
+        """
+        Get task(s) from database based on `query`. See `TaskManager.find_raw`.
+        """
+        cursor = self.database.dramatask.find(query, projection=self._projection(projection))
+        return await cursor.to_list(length=None)
+
+    async def find_one(self, projection: Optional[List[str]] = None, **query) -> Optional[TaskInDb]:
+        """
+        Get task from database based on `query`. See `TaskManager.find_one`.
+        """
+        task_in_db = await self.find_one_raw(projection, **query)
+
+        if task_in_db:
+            return TaskInDb(**task_in_db)
+
+        return None
+
+    async def find_one_raw(self, projection: Optional[List[str]] = None, **query) -> Optional[dict]:
+        """
+        Get task from database based on `query`. See `TaskManager.find_one_raw`.
+        """
+        return await self.database.dramatask.find_one(query, projection=self._projection(projection))
+
+
+class AsyncWorkflowManager(_AsyncBaseManager):
+    async def find_one(self, projection: Optional[List[str]] = None, **query) -> Optional[WorkflowInDb]:
+        """
+        Get workflow from database based on `query`. See `WorkflowManager.find_one`.
+        """
+        workflow_in_db = await self.find_one_raw(projection, **query)
+
+        if workflow_in_db:
+            return WorkflowInDb(**workflow_in_db)
+
+        return None
+
+    async def find_one_raw(self, projection: Optional[List[str]] = None, **query) -> Optional[dict]:
+        """
+        Get workflow from database based on `query`. See `WorkflowManager.find_one_raw`.
+        """
+        return await self.database.dramaworkflow.find_one(query, projection=self._projection(projection))
+
+    async def find_page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        projection: Optional[List[str]] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        **query,
+    ) -> Tuple[List[WorkflowInDb], Optional[str]]:
+        """
+        Get up to `limit` workflows based on `query`, newest first, along with the cursor of the next page
+        (if any). Pages are delimited by `(created_at, id)` keys instead of offsets, so that every page
+        is served from indexes regardless of its position.
+        """
+        if created_after or created_before:
+            query["created_at"] = {
+                **({"$gte": created_after} if created_after else {}),
+                **({"$lt": created_before} if created_before else {}),
+            }
+
+        if cursor:
+            created_at, workflow_id = self._decode_cursor(cursor)
+            query = {
+                "$and": [
+                    query,
+                    {
+                        "$or": [
+                            {"created_at": {"$lt": created_at}},
+                            {"created_at": created_at, "id": {"$lt": workflow_id}},
+                        ]
+                    },
+                ]
+            }
+
+        if projection is not None:
+            projection = [*projection, "created_at"]
+
+        workflows_in_db = (
+            await self.database.dramaworkflow.find(query, projection=self._projection(projection))
+            .sort([("created_at", DESCENDING), ("id", DESCENDING)])
+            .limit(limit + 1)
+            .to_list(length=limit + 1)
+        )
+
+        next_cursor = None
+        if len(workflows_in_db) > limit:
+            workflows_in_db = workflows_in_db[:limit]
+            next_cursor = self._encode_cursor(workflows_in_db[-1]["created_at"], workflows_in_db[-1]["id"])
+
+        return [WorkflowInDb(**workflow) for workflow in workflows_in_db], next_cursor
+
+    @staticmethod
+    def _encode_cursor(created_at: datetime, workflow_id: str) -> str:
+        key = json.dumps([created_at.isoformat(), workflow_id])
+        return base64.urlsafe_b64encode(key.encode("utf-8")).decode("utf-8")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+        """
+        Raises `ValueError` if `cursor` is not valid.
+        """
+        try:
+            created_at, workflow_id = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+            return datetime.fromisoformat(created_at), workflow_id
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid cursor `{cursor}`") from e
+
+
+class AsyncEventManager(_AsyncBaseManager):
+    async def follow(
+        self, workflow_id: str, last_event_id: Optional[str] = None
+    ) -> AsyncGenerator[Optional[WorkflowEvent], None]:
+        """
+        Yields events of workflow published after `last_event_id` (or all of them, if not set) as they happen.
+        `None` is yielded whenever there are no more events for a while, so that callers can check whether
+        to keep following the workflow.
+
+        Events are identified by their `seq`, which is assigned by the database and increases with every
+        transition of the workflow, unlike object ids generated by different workers. Events already published
+        are yielded sorted by `seq`, so that resuming from the last one received does not skip any of them.
+        Events published afterwards are yielded as they are inserted, which might be slightly out of order.
+        """
+        query: Dict[str, Any] = {"workflow_id": workflow_id}
+        if last_event_id:
+            try:
+                query["seq"] = {"$gt": int(last_event_id)}
+            except ValueError as e:
+                raise ValueError(f"Invalid event id `{last_event_id}`") from e
+
+        seen: Set[int] = set()
+
+        # tailable cursors can not be sorted, as they return documents in insertion order
+        async for event in self.database.dramaevent.find(query, projection={"_id": False}, sort=[("seq", ASCENDING)]):
+            seen.add(event["seq"])
+            yield WorkflowEvent(**event)
+
+        while True:
+            cursor = self.database.dramaevent.find(
+                query, projection={"_id": False}, cursor_type=CursorType.TAILABLE_AWAIT
+            )
+            while cursor.alive:
+                async for event in cursor:
+                    # renewed cursors start over, and events might be inserted slightly out of order,
+                    #  so events are not skipped by sequence but by the ones already yielded
+                    if event["seq"] in seen:
+                        continue
+                    seen.add(event["seq"])
+                    yield WorkflowEvent(**event)
+                yield None
+            # cursors die if collection is empty, so they are renewed after a while
+            await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
@@ -1,11 +1,14 @@
 from enum import Enum
-from typing import Optional, Union
+from typing import Any, List, Optional, Union
 
 from pydantic import BaseModel
 
 
 class MessageType(str, Enum):
     BLOCK = "BLOCK"
+    BATCH = "BATCH"
+    REFERENCE = "REFERENCE"
+    RESENT = "RESENT"
     SIGNAL = "SIGNAL"
 
 
@@ -16,6 +19,7 @@ class SignalType(bytes, Enum):
 
 class Servo(str, Enum):
     AVRO = "AVRO"
+    AVRO_FINGERPRINT = "AVRO_FINGERPRINT"
 
 
 class Message(BaseModel):
@@ -29,6 +33,36 @@ class Message(BaseModel):
         use_enum_values = True
 
 
+class Reference(BaseModel):
+    """
+    Descriptor of the payload of a block-like message shared thought a memory-mapped segment, sent in its place.
+    See `drama.transport.shm`.
+    """
+
+    type: Union[MessageType, str]
+    host: str
+    path: str
+    offset: int
+    length: int
+
+    class Config:
+        use_enum_values = True
+
+
+class ObjectMessage(BaseModel):
+    """
+    Block-like message whose records are handed over as they are, by transports which do not serialize messages.
+    """
+
+    type: Union[MessageType, str] = MessageType.BLOCK
+    key: str
+    # data types, typed as `Any` so that they are not converted to pydantic dataclasses
+    records: List[Any] = []
+
+    class Config:
+        use_enum_values = True
+
+
 class SignalMessage(BaseModel):
     type: Union[MessageType, str] = MessageType.SIGNAL
     data: Optional[SignalType] = None
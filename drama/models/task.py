@@ -49,6 +49,8 @@ class TaskOpts(BaseModel):
     on_fail_force_interruption: bool = True
     on_fail_remove_local_dir: bool = True
     queue_name: Optional[str] = None
+    # resume from the last processed upstream record when the task is retried, instead of replaying its inputs
+    resume: bool = False
 
 
 class Task(BaseModel):
@@ -89,6 +91,7 @@ class TaskInDb(Task):
     options: TaskOpts = TaskOpts()
     metadata: dict = {}
     created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     result: Optional[TaskResult] = None
     status: TaskStatus = TaskStatus.STATUS_UNKNOWN
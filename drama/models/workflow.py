@@ -1,12 +1,12 @@
 import uuid
 from datetime import datetime
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, validator
 from pydantic.fields import Field
 
-from drama.models.task import Task, TaskInDb
+from drama.models.task import Task, TaskInDb, TaskStatus
 
 
 class WorkflowStatus(str, Enum):
@@ -49,6 +49,32 @@ class WorkflowInDb(BaseModel):
     updated_at: Optional[datetime] = None
     status: WorkflowStatus = WorkflowStatus.STATUS_UNKNOWN
     is_revoked: bool = False
+    # number of tasks per status
+    task_counts: Dict[str, int] = {}
+
+    class Config:
+        use_enum_values = True
+
+
+class WorkflowPage(BaseModel):
+    workflows: List[WorkflowInDb] = []
+    # opaque cursor to request the next page, if any
+    next_cursor: Optional[str] = None
+
+
+class WorkflowEvent(BaseModel):
+    """
+    Transition of a task to `task_status`, along with the resulting status of its workflow (if changed).
+    Events of a workflow are ordered by `seq`, the version of its task counters after the transition.
+    """
+
+    seq: int = 0
+    workflow_id: str
+    task_id: str
+    task_name: str
+    task_status: TaskStatus
+    workflow_status: Optional[WorkflowStatus] = None
+    created_at: Optional[datetime] = None
 
     class Config:
         use_enum_values = True
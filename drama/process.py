@@ -1,20 +1,74 @@
 import json
 import os
 import tempfile
+import time
 from abc import abstractmethod
+from dataclasses import fields, is_dataclass
 from datetime import datetime
 from enum import Enum
-from typing import Dict, Iterator, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
-from kafka import KafkaConsumer, KafkaProducer
-
-from drama.config import settings
-from drama.datatype import DataType, get_dict, get_schema
+from drama.config import KafkaRouting, settings
+from drama.datatype import DataType, get_dict, get_plain_dict, get_schema
 from drama.logger import get_logger
-from drama.models.messages import Message, MessageType, Servo, SignalMessage, SignalType
-from drama.servo import deserialize, serialize
+from drama.models.messages import (
+    Message,
+    MessageType,
+    ObjectMessage,
+    Reference,
+    Servo,
+    SignalMessage,
+    SignalType,
+)
+from drama.registry import SchemaRegistry, get_available_registry
+from drama.servo import (
+    PARSED_SCHEMAS_MAXSIZE,
+    LRUCache,
+    deserialize,
+    parse,
+    parse_json,
+    serialize,
+)
 from drama.storage.base import Resource, Storage
 from drama.storage.helpers import get_available_storage
+from drama.transport.base import Consumer, Transport
+from drama.transport.helpers import get_available_transport
+from drama.transport.shm import (
+    SegmentNotReachable,
+    SegmentReader,
+    SegmentWriter,
+    are_colocated,
+    register_consumer,
+    release_segment,
+    unregister_consumer,
+)
+
+# batch schemas by identity of their item schema, so that batches reuse the parsed schema of previous ones
+_batch_schemas = LRUCache(PARSED_SCHEMAS_MAXSIZE)
+
+
+class UpstreamTimeoutError(TimeoutError):
+    """
+    Raised when upstream tasks do not finish within the given deadline.
+    """
+
+    pass
+
+
+def _referenced_resources(value) -> Iterator[str]:
+    """
+    Yields data file identifiers which might be referenced by (nested) fields of a data type.
+    """
+    if isinstance(value, Resource):
+        yield value.resource
+    elif isinstance(value, str):
+        yield value
+    elif is_dataclass(value):
+        for field in fields(value):
+            yield from _referenced_resources(getattr(value, field.name))
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _referenced_resources(item)
 
 
 class _LoggingMessageType(str, Enum):
@@ -75,11 +129,17 @@ class _BaseProcess:
         self.logging_file = tempfile.NamedTemporaryFile(dir=storage.temp_dir, delete=False)
 
     @abstractmethod
-    def to_downstream(self, data: DataType) -> Message:
+    def to_downstream(self, data: DataType) -> Union[Message, ObjectMessage]:
+        pass
+
+    @abstractmethod
+    def to_downstream_many(self, data: Iterable[DataType]) -> Optional[Union[Message, ObjectMessage]]:
         pass
 
     @abstractmethod
-    def poll_from_upstream(self, apply_servo: bool = True) -> Iterator[Tuple[str, dict]]:
+    def poll_from_upstream(
+        self, apply_servo: bool = True, timeout: Optional[float] = None
+    ) -> Iterator[Tuple[str, Union[dict, bytes]]]:
         pass
 
     @abstractmethod
@@ -132,7 +192,8 @@ class _BaseProcess:
 
 class Process(_BaseProcess):
     """
-    Actor process based on Apache Kafka and Avro for inter-component communication.
+    Actor process based on a pluggable transport (Apache Kafka by default) and Avro for inter-component
+    communication.
     """
 
     MESSAGE_SCHEMA = {
@@ -148,6 +209,9 @@ class Process(_BaseProcess):
         ],
     }
 
+    # envelope schema is parsed once at import time, as every message goes through it
+    _PARSED_MESSAGE_SCHEMA = parse(MESSAGE_SCHEMA)
+
     def __init__(
         self,
         name: str,
@@ -157,38 +221,75 @@ class Process(_BaseProcess):
         inputs: Optional[Dict[str, str]] = None,
         secrets: Optional[Dict[str, str]] = None,
         storage: Optional[Storage] = None,
+        registry: Optional[SchemaRegistry] = None,
+        transport: Optional[Transport] = None,
+        resume: bool = False,
+        downstream: Optional[List[str]] = None,
     ):
+        """
+        :param downstream: Names of the tasks consuming from this task.
+        :param transport: Channel used to exchange messages with other tasks. Defaults to the one set in settings.
+        :param resume: If true, consumers resume from the last record processed by a previous run of this task
+            instead of reading upstream topics from the beginning.
+        """
         super().__init__(name, module, parent, params, inputs, secrets, storage)
         self.logger = get_logger(__name__, name=name)
+        self.resume = resume
+
+        # schema registry, if not set schemas are embedded in messages
+        self.registry = registry or get_available_registry()
+
+        self.transport = transport or get_available_transport()
 
-    def to_downstream(self, data: DataType) -> Message:
+        # payloads are shared thought memory-mapped segments while all downstream tasks are co-located
+        self.downstream = downstream or []
+        self._segment_writer: Optional[SegmentWriter] = None
+        # references sent so far, whose payloads are re-sent inline if downstream tasks move to another host
+        self._offloaded: List[Tuple[Message, Reference]] = []
+
+    def to_downstream(self, data: DataType) -> Union[Message, ObjectMessage]:
         """
-        Sends block-like message thought Kafka topic.
+        Sends block-like message thought topic.
         Data is serialized using self-contained schema.
         """
-        servo_schema = get_schema(data)
-        dict_data = get_dict(data)
+        # files referenced by data must be uploaded before downstream tasks read them
+        self.storage.wait(_referenced_resources(data))
 
-        # serialize data
-        serialized_data = serialize(dict_data, servo_schema)
-        stringify_schema = json.dumps(servo_schema, default=str)
+        message = self._pack([data], MessageType.BLOCK)
 
-        # wrapper
-        message_key = f"{self.name}.{data.name}"
-        message = Message(
-            type=MessageType.BLOCK,
-            key=message_key,
-            data=serialized_data,
-            schem=stringify_schema,
-            servo=Servo.AVRO,
-        )
+        self.debug([f"Sending {message.key} to downstream"])
+        self._send(message)
 
-        self.debug([f"Sending {message_key} to downstream"])
+        return message
+
+    def to_downstream_many(self, data: Iterable[DataType]) -> Optional[Union[Message, ObjectMessage]]:
+        """
+        Sends multiple records of the same data type as a single block-like message thought topic.
+        Records are packed into an Avro array, so the schema and envelope are sent once per batch.
+
+        :returns: Sent message, or `None` if there were no records to send.
+        """
+        records = list(data)
+
+        if not records:
+            return None
+
+        datatype = type(records[0])
+        if any(type(record) is not datatype for record in records):
+            raise ValueError(f"All records in a batch must be of the same data type: expected {datatype.__name__}")
+
+        self.storage.wait(_referenced_resources(records))
+
+        message = self._pack(records, MessageType.BATCH)
+
+        self.debug([f"Sending {len(records)} records of {message.key} to downstream"])
         self._send(message)
 
         return message
 
-    def poll_from_upstream(self, apply_servo: bool = True) -> Iterator[Tuple[str, dict]]:
+    def poll_from_upstream(
+        self, apply_servo: bool = True, timeout: Optional[float] = None
+    ) -> Iterator[Tuple[str, Union[dict, bytes]]]:
         """
         Polls messages from input task(s).
 
@@ -199,6 +300,9 @@ class Process(_BaseProcess):
         message type.
 
         :param apply_servo: If true, incoming messages are automatically deserialized. Defaults to `True`.
+        :param timeout: Maximum number of seconds to wait for all upstream tasks to finish. Defaults to
+            `settings.KAFKA_UPSTREAM_TIMEOUT` (no limit if not set).
+        :raises UpstreamTimeoutError: If upstream tasks did not finish before `timeout`.
         """
         if not self.inputs:
             raise Exception("Tried to poll from upstream, but no input defined")
@@ -213,75 +317,346 @@ class Process(_BaseProcess):
             f"Declared input tasks ({number_of_input_tasks}): {inputs_names}, expected inputs: {inputs_remaining}",
         )
 
+        if timeout is None:
+            timeout = settings.KAFKA_UPSTREAM_TIMEOUT
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        if settings.SHM_THRESHOLD_BYTES is not None:
+            register_consumer(self.parent, self.name)
+
         counter = 0
+        held_partitions: Set[Any] = set()
         consumer = self._consumer()
+        segment_reader = SegmentReader()
+        # references to segments in another host, waiting for their payloads to be re-sent inline
+        unreachable: Set[Tuple[str, int]] = set()
+
+        try:
+            while counter < number_of_input_tasks:
+                poll_timeout_ms = settings.KAFKA_POLL_TIMEOUT_MS
+
+                if deadline is not None:
+                    remaining_ms = int((deadline - time.monotonic()) * 1000)
+                    if remaining_ms <= 0:
+                        raise UpstreamTimeoutError(
+                            f"Timed out after {timeout}s waiting for upstream, missing inputs: {inputs_remaining}"
+                        )
+                    poll_timeout_ms = min(poll_timeout_ms, remaining_ms)
+
+                # blocks until records are available (or timeout expires), so idle consumers do not spin
+                messages = consumer.poll(timeout_ms=poll_timeout_ms, max_records=settings.KAFKA_POLL_MAX_RECORDS)
+                offsets = {}
+                for partition, msg in messages.items():
+                    for record in msg:
+                        # offsets are never committed past signals nor unreachable references, so that retries
+                        #  resuming from them still know when upstream tasks finished and get re-sent payloads
+                        if partition not in held_partitions:
+                            offsets[partition] = record.offset + 1
+
+                        # only read incoming messages from input tasks, ignore the rest
+                        if record.key is None:
+                            continue
+                        incoming_task_name = record.key.decode("utf-8")
 
-        while counter < number_of_input_tasks:
-            messages = consumer.poll(timeout_ms=1)
-            for _, msg in messages.items():
-                for record in msg:
-                    # only read incoming messages from input tasks, ignore the rest
-                    incoming_task_name = record.key.decode("utf-8")
+                        if incoming_task_name not in inputs_names and incoming_task_name != self.parent:
+                            continue  # go back to the beginning of the inner loop
 
-                    if incoming_task_name not in inputs_names and incoming_task_name != self.parent:
-                        continue  # go back to the beginning of the inner loop
+                        self.debug([f"Got message from {incoming_task_name}"])
 
-                    self.debug([f"Got message from {incoming_task_name}"])
+                        if self.transport.serializes:
+                            # deserialize message
+                            serialized_message = record.value
+                            deserialized_message: Dict[Message] = deserialize(serialized_message, self._PARSED_MESSAGE_SCHEMA)  # type: ignore
 
-                    # deserialize message
-                    serialized_message = record.value
-                    deserialized_message: Dict[Message] = deserialize(serialized_message, self.MESSAGE_SCHEMA)  # type: ignore
+                            message = Message(**deserialized_message)
+                        else:
+                            message = record.value
+
+                        # payload of block-like messages, which might be a zero-copy view of a shared segment
+                        payload: Union[bytes, memoryview, None] = message.data if isinstance(message, Message) else None
+
+                        if message.type in (MessageType.REFERENCE, MessageType.RESENT):
+                            dereferenced = self._dereference(message, segment_reader, unreachable)
+                            if dereferenced is None:
+                                if message.type == MessageType.REFERENCE and partition not in held_partitions:
+                                    offsets[partition] = record.offset
+                                    held_partitions.add(partition)
+                                continue
+                            message, payload = dereferenced
+
+                        # check message type
+                        if message.type == MessageType.SIGNAL:
+                            if partition not in held_partitions:
+                                offsets[partition] = record.offset
+                                held_partitions.add(partition)
+                            if message.data == SignalType.INTE:
+                                self.warn([f"Received interruption signal from task {incoming_task_name}"])
+                                raise Exception(f"Task was brutally murdered by upstream with signal {SignalType.INTE}")
+                            elif message.data == SignalType.STOP:
+                                self.debug([f"Received {SignalType.STOP} signal from task {incoming_task_name}"])
+                                counter += 1  # stops the while loop when counter equals number_of_input_tasks
+                            else:
+                                raise NotImplementedError(f"Unrecognized signal {message.data!r}")
+                        elif message.type in (MessageType.BLOCK, MessageType.BATCH):
+                            # input tasks can send multiple messages with different data attached (eg., DataA and DataB),
+                            #  but we might be only interested in some of them
+                            message_key = message.key
+                            if message_key is None:
+                                raise Exception(
+                                    f"Received {message.type} message without key from task {incoming_task_name}"
+                                )
+
+                            self.debug([f"Received {message_key} from task {incoming_task_name}"])
+
+                            if message_key not in self.inputs.values():
+                                # received message is not an input of this task
+                                self.debug([f"Discarding message {message_key}"])
+                                continue
+
+                            try:
+                                # delete from remaining list
+                                inputs_remaining.remove(message_key)
+                            except ValueError:
+                                pass
+
+                            for datatype in self._unpack(message, payload, apply_servo):
+                                self.debug([f"{incoming_task_name} content: {datatype!r}"])
+
+                                # returns key and data
+                                yield inputs_reversed[message_key], datatype
+                        else:
+                            raise NotImplementedError(f"Unrecognized message type: {message.type}")
+
+                if offsets:
+                    # polled records have been processed at this point
+                    consumer.commit(offsets)
+
+            # at this point, all tasks have send STOP signals
+            if unreachable:
+                # upstream tasks finished before finding out that this task runs in another host
+                raise SegmentNotReachable(f"Payloads of {len(unreachable)} references are not reachable from this host")
+
+            # check if all inputs have been yielded (as expected)
+            if len(inputs_remaining) > 0:
+                if self.resume:
+                    # inputs might have been consumed by a previous run of this task
+                    self.warn([f"Some inputs were declared but not received since resuming: {inputs_remaining}"])
+                else:
+                    raise Exception(f"Some inputs were declared but are missing: {inputs_remaining}")
+        finally:
+            consumer.close()
+            segment_reader.close()
+            if settings.SHM_THRESHOLD_BYTES is not None:
+                unregister_consumer(self.parent, self.name)
+
+    def _pack(self, records: List[DataType], message_type: MessageType) -> Union[Message, ObjectMessage]:
+        """
+        Wraps records in a block-like message. Records are serialized with Avro, unless the transport
+        delivers Python objects as they are.
+        """
+        message_key = f"{self.name}.{records[0].name}"
 
-                    message = Message(**deserialized_message)
+        if not self.transport.serializes:
+            return ObjectMessage(type=message_type, key=message_key, records=records)
 
-                    # check message type
-                    if message.type == MessageType.SIGNAL:
-                        if message.data == SignalType.INTE:
-                            self.warn([f"Received interruption signal from task {incoming_task_name}"])
-                            raise Exception(f"Task was brutally murdered by upstream with signal {SignalType.INTE}")
-                        elif message.data == SignalType.STOP:
-                            self.debug([f"Received {SignalType.STOP} signal from task {incoming_task_name}"])
-                            counter += 1  # stops the while loop when counter equals number_of_input_tasks
-                        else:
-                            raise NotImplementedError(f"Unrecognized signal {message.data}")
-                    elif message.type == MessageType.BLOCK:
-                        # input tasks can send multiple messages with different data attached (eg., DataA and DataB),
-                        #  but we might be only interested in some of them
-                        message_key: str = message.key
+        servo_schema = get_schema(records[0])
 
-                        self.debug([f"Received {message_key} from task {incoming_task_name}"])
+        # serialize data
+        if message_type == MessageType.BLOCK:
+            serialized_data = serialize(get_dict(records[0]), servo_schema)
+        else:
+            serialized_data = serialize([get_dict(record) for record in records], self._batch_schema(servo_schema))
 
-                        if message_key not in self.inputs.values():
-                            # received message is not an input of this task
-                            self.debug([f"Discarding message {message_key}"])
-                            continue
+        schema_reference, servo = self._schema_reference(servo_schema)
 
-                        try:
-                            # delete from remaining list
-                            inputs_remaining.remove(message_key)
-                        except ValueError:
-                            pass
+        # wrapper
+        message = Message(
+            type=message_type,
+            key=message_key,
+            data=serialized_data,
+            schem=schema_reference,
+            servo=servo,
+        )
+
+        return self._offload(message)
+
+    def _offload(self, message: Message) -> Message:
+        """
+        Moves the payload of a large message to a memory-mapped segment if all downstream tasks run in this host,
+        so that only a small descriptor is sent thought the topic. Otherwise, `message` is returned as it is.
+        """
+        threshold = settings.SHM_THRESHOLD_BYTES
+        data = message.data
+
+        if threshold is None or data is None or len(data) < threshold or not self._are_downstream_colocated():
+            return message
+
+        if self._segment_writer is None:
+            self._segment_writer = SegmentWriter(self.parent, self.name, readers=self.downstream)
+
+        reference = Reference(type=message.type, **self._segment_writer.write(data))
+
+        reference_message = Message(
+            type=MessageType.REFERENCE,
+            key=message.key,
+            data=reference.json().encode("utf-8"),
+            schem=message.schem,
+            servo=message.servo,
+        )
+        self._offloaded.append((reference_message, reference))
+
+        return reference_message
+
+    def _are_downstream_colocated(self) -> bool:
+        """
+        Checks if all downstream tasks are registered as consumers in this host. Registrations are checked
+        on every large message, as downstream tasks might be rescheduled in another host at any time.
+        """
+        return bool(self.downstream) and are_colocated(self.parent, self.downstream)
+
+    def _resend_offloaded(self) -> None:
+        """
+        Re-sends inline the payloads of all references sent so far, unless all downstream tasks are still
+        co-located. Downstream tasks only handle the payloads of references they could not read.
+        """
+        if not self._offloaded or self._are_downstream_colocated():
+            return
+
+        self.warn([f"Downstream tasks are no longer co-located, re-sending {len(self._offloaded)} payloads inline"])
+
+        segment_reader = SegmentReader()
+        try:
+            for reference_message, reference in self._offloaded:
+                payload = segment_reader.read(reference.dict())
+                # descriptor and payload are separated by a line break, which is always escaped in JSON
+                self._send(
+                    Message(
+                        type=MessageType.RESENT,
+                        key=reference_message.key,
+                        data=reference.json().encode("utf-8") + b"\n" + payload.tobytes(),
+                        schem=reference_message.schem,
+                        servo=reference_message.servo,
+                    )
+                )
+                payload.release()
+        finally:
+            segment_reader.close()
+
+    def release_segments(self) -> None:
+        """
+        Releases segments of input tasks once this task succeeded, so that they are removed once all their readers
+        are done. Segments are kept while this task might be retried, as retries read them again.
+        """
+        if settings.SHM_THRESHOLD_BYTES is None or not self.inputs:
+            return
+
+        for input_name in {value.split(".")[0] for value in self.inputs.values()}:
+            release_segment(self.parent, input_name, self.name)
+
+    @staticmethod
+    def _dereference(
+        message: Message, segment_reader: SegmentReader, unreachable: Set[Tuple[str, int]]
+    ) -> Optional[Tuple[Message, Union[bytes, memoryview]]]:
+        """
+        Returns the block-like message referenced by `message` (without data), along with a zero-copy view
+        of its payload.
+
+        References to segments in another host are added to `unreachable` and `None` is returned, as their
+        payloads are re-sent inline by upstream tasks. Re-sent payloads are only returned if their reference
+        was not reachable.
+        """
+        if message.data is None:
+            raise Exception(f"Received {message.type} message {message.key} without descriptor")
+
+        payload: Union[bytes, memoryview]
+        if message.type == MessageType.RESENT:
+            separator = message.data.index(b"\n")
+            reference = Reference.parse_raw(message.data[:separator])
+            segment = (reference.path, reference.offset)
+            if segment not in unreachable:
+                # payload was already read from segment
+                return None
+            unreachable.remove(segment)
+            payload = memoryview(message.data)[separator + 1 :]
+        else:
+            reference = Reference.parse_raw(message.data)
+            try:
+                payload = segment_reader.read(reference.dict())
+            except SegmentNotReachable:
+                unreachable.add((reference.path, reference.offset))
+                return None
 
-                        datatype = message.data
+        referenced = Message(type=reference.type, key=message.key, schem=message.schem, servo=message.servo)
 
-                        if apply_servo:
-                            serialized_datatype: bytes = message.data
-                            schema: str = message.schem
-                            datatype = deserialize(serialized_datatype, json.loads(schema))
+        return referenced, payload
 
-                        self.debug([f"{incoming_task_name} content: {datatype}"])
+    def _unpack(
+        self, message: Union[Message, ObjectMessage], payload: Union[bytes, memoryview, None], apply_servo: bool
+    ) -> Iterator[Union[dict, bytes]]:
+        """
+        Yields records contained in a block-like message, whose serialized records are given in `payload`.
+        Batches are transparently split into individual records, so consumers receive the same items regardless
+        of how they were sent.
+        """
+        if isinstance(message, ObjectMessage):
+            for record in message.records:
+                # records are handed over as if they had been sent thought the wire
+                yield get_plain_dict(record) if apply_servo else serialize(get_dict(record), get_schema(record))
+            return
+
+        if payload is None:
+            raise Exception(f"Received {message.type} message {message.key} without data")
+
+        if message.type == MessageType.BLOCK:
+            if not apply_servo:
+                yield bytes(payload)
+                return
+            record = deserialize(payload, self._servo_schema(message))
+            if not isinstance(record, dict):
+                raise Exception(f"Received {message.type} message {message.key} which is not a record")
+            yield record
+            return
+
+        servo_schema = self._servo_schema(message)
+        for record in deserialize(payload, self._batch_schema(servo_schema)):
+            # without servo, each record is handed over encoded on its own, as if sent with `to_downstream`
+            yield record if apply_servo else serialize(record, servo_schema)
+
+    def _schema_reference(self, servo_schema: dict) -> Tuple[str, Servo]:
+        """
+        Returns the value of the `schem` field for `servo_schema`, i.e., its fingerprint if a schema
+        registry is available or the stringified schema otherwise.
+        """
+        if self.registry:
+            return self.registry.register(servo_schema), Servo.AVRO_FINGERPRINT
+        return json.dumps(servo_schema, default=str), Servo.AVRO
 
-                        # returns key and data
-                        yield inputs_reversed[message_key], datatype
-                    else:
-                        raise NotImplementedError(f"Unrecognized message type: {message.type}")
+    def _servo_schema(self, message: Message) -> dict:
+        """
+        Resolves the schema of a block-like message.
+        """
+        if message.schem is None:
+            raise Exception(f"Received {message.type} message {message.key} without schema")
+        if message.servo == Servo.AVRO_FINGERPRINT:
+            if not self.registry:
+                raise Exception(f"Received schema fingerprint {message.schem}, but no schema registry is available")
+            return self.registry.get(message.schem)
+        return parse_json(message.schem)
+
+    @staticmethod
+    def _batch_schema(servo_schema: dict) -> dict:
+        """
+        Returns Avro schema of a batch of records of `servo_schema`.
+        """
+        cached = _batch_schemas.get(id(servo_schema))
+        # entries hold a reference to the item schema, so its identity can not be reused while cached
+        if cached is not None and cached[0] is servo_schema:
+            return cached[1]
 
-        # at this point, all tasks have send STOP signals
-        # check if all inputs have been yielded (as expected)
-        if len(inputs_remaining) > 0:
-            raise Exception(f"Some inputs were declared but are missing: {inputs_remaining}")
+        batch_schema = {"type": "array", "items": servo_schema}
+        _batch_schemas.put(id(servo_schema), (servo_schema, batch_schema))
 
-        consumer.close()
+        return batch_schema
 
     def get_from_upstream(self, **kwargs) -> Dict[str, List[dict]]:
         """
@@ -308,6 +683,15 @@ class Process(_BaseProcess):
         # send log to remote storage
         logging_remote = self.storage.put_file(self.logging_file.name, rename=logging_filename)
 
+        # files uploaded in background must land before downstream tasks are signaled, otherwise they are interrupted
+        upload_error = None
+        try:
+            self.storage.wait()
+        except Exception as err:
+            self.error([f"Could not upload files to storage: {err!r}"])
+            upload_error = err
+            force_interruption = True
+
         # once uploaded, delete named temporal file in local temp dir
         self.logging_file.close()
 
@@ -319,43 +703,81 @@ class Process(_BaseProcess):
             # remove local directory without deleting the logging file (always kept for debugging purposes)
             self.storage.remove_local_dir(omit_files=[logging_filename])
 
+        # objects read by this task can now be evicted from cache
+        self.storage.close()
+
+        # downstream tasks rescheduled in another host can not read payloads shared thought segments
+        self._resend_offloaded()
+
         # send interruption signal
         signal = SignalMessage(data=SignalType.INTE if force_interruption else SignalType.STOP)
         self._send(signal)
+        self.transport.flush()
+
+        if self._segment_writer is not None:
+            self._segment_writer.close()
 
         if force_interruption:
             self.error(["Task brutally interrupted"])
         else:
             self.debug(["Task gracefully closed"])
 
+        if upload_error is not None:
+            raise upload_error
+
         return logging_remote
 
-    def _send(self, message: Union[Message, SignalMessage], **kwargs) -> None:
+    def _send(
+        self,
+        message: Union[Message, SignalMessage, ObjectMessage],
+        topic: Optional[str] = None,
+        key: Optional[str] = None,
+        **kwargs,
+    ) -> None:
         """
         Sends message thought topic.
 
-        :returns: Serialized input message.
+        :param topic: Destination topic. Defaults to this task's topic.
+        :param key: Record key. Defaults to this task's name.
         """
-        serialized_message = serialize(message.dict(), self.MESSAGE_SCHEMA)
+        value = serialize(message.dict(), self._PARSED_MESSAGE_SCHEMA) if self.transport.serializes else message
 
-        # send thought topic
-        producer = self._producer()
-        producer.send(topic=self.parent, value=serialized_message, key=bytes(self.name, "utf-8"), **kwargs)
-        producer.close()
+        self.transport.send(topic=topic or self._topic(), key=bytes(key or self.name, "utf-8"), value=value, **kwargs)
 
-    def _producer(self, **kwargs) -> KafkaProducer:
+    def _topic(self, task_name: Optional[str] = None) -> str:
         """
-        Creates a new Kafka producer.
+        Returns the topic where `task_name` (defaults to this task) publishes its messages.
+
+        With `workflow` routing, all tasks in a workflow share a single topic named after the workflow id.
+        With `task` routing, each task publishes to its own topic, so consumers only read what they need.
         """
-        return KafkaProducer(bootstrap_servers=[settings.KAFKA_CONN], **kwargs)
+        if settings.KAFKA_ROUTING == KafkaRouting.TASK:
+            return f"{self.parent}.{task_name or self.name}"
+        return self.parent
 
-    def _consumer(self, parent: str = None, **kwargs) -> KafkaConsumer:
+    def _upstream_topics(self) -> List[str]:
         """
-        Creates a new Kafka consumer.
+        Returns the topics this task reads from. The workflow topic is always included, as workflow-wide
+        messages (e.g., interruption signals on revoke) are published there.
         """
-        return KafkaConsumer(
-            parent or self.parent,
-            bootstrap_servers=[settings.KAFKA_CONN],
-            auto_offset_reset="earliest",
-            **kwargs,
-        )
+        topics = [self.parent]
+        if settings.KAFKA_ROUTING == KafkaRouting.TASK:
+            input_tasks = sorted({inn.split(".")[0] for inn in self.inputs.values()})
+            topics.extend(self._topic(input_task) for input_task in input_tasks)
+        return topics
+
+    def _group_id(self) -> str:
+        """
+        Returns the consumer group of this task, which is deterministic so that retries share committed offsets.
+        """
+        return f"drama.{self.parent}.{self.name}"
+
+    def _consumer(self, parent: str = None, **kwargs) -> Consumer:
+        """
+        Creates a new consumer subscribed to `parent` topic or, by default, to upstream topics.
+
+        Consumers join the task's consumer group and offsets are committed once records are processed.
+        Unless resuming, topics are still read from the beginning.
+        """
+        topics = [parent] if parent else self._upstream_topics()
+        return self.transport.consumer(topics, group_id=self._group_id(), rewind=not self.resume, **kwargs)
@@ -0,0 +1,166 @@
+import json
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from fastavro.schema import fingerprint, to_parsing_canonical_form
+from pymongo.database import Database
+
+from drama.config import settings
+from drama.database import get_db_connection
+from drama.servo import LRUCache, parse
+
+
+class SchemaNotFound(KeyError):
+    """
+    Raised when a fingerprint is not present in the registry.
+    """
+
+    pass
+
+
+class SchemaRegistry(ABC):
+    """
+    Stores Avro schemas keyed by their fingerprint, so that messages can carry the fingerprint
+    instead of the full JSON schema. Both producers and consumers keep an in-process LRU cache,
+    hence the backend is only hit once per schema and process.
+    """
+
+    def __init__(self, cache_size: Optional[int] = None):
+        cache_size = cache_size or settings.SCHEMA_REGISTRY_CACHE_SIZE
+        self._fingerprints = LRUCache(cache_size)  # schema identity -> (schema, fingerprint)
+        self._parsed_schemas = LRUCache(cache_size)  # fingerprint -> parsed schema
+
+    @staticmethod
+    def fingerprint(schema: dict) -> str:
+        """
+        Returns CRC-64-AVRO fingerprint of the parsing canonical form of `schema`.
+        """
+        return fingerprint(to_parsing_canonical_form(schema), "CRC-64-AVRO")
+
+    def register(self, schema: dict) -> str:
+        """
+        Registers `schema` (if it's *NOT* already registered) and returns its fingerprint.
+
+        Fingerprints are cached by schema identity, as schemas of data types are generated once (see
+        `drama.datatype.get_schema`), and thus registered schemas must not be modified.
+        """
+        cached = self._fingerprints.get(id(schema))
+        # entries hold a reference to the schema, so its identity can not be reused while cached
+        if cached is not None and cached[0] is schema:
+            return cached[1]
+
+        schema_fingerprint = self.fingerprint(schema)
+        self._put(schema_fingerprint, schema)
+        self._fingerprints.put(id(schema), (schema, schema_fingerprint))
+        self._parsed_schemas.put(schema_fingerprint, parse(schema, key=schema_fingerprint))
+
+        return schema_fingerprint
+
+    def get(self, schema_fingerprint: str) -> dict:
+        """
+        Returns parsed schema from its fingerprint.
+        """
+        parsed_schema = self._parsed_schemas.get(schema_fingerprint)
+        if parsed_schema is None:
+            schema = self._get(schema_fingerprint)
+            if schema is None:
+                raise SchemaNotFound(f"Schema with fingerprint {schema_fingerprint} not found in registry")
+            parsed_schema = parse(schema, key=schema_fingerprint)
+            self._parsed_schemas.put(schema_fingerprint, parsed_schema)
+        return parsed_schema
+
+    @abstractmethod
+    def _put(self, schema_fingerprint: str, schema: dict) -> None:
+        """
+        Stores `schema` in backend.
+        """
+        pass
+
+    @abstractmethod
+    def _get(self, schema_fingerprint: str) -> Optional[dict]:
+        """
+        Retrieves schema from backend, or `None` if not found.
+        """
+        pass
+
+
+class MongoSchemaRegistry(SchemaRegistry):
+    """
+    Schema registry backed by the `dramaschema` collection.
+    """
+
+    def __init__(self, db: Optional[Database] = None, cache_size: Optional[int] = None):
+        super().__init__(cache_size)
+        self.database = db or get_db_connection()
+
+    def _put(self, schema_fingerprint: str, schema: dict) -> None:
+        # schemas are immutable, so they are only inserted once
+        self.database.dramaschema.update_one(
+            {"id": schema_fingerprint},
+            {"$setOnInsert": {"id": schema_fingerprint, "schema": json.dumps(schema, default=str)}},
+            upsert=True,
+        )
+
+    def _get(self, schema_fingerprint: str) -> Optional[dict]:
+        schema_in_db = self.database.dramaschema.find_one({"id": schema_fingerprint})
+        if schema_in_db:
+            return json.loads(schema_in_db["schema"])
+        return None
+
+
+class FileSchemaRegistry(SchemaRegistry):
+    """
+    Schema registry backed by `.avsc` files in a local directory.
+    Intended for testing and single-node deployments.
+    """
+
+    def __init__(self, directory: Optional[Union[str, Path]] = None, cache_size: Optional[int] = None):
+        super().__init__(cache_size)
+        self.directory = Path(directory or Path(settings.DATA_DIR, "schemas"))
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _put(self, schema_fingerprint: str, schema: dict) -> None:
+        schema_path = Path(self.directory, f"{schema_fingerprint}.avsc")
+        if not schema_path.is_file():
+            # write to a temporary file first, unique to this writer, so that readers never see a partial schema
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=f"{schema_fingerprint}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(json.dumps(schema, default=str))
+                os.replace(temp_path, schema_path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+    def _get(self, schema_fingerprint: str) -> Optional[dict]:
+        schema_path = Path(self.directory, f"{schema_fingerprint}.avsc")
+        if schema_path.is_file():
+            return json.loads(schema_path.read_text())
+        return None
+
+
+_registries: Dict[str, SchemaRegistry] = {}
+
+
+def get_available_registry() -> Optional[SchemaRegistry]:
+    """
+    Get schema registry based on settings. If no registry is set, schemas are embedded in every message.
+    Registries are shared by every process in the worker, and so are their caches.
+    """
+    backend = settings.SCHEMA_REGISTRY
+
+    if not backend:
+        return None
+
+    if backend not in _registries:
+        if backend == "mongo":
+            _registries[backend] = MongoSchemaRegistry()
+        elif backend == "file":
+            _registries[backend] = FileSchemaRegistry()
+        else:
+            raise ValueError(f"Unknown schema registry `{backend}`: expected `mongo` or `file`")
+
+    return _registries[backend]
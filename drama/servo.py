@@ -1,24 +1,113 @@
 import io
+import json
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Union
 
-from fastavro import schemaless_reader, schemaless_writer
+from fastavro import parse_schema, schemaless_reader, schemaless_writer
 
+PARSED_SCHEMAS_MAXSIZE = 256
 
-def serialize(dict_data: dict, servo_schema: dict) -> bytes:
+
+class LRUCache:
+    """
+    Thread-safe, bounded mapping that evicts the least recently used key.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def pop(self, key) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+
+_parsed_schemas = LRUCache(PARSED_SCHEMAS_MAXSIZE)
+
+
+def parse(servo_schema: dict, key: Optional[Hashable] = None) -> dict:
+    """
+    Returns the fastavro parsed form of `servo_schema`, parsing it only on first use.
+
+    Schemas are cached by `key` (e.g., their fingerprint) or, by default, by identity. Cache entries
+    hold a reference to the original schema, so its identity can not be reused while cached.
+    """
+    if "__fastavro_parsed" in servo_schema:
+        return servo_schema
+
+    cache_key = key if key is not None else ("id", id(servo_schema))
+
+    cached = _parsed_schemas.get(cache_key)
+    if cached is not None and (key is not None or cached[0] is servo_schema):
+        return cached[1]
+
+    parsed_schema = parse_schema(servo_schema)
+    _parsed_schemas.put(cache_key, (servo_schema, parsed_schema))
+
+    return parsed_schema
+
+
+def parse_json(stringified_schema: str) -> dict:
+    """
+    Returns the fastavro parsed form of a stringified schema, keyed by the string itself so that
+    repeated schemas are neither decoded nor parsed again.
+    """
+    cached = _parsed_schemas.get(stringified_schema)
+    if cached is not None:
+        return cached[1]
+    return parse(json.loads(stringified_schema), key=stringified_schema)
+
+
+def serialize(dict_data: Union[dict, list], servo_schema: dict) -> bytes:
     """
     Serialize `dict_data` using `servo_schema` with Apache Avro.
     """
     with io.BytesIO() as bytes_writer:
-        schemaless_writer(bytes_writer, servo_schema, dict_data)
+        schemaless_writer(bytes_writer, parse(servo_schema), dict_data)
         serialized_data = bytes_writer.getvalue()
     return serialized_data
 
 
-def deserialize(serialized_data: bytes, servo_schema: dict) -> dict:
+class _MemoryViewReader:
+    """
+    File-like reader over a memory view (e.g., a memory-mapped payload) which does not copy the underlying buffer.
+    """
+
+    def __init__(self, view: memoryview):
+        self.view = view
+        self.position = 0
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self.view) if size < 0 else self.position + size
+        data = self.view[self.position : end].tobytes()
+        self.position += len(data)
+        return data
+
+
+def deserialize(serialized_data: Union[bytes, memoryview], servo_schema: dict) -> Union[dict, list]:
     """
     Deserialize `serialized_data` using `servo_schema` with Apache Avro.
     """
-    with io.BytesIO() as bytes_writer:
-        bytes_writer.write(serialized_data)
-        bytes_writer.seek(0)
-        message = schemaless_reader(bytes_writer, servo_schema)
+    if isinstance(serialized_data, memoryview):
+        return schemaless_reader(_MemoryViewReader(serialized_data), parse(servo_schema))
+
+    # initializing the buffer with `serialized_data` shares its memory instead of copying it
+    with io.BytesIO(serialized_data) as bytes_reader:
+        message = schemaless_reader(bytes_reader, parse(servo_schema))
     return message
@@ -1,13 +1,16 @@
-import shutil
 from pathlib import Path
 from socket import gaierror
-from typing import List, Optional, Union
+from typing import IO, List, Optional
 
 from hdfs import InsecureClient
 from urllib3.exceptions import NewConnectionError
 
 from drama.config import settings
+from drama.logger import get_logger
 from drama.storage.base import NotValidScheme, Resource, Storage
+from drama.storage.stream import open_stream
+
+logger = get_logger(__name__)
 
 
 class HDFSResource(Resource):
@@ -15,6 +18,8 @@ class HDFSResource(Resource):
 
 
 class HDFSStorage(Storage):
+    async_uploads = True
+
     def __init__(self, bucket_name: str, folder_name: str):
         super().__init__(bucket_name, folder_name)
         self.client = InsecureClient(url=settings.HDFS_CONN, user=settings.HDFS_USERNAME)
@@ -26,21 +31,15 @@ class HDFSStorage(Storage):
 
         return HDFSResource(resource=f"hdfs:/{self.bucket_name}/{self.folder_name}/")
 
-    def put_file(self, file_path: Union[str, Path], rename: Optional[str] = None) -> HDFSResource:
-        if isinstance(file_path, Path):
-            file_path = str(file_path)
-
-        file_name = Path(file_path).name if not rename else rename
-
-        # copy file to task directory
-        if not file_path.startswith(str(self.local_dir)):
-            file_path = shutil.copy(file_path, Path(self.local_dir, file_name))
-
+    def _upload(self, file_path: str, file_name: str) -> HDFSResource:
         try:
             self.client.upload(f"{self.bucket_name}/{self.folder_name}/{file_name}", file_path)
         except (gaierror, NewConnectionError):
             raise
 
+        return self._resource(file_name)
+
+    def _resource(self, file_name: str) -> HDFSResource:
         return HDFSResource(resource=f"hdfs:/{self.bucket_name}/{self.folder_name}/{file_name}")
 
     def get_file(self, data_file: str) -> str:
@@ -50,13 +49,40 @@ class HDFSStorage(Storage):
         _, bucket_name, folder_name, file_name = data_file.split("/")
         file_path = Path(self.temp_dir, bucket_name, folder_name, file_name)
 
-        if not file_path.is_file():
-            try:
-                self.client.download(data_file, file_path)
-            except Exception as err:
-                print(err)
+        # objects produced in this host are read in place
+        if file_path.is_file():
+            return str(file_path)
+
+        try:
+            checksum = self.client.checksum(data_file)
+            return self._get_cached(
+                f"hdfs:{checksum['algorithm']}:{checksum['bytes']}",
+                file_name,
+                lambda path: self.client.download(data_file, str(path)),
+            )
+        except Exception as err:
+            logger.error(f"Could not get file {data_file} from {self.bucket_name}")
+            logger.exception(err)
+            raise
+
+    def open(self, data_file: str, mode: str = "rb", encoding: Optional[str] = None) -> IO:
+        if not data_file.startswith("hdfs:"):
+            raise NotValidScheme("Object file prefix is invalid: expected `hdfs:`")
+
+        # objects uploaded in background by this task are read once they land
+        self.wait([data_file])
+
+        _, bucket_name, folder_name, file_name = data_file.split("/")
+
+        # objects produced in this host are read in place
+        if Path(self.temp_dir, bucket_name, folder_name, file_name).is_file():
+            return super().open(data_file, mode, encoding)
+
+        size = self.client.status(data_file)["length"]
 
-        return str(file_path)
+        return open_stream(
+            size, lambda offset, stack: stack.enter_context(self.client.read(data_file, offset=offset)), mode, encoding
+        )
 
     def remove_remote_dir(self, omit_files: List[str] = None) -> None:
         pass
@@ -1,9 +1,9 @@
 import os
 import shutil
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import List
 
-from drama.storage.base import Resource, Storage
+from drama.storage.base import Resource, Storage, link_file
 
 
 class LocalResource(Resource):
@@ -11,21 +11,26 @@ class LocalResource(Resource):
 
 
 class LocalStorage(Storage):
-    def put_file(self, file_path: Union[str, Path], rename: Optional[str] = None) -> LocalResource:
-        if isinstance(file_path, Path):
-            file_path = str(file_path)
+    def _stage(self, file_path: str, file_name: str) -> str:
+        staged_path = Path(self.local_dir, file_name)
 
-        file_name = Path(file_path).name if not rename else rename
+        # local directory is the storage itself, so files are copied if they can not be linked
+        if not link_file(file_path, staged_path):
+            shutil.copy(file_path, staged_path)
 
-        if not file_path.startswith(str(self.local_dir)):
-            # copy file to local directory
-            file_path = shutil.copy(file_path, Path(self.local_dir, file_name))
+        return str(staged_path)
 
+    def _upload(self, file_path: str, file_name: str) -> LocalResource:
         # if file is in task directory, rename
-        if rename:
-            Path(file_path).rename(Path(self.local_dir, file_name))
+        if Path(file_path).name != file_name:
+            renamed_path = str(Path(self.local_dir, file_name))
+            os.replace(file_path, renamed_path)
+            file_path = renamed_path
 
-        return LocalResource(resource=str(file_path))
+        return LocalResource(resource=file_path)
+
+    def _resource(self, file_name: str) -> LocalResource:
+        return LocalResource(resource=str(Path(self.local_dir, file_name)))
 
     def get_file(self, data_file: str) -> str:
         # Use os.path.isfile(data_file) instead of Path(data_file).is_file()
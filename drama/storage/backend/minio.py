@@ -1,23 +1,72 @@
-import shutil
+import math
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import IO, List, Optional, Tuple
 
-from filelock import FileLock
 from minio import Minio
+from minio.datatypes import Part
 from minio.error import S3Error
 
 from drama.config import settings
 from drama.logger import get_logger
 from drama.storage.base import NotValidScheme, Resource, Storage
+from drama.storage.stream import RangeStream, open_stream
 
 logger = get_logger(__name__)
 
+# S3 rejects parts smaller than 5MB (but the last one) and uploads of more than 10000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+# size of the buffers read from a ranged download before writing them to disk
+CHUNK_SIZE = 1024 * 1024
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Returns the thread pool shared by all MinIO transfers of this worker, created on first use.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.MINIO_CONCURRENCY, thread_name_prefix="minio")
+    return _executor
+
+
+def part_ranges(size: int, part_size: int) -> List[Tuple[int, int]]:
+    """
+    Splits an object of `size` bytes into (offset, length) parts of at most `part_size` bytes.
+    """
+    return [(offset, min(part_size, size - offset)) for offset in range(0, size, part_size)]
+
+
+def _gather(futures: List[Future]) -> list:
+    """
+    Returns results of `futures`. If any of them fails, pending futures are cancelled and running ones are
+    awaited before raising, so that no part is transferred after returning.
+    """
+    try:
+        return [future.result() for future in futures]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        raise
+
 
 class MinIOResource(Resource):
     scheme = "minio://"
 
 
 class MinIOStorage(Storage):
+    async_uploads = True
+
     def __init__(self, bucket_name: str, folder_name: List[str]):
         root_bucket = settings.MINIO_BUCKET
         if root_bucket:
@@ -45,29 +94,20 @@ class MinIOStorage(Storage):
 
         return MinIOResource(resource=f"minio://{self.bucket_name}/")
 
-    def put_file(self, file_path: Union[str, Path], rename: Optional[str] = None) -> MinIOResource:
-        if isinstance(file_path, Path):
-            file_path = str(file_path)
-
-        file_name = Path(file_path).name if not rename else rename
-
-        # copy file to current task directory
-        if not file_path.startswith(str(self.local_dir)):
-            file_path = shutil.copy(file_path, Path(self.local_dir, file_name))
-
+    def _upload(self, file_path: str, file_name: str) -> MinIOResource:
         object_name = str(Path(*self.folder_name, file_name))
 
         try:
-            self.client.fput_object(
-                bucket_name=self.bucket_name,
-                object_name=object_name,
-                file_path=file_path,
-            )
+            self._put_object(file_path, object_name)
         except S3Error as err:
             logger.error(f"Could not upload file {object_name} to {self.bucket_name}")
             logger.exception(err)
             raise
 
+        return self._resource(file_name)
+
+    def _resource(self, file_name: str) -> MinIOResource:
+        object_name = str(Path(*self.folder_name, file_name))
         return MinIOResource(resource=f"minio://{self.bucket_name}/{object_name}")
 
     def get_file(self, data_file: str) -> str:
@@ -82,26 +122,124 @@ class MinIOStorage(Storage):
 
         file_path = Path(self.temp_dir, bucket_name, object_name)
 
-        # in some cases, the output directory might be missing
-        #  e.g., when the `data_file` comes from another workflow
-        file_path.parents[0].mkdir(parents=True, exist_ok=True)
+        # objects produced in this host are read in place
+        if file_path.is_file():
+            return str(file_path)
+
+        try:
+            size, etag = self._stat_object(bucket_name, object_name)
+            return self._get_cached(
+                f"minio:{etag}",
+                file_path.name,
+                lambda path: self._get_object(bucket_name, object_name, path, size),
+            )
+        except S3Error as err:
+            logger.error(f"Could not get file {object_name} from {self.bucket_name}")
+            logger.exception(err)
+            raise
+
+    def open(self, data_file: str, mode: str = "rb", encoding: Optional[str] = None) -> IO:
+        if not data_file.startswith("minio://"):
+            raise NotValidScheme(f"Object file prefix for '{data_file}' is invalid: expected `minio://`")
+
+        # objects uploaded in background by this task are read once they land
+        self.wait([data_file])
 
-        file_lock = FileLock(str(file_path) + ".lock")  # avoid race: https://github.com/minio/minio-py/issues/854
+        bucket_name, object_name = data_file[len("minio://") :].split("/", 1)
 
-        with file_lock:
-            if not file_path.is_file():
-                try:
-                    self.client.fget_object(
-                        bucket_name=bucket_name,
-                        object_name=object_name,
-                        file_path=(str(file_path)),
+        # objects produced in this host are read in place
+        if Path(self.temp_dir, bucket_name, object_name).is_file():
+            return super().open(data_file, mode, encoding)
+
+        try:
+            size, _ = self._stat_object(bucket_name, object_name)
+        except S3Error as err:
+            logger.error(f"Could not get file {object_name} from {self.bucket_name}")
+            logger.exception(err)
+            raise
+
+        def open_range(offset: int, stack: ExitStack) -> RangeStream:
+            response = self.client.get_object(bucket_name, object_name, offset=offset)
+            stack.callback(response.release_conn)
+            stack.callback(response.close)
+            return response
+
+        return open_stream(size, open_range, mode, encoding)
+
+    def _stat_object(self, bucket_name: str, object_name: str) -> Tuple[int, str]:
+        """
+        Returns size and etag of an object.
+        """
+        stat = self.client.stat_object(bucket_name, object_name)
+        if stat.size is None or stat.etag is None:
+            raise ValueError(f"Could not get size or etag of object {object_name} from {bucket_name}")
+        return stat.size, stat.etag
+
+    def _put_object(self, file_path: str, object_name: str) -> None:
+        """
+        Uploads `file_path` with a single request or, if larger than a part, with a parallel multipart upload.
+        """
+        size = os.path.getsize(file_path)
+        part_size = max(settings.MINIO_PART_SIZE, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+
+        if size <= part_size:
+            self.client.fput_object(bucket_name=self.bucket_name, object_name=object_name, file_path=file_path)
+            return
+
+        upload_id = self.client._create_multipart_upload(
+            self.bucket_name, object_name, {"Content-Type": "application/octet-stream"}
+        )
+
+        try:
+            with open(file_path, "rb") as f:
+                futures = [
+                    get_executor().submit(
+                        self._upload_part, f.fileno(), object_name, upload_id, part_number, offset, length
                     )
-                except S3Error as err:
-                    logger.error(f"Could not get file {object_name} from {self.bucket_name}")
-                    logger.exception(err)
-                    raise
+                    for part_number, (offset, length) in enumerate(part_ranges(size, part_size), start=1)
+                ]
+                etags = _gather(futures)
+
+            parts = [Part(part_number, etag) for part_number, etag in enumerate(etags, start=1)]
+            self.client._complete_multipart_upload(self.bucket_name, object_name, upload_id, parts)
+        except BaseException:
+            self.client._abort_multipart_upload(self.bucket_name, object_name, upload_id)
+            raise
 
-        return str(file_path)
+    def _upload_part(
+        self, fd: int, object_name: str, upload_id: str, part_number: int, offset: int, length: int
+    ) -> str:
+        # parts are read by the pool threads, so at most `MINIO_CONCURRENCY` parts are held in memory
+        data = os.pread(fd, length, offset)
+        return self.client._upload_part(self.bucket_name, object_name, data, None, upload_id, part_number)
+
+    def _get_object(self, bucket_name: str, object_name: str, file_path: Path, size: int) -> None:
+        """
+        Downloads an object of `size` bytes with a single request or, if larger than a part, with parallel
+        ranged requests.
+        """
+        if size <= settings.MINIO_PART_SIZE:
+            self.client.fget_object(bucket_name=bucket_name, object_name=object_name, file_path=str(file_path))
+            return
+
+        # cache downloads into a temporary file, so an incomplete download is never taken for the object
+        with open(file_path, "wb") as f:
+            f.truncate(size)
+            futures = [
+                get_executor().submit(self._download_part, f.fileno(), bucket_name, object_name, offset, length)
+                for offset, length in part_ranges(size, settings.MINIO_PART_SIZE)
+            ]
+            _gather(futures)
+
+    def _download_part(self, fd: int, bucket_name: str, object_name: str, offset: int, length: int) -> None:
+        response = self.client.get_object(bucket_name, object_name, offset=offset, length=length)
+        try:
+            for chunk in response.stream(CHUNK_SIZE):
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+        finally:
+            response.close()
+            response.release_conn()
 
     def remove_remote_dir(self, omit_files: List[str] = None) -> None:
         # todo
@@ -1,16 +1,23 @@
 import os
 import shutil
+import threading
+import uuid
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import IO, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 from pydantic import BaseModel, validator
 
 from drama.config import settings
 from drama.logger import get_logger
+from drama.storage.cache import get_cache
 
 logger = get_logger(__name__)
 
+# linux ioctl that shares the extents of a file on copy-on-write file systems (e.g., btrfs or xfs)
+FICLONE = 0x40049409
+
 
 class NotValidScheme(Exception):
     """
@@ -40,7 +47,64 @@ class LocalResource(Resource):
     pass
 
 
+def link_file(src: Union[str, Path], dst: Union[str, Path]) -> bool:
+    """
+    Makes `src` available at `dst` without copying its content, with a reflink (so that later writes to any of them
+    are not shared) or else a hard link. Returns false if neither is supported, e.g., across file systems.
+
+    An existing `dst` is only replaced once the new link exists, and it is kept as it is if it already is `src`
+    (e.g., under another path).
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return True
+
+    # links are made under a temporary name next to `dst`, which is then atomically replaced
+    tmp_dst = Path(Path(dst).parent, f".{Path(dst).name}.{uuid.uuid4().hex}")
+
+    try:
+        try:
+            import fcntl
+
+            with open(src, "rb") as src_file, open(tmp_dst, "wb") as dst_file:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except (ImportError, OSError):
+            if os.path.lexists(tmp_dst):
+                os.remove(tmp_dst)
+            try:
+                os.link(src, tmp_dst)
+            except OSError:
+                return False
+
+        os.replace(tmp_dst, dst)
+        return True
+    finally:
+        if os.path.lexists(tmp_dst):
+            os.remove(tmp_dst)
+
+
+_uploader: Optional[Tuple[ThreadPoolExecutor, threading.BoundedSemaphore]] = None
+_uploader_lock = threading.Lock()
+
+
+def get_uploader(max_uploads: int) -> Tuple[ThreadPoolExecutor, threading.BoundedSemaphore]:
+    """
+    Returns the thread pool of this worker that uploads files in background, created on first use, along with
+    the semaphore that bounds the number of uploads in flight to `max_uploads`.
+    """
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None:
+            _uploader = (
+                ThreadPoolExecutor(max_workers=max_uploads, thread_name_prefix="uploader"),
+                threading.BoundedSemaphore(max_uploads),
+            )
+    return _uploader
+
+
 class Storage(ABC):
+    # backends which know the resource of a file before uploading it can upload in background
+    async_uploads = False
+
     def __init__(self, bucket_name: str, folder_name: List[str]):
         self.bucket_name = bucket_name
 
@@ -52,6 +116,13 @@ class Storage(ABC):
         self.temp_dir = settings.DATA_DIR
         self.local_dir = Path(self.temp_dir, self.bucket_name, *self.folder_name)
 
+        # objects read from cache, which must not be evicted while this task is running
+        self._pinned: List[str] = []
+
+        # background uploads by resource
+        self._pending_uploads: Dict[str, Future] = {}
+        self._uploads_lock = threading.Lock()
+
     def setup(self) -> LocalResource:
         """
         Setup directory tree.
@@ -59,10 +130,86 @@ class Storage(ABC):
         self.local_dir.mkdir(parents=True, exist_ok=True)
         return LocalResource(resource=str(self.local_dir))
 
-    @abstractmethod
     def put_file(self, file_path: Union[str, Path], rename: Optional[str] = None) -> Resource:
         """
         Uploads an object to storage and returns its data file identifier.
+
+        If `ASYNC_UPLOADS` is set, remote storages return right away and upload the file in background (see `wait`),
+        so it must not be modified nor removed until then.
+        """
+        file_path = str(file_path)
+        file_name = Path(file_path).name if not rename else rename
+
+        # paths are compared once resolved, as files in task directory might be given under another path
+        local_dir = Path(self.local_dir).resolve()
+        file_dir = Path(file_path).parent.resolve()
+        if file_dir == local_dir or local_dir in file_dir.parents:
+            file_path = str(Path(self.local_dir, file_dir.relative_to(local_dir), Path(file_path).name))
+        else:
+            file_path = self._stage(file_path, file_name)
+
+        if not (settings.ASYNC_UPLOADS and self.async_uploads):
+            return self._upload(file_path, file_name)
+
+        resource = self._resource(file_name)
+
+        # a file put again replaces the previous upload, so it must land first
+        self.wait([resource.resource])
+
+        uploader, upload_slots = get_uploader(settings.ASYNC_UPLOADS)
+        # blocks while `ASYNC_UPLOADS` uploads are in flight
+        upload_slots.acquire()
+        try:
+            future = uploader.submit(self._upload, file_path, file_name)
+        except BaseException:
+            upload_slots.release()
+            raise
+        future.add_done_callback(lambda _: upload_slots.release())
+
+        with self._uploads_lock:
+            self._pending_uploads[resource.resource] = future
+
+        return resource
+
+    def wait(self, resources: Optional[Iterable[str]] = None) -> None:
+        """
+        Waits for background uploads of `resources` (all of them, by default) to complete. Errors of failed
+        uploads are raised once.
+        """
+        with self._uploads_lock:
+            if not self._pending_uploads:
+                return
+            if resources is None:
+                resources = list(self._pending_uploads)
+            pending = {r: self._pending_uploads[r] for r in resources if r in self._pending_uploads}
+
+        for resource, future in pending.items():
+            try:
+                future.result()
+            finally:
+                with self._uploads_lock:
+                    if self._pending_uploads.get(resource) is future:
+                        del self._pending_uploads[resource]
+
+    def _stage(self, file_path: str, file_name: str) -> str:
+        """
+        Links a file from outside `local_dir` into it, so that reads from this host find it on disk. Files that
+        can not be linked are uploaded from their original location instead of being copied.
+        """
+        staged_path = Path(self.local_dir, file_name)
+        return str(staged_path) if link_file(file_path, staged_path) else file_path
+
+    @abstractmethod
+    def _upload(self, file_path: str, file_name: str) -> Resource:
+        """
+        Uploads `file_path` to task directory in storage as `file_name`.
+        """
+        pass
+
+    @abstractmethod
+    def _resource(self, file_name: str) -> Resource:
+        """
+        Returns the data file identifier of `file_name` once uploaded, required to upload in background.
         """
         pass
 
@@ -73,6 +220,31 @@ class Storage(ABC):
         """
         pass
 
+    def open(self, data_file: str, mode: str = "rb", encoding: Optional[str] = None) -> IO:
+        """
+        Opens an object for reading. Remote storages stream objects instead of downloading them first, so that
+        reading starts right away with constant memory.
+        """
+        if mode not in ("r", "rb"):
+            raise ValueError(f"Invalid mode ({mode}): objects can only be read")
+        return open(self.get_file(data_file), mode, encoding=encoding)
+
+    def _get_cached(self, etag: str, file_name: str, fetch: Callable[[Path], None]) -> str:
+        """
+        Returns the path of a remote object from the object cache of this host, fetching it on a miss.
+        """
+        file_path = get_cache().get(etag, file_name, fetch)
+        self._pinned.append(etag)
+        return str(file_path)
+
+    def close(self) -> None:
+        """
+        Releases objects read by this storage, so that they can be evicted from cache.
+        """
+        for etag in self._pinned:
+            get_cache().unpin(etag)
+        self._pinned = []
+
     def remove_local_dir(self, omit_files: List[str] = None) -> None:
         """
         Remove `task_dir` local directory from system.
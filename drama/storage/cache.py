@@ -0,0 +1,207 @@
+import hashlib
+import os
+import shutil
+import socket
+import stat
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+from filelock import FileLock, Timeout
+
+from drama.config import settings
+from drama.logger import get_logger
+
+logger = get_logger(__name__)
+
+DATA_FILE_NAME = "data"
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ObjectCache:
+    """
+    Content-addressed cache of remote objects, shared by all workers of a host.
+
+    Objects are stored by their ETag (or checksum), so that an object modified in storage is never served stale
+    and the same object read by several workflows is kept once. Least recently used objects are evicted once the
+    cache grows beyond `max_bytes`, except those pinned by running tasks of any worker.
+
+    Objects are shared by every task reading them, so they are stored read-only and must never be modified in place.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _entry_dir(self, etag: str) -> Path:
+        return Path(self.directory, hashlib.sha256(etag.encode()).hexdigest())
+
+    def _pin_file(self, entry_dir: Path) -> Path:
+        # pins are keyed by host too, as cache directories might be shared by several hosts
+        return Path(entry_dir, ".pins", f"{socket.gethostname()}.{os.getpid()}")
+
+    @contextmanager
+    def _locked(self, entry_dir: Path, timeout: float = -1) -> Iterator[None]:
+        """
+        Locks an entry for this worker. Lock files are removed along with evicted entries, so locks acquired on
+        a removed file (i.e., the file at its path has changed meanwhile) are acquired again.
+        """
+        lock_path = f"{entry_dir}.lock"
+        while True:
+            try:
+                inode: Optional[int] = os.stat(lock_path).st_ino
+            except FileNotFoundError:
+                inode = None
+            with FileLock(lock_path, timeout=timeout):
+                try:
+                    current_inode: Optional[int] = os.stat(lock_path).st_ino
+                except FileNotFoundError:
+                    current_inode = None
+                if inode is not None and inode == current_inode:
+                    yield
+                    return
+
+    def get(self, etag: str, file_name: str, fetch: Callable[[Path], None]) -> Path:
+        """
+        Returns the path of the object identified by `etag`, named `file_name`. On a miss, `fetch` is called to
+        download the object into the given path.
+
+        Returned objects are pinned, so callers must `unpin` them once they are no longer read.
+        """
+        entry_dir = self._entry_dir(etag)
+        data_path = Path(entry_dir, DATA_FILE_NAME)
+        file_path = Path(entry_dir, file_name)
+
+        with self._locked(entry_dir):
+            entry_dir.mkdir(exist_ok=True)
+            self.pin(etag)
+
+            try:
+                if data_path.is_file():
+                    # modification time keeps track of usage across workers
+                    os.utime(data_path)
+                    with self._lock:
+                        self.hits += 1
+                else:
+                    # objects are fetched into a temporary file, so that incomplete downloads are never served
+                    tmp_path = Path(entry_dir, f"{DATA_FILE_NAME}.part")
+                    try:
+                        fetch(tmp_path)
+                        os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                        os.replace(tmp_path, data_path)
+                    finally:
+                        if tmp_path.is_file():
+                            tmp_path.unlink()
+                    with self._lock:
+                        self.misses += 1
+
+                # entries are linked under every name they are read by, without taking more space
+                if not file_path.is_file():
+                    os.link(data_path, file_path)
+            except BaseException:
+                self.unpin(etag)
+                raise
+
+        self.evict()
+
+        return file_path
+
+    def pin(self, etag: str) -> None:
+        """
+        Prevents the object identified by `etag` from being evicted.
+        """
+        with self._lock:
+            self._pins[etag] = self._pins.get(etag, 0) + 1
+            if self._pins[etag] == 1:
+                pin_file = self._pin_file(self._entry_dir(etag))
+                pin_file.parent.mkdir(exist_ok=True)
+                pin_file.touch()
+
+    def unpin(self, etag: str) -> None:
+        with self._lock:
+            self._pins[etag] = self._pins.get(etag, 0) - 1
+            if self._pins[etag] <= 0:
+                del self._pins[etag]
+                pin_file = self._pin_file(self._entry_dir(etag))
+                if pin_file.is_file():
+                    pin_file.unlink()
+
+    def _is_pinned(self, entry_dir: Path) -> bool:
+        hostname = socket.gethostname()
+        for pin_file in Path(entry_dir, ".pins").glob("*"):
+            host, pid = pin_file.name.rsplit(".", 1)
+            # pins of crashed workers are ignored, but liveness of workers in other hosts can not be checked
+            if host != hostname or _is_alive(int(pid)):
+                return True
+        return False
+
+    def evict(self) -> None:
+        """
+        Removes least recently used objects until the cache fits in its budget.
+        """
+        entries = []
+        for entry_dir in self.directory.iterdir():
+            try:
+                stat = Path(entry_dir, DATA_FILE_NAME).stat()
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_dir))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+
+        for _, entry_size, entry_dir in sorted(entries, key=lambda entry: entry[0]):
+            if size <= self.max_bytes:
+                break
+
+            try:
+                # entries being read or written by other workers are skipped
+                with self._locked(entry_dir, timeout=0):
+                    if self._is_pinned(entry_dir):
+                        continue
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    os.unlink(f"{entry_dir}.lock")
+            except Timeout:
+                continue
+
+            size -= entry_size
+            with self._lock:
+                self.evictions += 1
+
+            logger.debug(f"Evicted {entry_dir} ({entry_size} bytes) from object cache")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+
+_cache: Optional[ObjectCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ObjectCache:
+    """
+    Returns the object cache of this worker, created on first use.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ObjectCache(Path(settings.DATA_DIR, ".cache"), settings.STORAGE_CACHE_SIZE)
+    return _cache
@@ -0,0 +1,125 @@
+import io
+from contextlib import ExitStack
+from typing import IO, Callable, Optional
+
+from typing_extensions import Protocol
+
+from drama.config import settings
+
+# forward seeks up to this distance (in bytes) read through the open stream instead of requesting a new range
+SEEK_SKIP_BYTES = 1024 * 1024
+
+
+class RangeStream(Protocol):
+    """
+    Stream of a range of a remote object, such as a streaming HTTP response. Streams implementing `readinto` are
+    read without copying.
+    """
+
+    def read(self, __size: int) -> bytes:
+        ...
+
+
+class RangeReader(io.RawIOBase):
+    """
+    Seekable, read-only stream over a remote object of `size` bytes.
+
+    Objects are read thought a single streaming response, opened by `open_range` from the current position until
+    the end of the object. Seeking away from the current position opens a new range on the next read.
+    """
+
+    def __init__(self, size: int, open_range: Callable[[int, ExitStack], RangeStream]):
+        """
+        :param size: Object size.
+        :param open_range: Function that returns a stream from the given offset until the end of the object, whose
+            resources are released with the given exit stack.
+        """
+        self.size = size
+        self.open_range = open_range
+        self.position = 0
+        self._stream: Optional[RangeStream] = None
+        self._stack = ExitStack()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed stream")
+
+        if self.position >= self.size or len(buffer) == 0:
+            return 0
+
+        if self._stream is None:
+            self._stream = self.open_range(self.position, self._stack)
+
+        view = memoryview(buffer).cast("B")[: self.size - self.position]
+        readinto = getattr(self._stream, "readinto", None)
+        if readinto is not None:
+            n = readinto(view)
+        else:
+            data = self._stream.read(len(view))
+            n = len(data)
+            view[:n] = data
+
+        if not n:
+            raise OSError(f"Stream ended at {self.position} of {self.size} bytes")
+
+        self.position += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+
+        if self._stream is not None and position != self.position:
+            if 0 < position - self.position <= SEEK_SKIP_BYTES and position <= self.size:
+                while self.position < position:
+                    self.read(position - self.position)
+            else:
+                self._close_stream()
+
+        self.position = position
+        return position
+
+    def _close_stream(self) -> None:
+        self._stream = None
+        self._stack.close()
+        self._stack = ExitStack()
+
+    def close(self) -> None:
+        if not self.closed:
+            self._close_stream()
+        super().close()
+
+
+def open_stream(
+    size: int, open_range: Callable[[int, ExitStack], RangeStream], mode: str = "rb", encoding: Optional[str] = None
+) -> IO:
+    """
+    Returns a file object over a remote object, buffered with `STORAGE_READ_AHEAD` bytes. See `RangeReader`.
+    """
+    if mode not in ("r", "rb"):
+        raise ValueError(f"Invalid mode ({mode}): remote objects can only be read")
+
+    reader = io.BufferedReader(RangeReader(size, open_range), buffer_size=settings.STORAGE_READ_AHEAD)
+
+    if mode == "r":
+        return io.TextIOWrapper(reader, encoding=encoding)
+
+    return reader
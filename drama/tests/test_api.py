@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+from datetime import datetime
+from unittest import mock
+from unittest.mock import MagicMock
+
+from drama.api.cache import ResponseCache, compute_etag, etag_matches
+from drama.api.routes.workflow import status, status_cache
+from drama.models.task import TaskStatus
+from drama.models.workflow import TaskInDb, WorkflowInDb, WorkflowStatus
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def test_should_expire_responses(self):
+        cache = ResponseCache(maxsize=2, ttl=-1)
+        cache.put("key", '"etag"', b"{}")
+
+        self.assertIsNone(cache.get("key"))
+
+    def test_should_match_etags(self):
+        etag = compute_etag(datetime(2021, 1, 1), 3)
+
+        self.assertTrue(etag_matches(etag, etag))
+        self.assertTrue(etag_matches(etag, f'"other", W/{etag}'))
+        self.assertTrue(etag_matches(etag, "*"))
+        self.assertFalse(etag_matches(etag, '"other"'))
+        self.assertFalse(etag_matches(etag, None))
+
+
+class StatusTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.workflow = dict(
+            WorkflowInDb(id="workflow_id", updated_at=datetime(2021, 1, 1), status=WorkflowStatus.STATUS_DONE).dict(),
+            task_counts_seq=2,
+        )
+        self.find_tasks = mock.patch("drama.api.routes.workflow.AsyncTaskManager.find", side_effect=self._find_tasks)
+        self.find_workflow = mock.patch(
+            "drama.api.routes.workflow.AsyncWorkflowManager.find_one_raw", side_effect=self._find_workflow
+        )
+        self.find_tasks.start()
+        self.find_workflow.start()
+
+    async def _find_workflow(self, **query):
+        return self.workflow
+
+    async def _find_tasks(self, **query):
+        return [TaskInDb(id="task_id", parent="workflow_id")]
+
+    def test_should_return_not_modified_if_etag_matches(self):
+        response = asyncio.run(status(id="workflow_id", if_none_match=None, db=MagicMock()))
+        etag = response.headers["ETag"]
+
+        status_cache.invalidate("workflow_id")
+        not_modified = asyncio.run(status(id="workflow_id", if_none_match=etag, db=MagicMock()))
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(304, not_modified.status_code)
+
+    def test_should_serve_finished_workflows_from_cache(self):
+        response = asyncio.run(status(id="workflow_id", if_none_match=None, db=MagicMock()))
+
+        self.workflow = None
+        cached_response = asyncio.run(status(id="workflow_id", if_none_match=None, db=MagicMock()))
+
+        self.assertEqual(response.body, cached_response.body)
+        self.assertEqual(response.headers["ETag"], cached_response.headers["ETag"])
+
+    def test_should_not_cache_failed_workflows_with_running_tasks(self):
+        self.workflow["status"] = WorkflowStatus.STATUS_FAILED
+        self.workflow["task_counts"] = {TaskStatus.STATUS_FAILED: 1, TaskStatus.STATUS_RUNNING: 1}
+        asyncio.run(status(id="workflow_id", if_none_match=None, db=MagicMock()))
+
+        self.assertIsNone(status_cache.get("workflow_id"))
+
+        self.workflow["task_counts"] = {TaskStatus.STATUS_FAILED: 1, TaskStatus.STATUS_DONE: 1}
+        asyncio.run(status(id="workflow_id", if_none_match=None, db=MagicMock()))
+
+        self.assertIsNotNone(status_cache.get("workflow_id"))
+
+    def tearDown(self) -> None:
+        self.find_tasks.stop()
+        self.find_workflow.stop()
+        status_cache.invalidate("workflow_id")
+
+
+if __name__ == "__main__":
+    unittest.main()
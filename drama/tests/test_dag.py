@@ -0,0 +1,95 @@
+import unittest
+
+from drama.models.task import Task
+from drama.models.workflow import Workflow
+from drama.worker.dag import (
+    CyclicWorkflowError,
+    DuplicateTaskError,
+    MissingInputError,
+    WorkflowGraph,
+)
+
+
+class WorkflowGraphTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        # First -> Second -> Third, and a leaf task in parallel
+        self.workflow = Workflow(
+            tasks=[
+                Task(name="First", module="first"),
+                Task(name="Second", module="second", inputs={"Input": "First.Data"}),
+                Task(name="Third", module="third", inputs={"Input1": "Second.Data", "Input2": "First.Data"}),
+                Task(name="Leaf", module="leaf"),
+            ]
+        )
+
+    def test_should_compute_upstream_and_downstream_tasks(self):
+        graph = WorkflowGraph(self.workflow)
+
+        self.assertEqual(["First", "Leaf"], graph.sources)
+        self.assertEqual(["Second", "First"], graph.upstream["Third"])
+        self.assertEqual(["Second", "Third"], graph.downstream["First"])
+
+    def test_should_compute_execution_levels(self):
+        graph = WorkflowGraph(self.workflow)
+
+        self.assertEqual([["First", "Leaf"], ["Second"], ["Third"]], graph.levels())
+
+    def test_should_raise_exception_when_workflow_is_cyclic(self):
+        workflow = Workflow(
+            tasks=[
+                Task(name="First", module="first"),
+                Task(name="Second", module="second", inputs={"Input1": "First.Data", "Input2": "Third.Data"}),
+                Task(name="Third", module="third", inputs={"Input": "Second.Data"}),
+            ]
+        )
+
+        with self.assertRaises(CyclicWorkflowError):
+            WorkflowGraph(workflow).levels()
+
+    def test_should_raise_exception_when_input_task_is_missing(self):
+        workflow = Workflow(tasks=[Task(name="First", module="first", inputs={"Input": "Missing.Data"})])
+
+        with self.assertRaises(MissingInputError):
+            WorkflowGraph(workflow).levels()
+
+    def test_should_raise_exception_when_task_names_are_duplicated(self):
+        workflow = Workflow.construct(tasks=[Task(name="First", module="first"), Task(name="First", module="second")])
+
+        with self.assertRaises(DuplicateTaskError):
+            WorkflowGraph(workflow)
+
+    def test_should_compute_levels_of_large_workflows(self):
+        # every task depends on the previous one and on the first task
+        tasks = [Task(name="Task0", module="test")]
+        for i in range(1, 10000):
+            tasks.append(Task(name=f"Task{i}", module="test", inputs={"A": f"Task{i - 1}.Data", "B": "Task0.Data"}))
+
+        levels = WorkflowGraph(Workflow(tasks=tasks)).levels()
+
+        self.assertEqual(10000, len(levels))
+        self.assertEqual(10000, len(WorkflowGraph(Workflow(tasks=tasks)).remaining_paths({})))
+
+    def test_should_compute_longest_remaining_paths(self):
+        graph = WorkflowGraph(self.workflow)
+
+        paths = graph.remaining_paths({"first": 1.0, "second": 2.0, "third": 3.0})
+
+        self.assertEqual({"First": 6.0, "Second": 5.0, "Third": 3.0, "Leaf": 2.0}, paths)
+
+    def test_should_prioritize_critical_path(self):
+        graph = WorkflowGraph(self.workflow)
+
+        priorities = graph.priorities({"first": 1.0, "second": 1.0, "third": 1.0, "leaf": 10.0}, max_priority=10)
+
+        self.assertEqual({"First": 3, "Second": 2, "Third": 1, "Leaf": 10}, priorities)
+
+    def test_should_weight_unknown_modules_with_mean_duration(self):
+        graph = WorkflowGraph(self.workflow)
+
+        paths = graph.remaining_paths({"first": 1.0, "leaf": 3.0})
+
+        self.assertEqual({"First": 5.0, "Second": 4.0, "Third": 2.0, "Leaf": 3.0}, paths)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -257,6 +257,43 @@ class TabularDatasetTestCase(unittest.TestCase):
 
         self.assertEqual(data_chunk_schema, parsed_schema)
 
+    def test_should_cache_schema_per_class(self) -> None:
+        @dataclass
+        class DataChuck(DataType):
+            my_number: int = is_integer()
+
+        self.assertIs(get_schema(DataChuck(0)), get_schema(DataChuck(1)))
+        self.assertIs(get_schema(DataChuck), get_schema(DataChuck(1)))
+
+    def test_should_regenerate_schema_when_config_changes(self) -> None:
+        @dataclass
+        class DataChuck(DataType):
+            my_number: int = is_integer()
+
+            class Config:
+                namespace = "test_datatype"
+
+        self.assertEqual("test_datatype", get_schema(DataChuck(0))["namespace"])
+
+        DataChuck.Config.namespace = "test_datatype_changed"
+
+        self.assertEqual("test_datatype_changed", get_schema(DataChuck(0))["namespace"])
+
+    def test_should_generate_dict_with_inner_datatypes(self) -> None:
+        @dataclass
+        class InnerDataChunk(DataType):
+            my_number: int = is_integer()
+
+        @dataclass
+        class DataChuck(DataType):
+            my_data: DataType = is_datatype(InnerDataChunk)
+            my_list: list = is_list(items=InnerDataChunk)
+
+        is_dict = {"my_data": {"my_number": 0}, "my_list": [{"my_number": 1}, {"my_number": 2}]}
+        as_dict = get_dict(DataChuck(InnerDataChunk(0), [InnerDataChunk(1), InnerDataChunk(2)]))
+
+        self.assertEqual(is_dict, as_dict)
+
     def test_should_raised_exception_when_non_default_arg_follows_default(self) -> None:
         with self.assertRaises(TypeError):
 
@@ -1,6 +1,19 @@
+import asyncio
 import unittest
-
-from drama.manager import TaskManager, WorkflowManager
+from datetime import datetime
+from unittest import mock
+from unittest.mock import MagicMock
+
+from pymongo import ASCENDING
+
+from drama.manager import (
+    AsyncEventManager,
+    AsyncTaskManager,
+    AsyncWorkflowManager,
+    TaskManager,
+    WorkflowManager,
+)
+from drama.models.task import TaskStatus
 from drama.models.workflow import TaskInDb, WorkflowInDb, WorkflowStatus
 
 
@@ -40,12 +53,25 @@ class _MongoClient:
                 doc.update(update["$set"])
                 break
 
+    def find_one_and_update(self, query: dict, update: dict, **kwargs):
+        """
+        Update (with `$set` or `$pull`) first document from collection based on query and return it.
+        """
+        for doc in self.collection:
+            if self._is_subset(query, doc):
+                doc.update(update.get("$set", {}))
+                for key, value in update.get("$pull", {}).items():
+                    doc[key] = [item for item in doc[key] if item != value]
+                return doc
+
     @staticmethod
     def _is_subset(a: dict, b: dict) -> bool:
         """
-        Returns if `a` items are contained in `b`.
+        Returns if `a` items are contained in `b`. Array fields match any of their elements.
         """
-        return all(item in b.items() for item in a.items())
+        return all(
+            key in b and (b[key] == value or (isinstance(b[key], list) and value in b[key])) for key, value in a.items()
+        )
 
     def __getattr__(self, item):
         return self
@@ -98,6 +124,43 @@ class TaskManagerTestCase(unittest.TestCase):
         self.assertEqual(old_task, TaskInDb(id="new_id", name="my_task", module="new_module").dict())
         self.assertEqual(new_task, TaskInDb(id="new_id", name="new_task_name", module="new_module").dict())
 
+    def test_should_get_raw_task_with_projection(self):
+        db = _MongoClient()
+        db.collection = [
+            TaskInDb(id="task_id", parent="parent_id").dict(),
+        ]
+        manager = TaskManager(db=db)
+
+        self.assertEqual(db.collection, manager.find_raw(parent="parent_id", projection=["status"]))
+        self.assertEqual(db.collection[0], manager.find_one_raw(id="task_id", projection=["status"]))
+
+    def test_should_project_fields(self):
+        self.assertEqual({"_id": False, "id": True, "status": True}, TaskManager._projection(["status"]))
+        self.assertIsNone(TaskManager._projection(None))
+
+    def test_should_create_tasks_within_single_round_trip(self):
+        db = MagicMock()
+        manager = TaskManager(db=db)
+
+        manager.bulk_create_or_update(
+            [TaskInDb(id="task_1"), TaskInDb(id="task_2")], extra_fields={"task_2": {"pending_upstream": ["A"]}}
+        )
+
+        db.dramatask.bulk_write.assert_called_once()
+        self.assertEqual(2, len(db.dramatask.bulk_write.call_args.args[0]))
+
+    def test_should_release_task_once_every_upstream_task_has_started(self):
+        db = _MongoClient()
+        db.collection = [
+            dict(TaskInDb(id="task_id", parent="parent_id").dict(), pending_upstream=["A", "B"], message={"id": 1}),
+        ]
+        manager = TaskManager(db=db)
+
+        self.assertEqual([], manager.release(parent="parent_id", upstream_name="A"))
+        self.assertEqual([], manager.release(parent="parent_id", upstream_name="A"))
+        self.assertEqual([{"id": 1}], manager.release(parent="parent_id", upstream_name="B"))
+        self.assertEqual([], manager.release(parent="parent_id", upstream_name="B"))
+
 
 class WorkflowManagerTestCase(unittest.TestCase):
     def test_should_get_workflow_from_id(self):
@@ -129,6 +192,192 @@ class WorkflowManagerTestCase(unittest.TestCase):
         self.assertEqual(old_workflow, WorkflowInDb(id="new_id", status=WorkflowStatus.STATUS_PENDING).dict())
         self.assertEqual(new_workflow, WorkflowInDb(id="new_id", status=WorkflowStatus.STATUS_RUNNING).dict())
 
+    def test_should_count_task_transition(self):
+        db = MagicMock()
+        db.dramaworkflow.find_one_and_update.return_value = dict(
+            WorkflowInDb(id="workflow_id", task_counts={"PENDING": 1, "RUNNING": 1}).dict(), task_counts_seq=3
+        )
+        manager = WorkflowManager(db=db)
+
+        workflow, seq = manager.count_tasks(
+            "workflow_id", from_status=TaskStatus.STATUS_PENDING, to_status=TaskStatus.STATUS_RUNNING
+        )
+
+        assert workflow is not None
+        self.assertEqual({"PENDING": 1, "RUNNING": 1}, workflow.task_counts)
+        self.assertEqual(3, seq)
+        update = db.dramaworkflow.find_one_and_update.call_args.args[1]
+        self.assertEqual({"task_counts.PENDING": -1, "task_counts.RUNNING": 1, "task_counts_seq": 1}, update["$inc"])
+
+    def test_should_not_count_retried_task_transition(self):
+        db = MagicMock()
+        db.dramaworkflow.find_one_and_update.return_value = None
+        manager = WorkflowManager(db=db)
+
+        manager.count_tasks("workflow_id", from_status=TaskStatus.STATUS_RUNNING, to_status=TaskStatus.STATUS_RUNNING)
+
+        update = db.dramaworkflow.find_one_and_update.call_args.args[1]
+        self.assertEqual({"task_counts.RUNNING": 0, "task_counts_seq": 1}, update["$inc"])
+
+
+class _AsyncMongoClient(_MongoClient):
+    """
+    Mock asyncio MongoClient (i.e., motor) for testing pourposes.
+    """
+
+    class _Cursor:
+        def __init__(self, docs: list):
+            self.docs = docs
+
+        def sort(self, keys: list):
+            for key, direction in reversed(keys):
+                self.docs = sorted(self.docs, key=lambda doc: doc[key], reverse=direction < 0)
+            return self
+
+        def limit(self, limit: int):
+            self.docs = self.docs[:limit]
+            return self
+
+        async def to_list(self, length):
+            return self.docs[:length]
+
+    def find(self, query: dict, **kwargs):
+        return self._Cursor(super().find(query, **kwargs))
+
+    async def find_one(self, query: dict, **kwargs):
+        return super().find_one(query, **kwargs)
+
+
+class _TailableCursor:
+    def __init__(self, docs):
+        self.docs = docs
+        self.alive = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            self.alive = False
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+
+def _event(seq, status):
+    return dict(seq=seq, workflow_id="workflow_id", task_id="task_id", task_name="A", task_status=status)
+
+
+class AsyncManagerTestCase(unittest.TestCase):
+    def test_should_get_tasks_from_parent_id(self):
+        task = TaskInDb(id="task_id", parent="parent_id")
+
+        db = _AsyncMongoClient()
+        db.collection = [
+            task.dict(),
+        ]
+        manager = AsyncTaskManager(db=db)
+
+        self.assertEqual([task], asyncio.run(manager.find(parent="parent_id")))
+        self.assertEqual(task, asyncio.run(manager.find_one(id="task_id")))
+
+    def test_should_get_workflow_from_id(self):
+        workflow = WorkflowInDb(id="workflow_id")
+
+        db = _AsyncMongoClient()
+        db.collection = [
+            workflow.dict(),
+        ]
+        manager = AsyncWorkflowManager(db=db)
+
+        self.assertEqual(workflow, asyncio.run(manager.find_one(id="workflow_id")))
+        self.assertIsNone(asyncio.run(manager.find_one(id="missing_id")))
+
+    def test_should_get_first_page_of_workflows(self):
+        db = _AsyncMongoClient()
+        db.collection = [WorkflowInDb(id=f"workflow_{i}", created_at=datetime(2021, 1, 1, i)).dict() for i in range(3)]
+        manager = AsyncWorkflowManager(db=db)
+
+        workflows, next_cursor = asyncio.run(manager.find_page(limit=2))
+
+        self.assertEqual(["workflow_2", "workflow_1"], [workflow.id for workflow in workflows])
+        assert next_cursor is not None
+        self.assertEqual((datetime(2021, 1, 1, 1), "workflow_1"), AsyncWorkflowManager._decode_cursor(next_cursor))
+
+    def test_should_not_return_cursor_on_last_page(self):
+        db = _AsyncMongoClient()
+        db.collection = [WorkflowInDb(id="workflow_id", created_at=datetime(2021, 1, 1)).dict()]
+        manager = AsyncWorkflowManager(db=db)
+
+        workflows, next_cursor = asyncio.run(manager.find_page(limit=2))
+
+        self.assertEqual(1, len(workflows))
+        self.assertIsNone(next_cursor)
+
+    def test_should_raise_exception_when_cursor_is_not_valid(self):
+        with self.assertRaises(ValueError):
+            AsyncWorkflowManager._decode_cursor("not-a-cursor")
+
+    def test_should_follow_workflow_events(self):
+        db = MagicMock()
+        db.dramaevent.find.side_effect = [
+            _TailableCursor([_event(4, "RUNNING")]),
+            _TailableCursor([_event(4, "RUNNING"), _event(5, "DONE")]),
+        ]
+        manager = AsyncEventManager(db=db)
+
+        async def _follow():
+            events = manager.follow("workflow_id", last_event_id="3")
+            return [await events.__anext__() for _ in range(3)]
+
+        first, second, idle = asyncio.run(_follow())
+
+        self.assertEqual((4, "RUNNING"), (first.seq, first.task_status))
+        self.assertEqual((5, "DONE"), (second.seq, second.task_status))
+        self.assertIsNone(idle)
+        # events are resumed by sequence, which is ordered across workers unlike object ids
+        self.assertEqual({"workflow_id": "workflow_id", "seq": {"$gt": 3}}, db.dramaevent.find.call_args[0][0])
+
+    def test_should_replay_published_events_sorted_by_sequence(self):
+        db = MagicMock()
+        db.dramaevent.find.side_effect = [
+            _TailableCursor([_event(4, "RUNNING"), _event(5, "DONE")]),
+            _TailableCursor([_event(5, "DONE"), _event(4, "RUNNING")]),
+        ]
+
+        async def _follow():
+            events = AsyncEventManager(db=db).follow("workflow_id", last_event_id="3")
+            return [await events.__anext__() for _ in range(3)]
+
+        first, second, idle = asyncio.run(_follow())
+
+        self.assertEqual([("seq", ASCENDING)], db.dramaevent.find.call_args_list[0][1]["sort"])
+        self.assertEqual([4, 5], [first.seq, second.seq])
+        self.assertIsNone(idle)
+
+    def test_should_not_skip_events_inserted_out_of_order_when_cursor_is_renewed(self):
+        db = MagicMock()
+        db.dramaevent.find.side_effect = [
+            _TailableCursor([]),
+            _TailableCursor([_event(5, "DONE")]),
+            _TailableCursor([_event(5, "DONE"), _event(4, "RUNNING")]),
+        ]
+
+        async def _follow():
+            events = AsyncEventManager(db=db).follow("workflow_id")
+            return [await events.__anext__() for _ in range(4)]
+
+        with mock.patch("drama.manager.settings.EVENTS_POLL_INTERVAL", 0):
+            events = asyncio.run(_follow())
+
+        self.assertEqual([5, None, 4, None], [event.seq if event else None for event in events])
+
+    def test_should_raise_exception_when_event_id_is_not_valid(self):
+        async def _follow():
+            return await AsyncEventManager(db=MagicMock()).follow("workflow_id", last_event_id="abc").__anext__()
+
+        with self.assertRaises(ValueError):
+            asyncio.run(_follow())
+
 
 if __name__ == "__main__":
     unittest.main()
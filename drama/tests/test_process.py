@@ -4,10 +4,16 @@ from dataclasses import dataclass
 from unittest import mock
 from unittest.mock import MagicMock
 
+from fastavro import parse_schema
+from kafka import TopicPartition
+
+from drama.config import KafkaRouting, settings
+from drama.core.model import TempFile
 from drama.datatype import DataType, is_integer
-from drama.models.messages import MessageType, Servo
-from drama.process import Process
-from drama.storage.backend.local import LocalStorage
+from drama.models.messages import Message, MessageType, Servo, SignalType
+from drama.process import Process, UpstreamTimeoutError
+from drama.servo import serialize
+from drama.storage.backend.local import LocalResource, LocalStorage
 
 
 @dataclass
@@ -38,13 +44,12 @@ class ProcessWithOneInputOneUpstreamTestCase(unittest.TestCase):
             storage=storage,
         )
 
-    @mock.patch("drama.process.Process._producer")
-    def test_should_send_point_to_downstream(self, producer):
-        producer.return_value = MagicMock()  # mock self._producer() to avoid kafka producer
-
+    @mock.patch("drama.transport.backend.kafka.KafkaTransport.send")
+    def test_should_send_point_to_downstream(self, send):
         point = Point(1, 2)
 
         message = self.process.to_downstream(data=point)
+        assert isinstance(message, Message)
 
         self.assertEqual(MessageType.BLOCK, message.type)
         self.assertEqual("test-task-1.Point", message.key)
@@ -55,15 +60,76 @@ class ProcessWithOneInputOneUpstreamTestCase(unittest.TestCase):
         )
         self.assertEqual(Servo.AVRO, message.servo)
 
+    @mock.patch("drama.transport.backend.kafka.KafkaTransport.send")
+    def test_should_send_many_points_to_downstream_as_one_message(self, send):
+        message = self.process.to_downstream_many([Point(1, 2), Point(3, 4)])
+        assert isinstance(message, Message)
+
+        send.assert_called_once()
+        self.assertEqual(MessageType.BATCH, message.type)
+        self.assertEqual("test-task-1.Point", message.key)
+        self.assertEqual(b"\x04\x02\x04\x06\x08\x00", message.data)
+
+    @mock.patch("drama.transport.backend.kafka.KafkaTransport.send")
+    def test_should_parse_batch_schema_once(self, send):
+        with mock.patch("drama.servo.parse_schema", wraps=parse_schema) as parse_schema_mock:
+            for i in range(5):
+                message = self.process.to_downstream_many([Point(i, i), Point(i, i)])
+                assert isinstance(message, Message)
+                list(self.process._unpack(message, message.data, apply_servo=True))
+
+        array_schemas = [c for c in parse_schema_mock.call_args_list if c.args[0].get("type") == "array"]
+        # once for sending and once for receiving
+        self.assertEqual(2, len(array_schemas))
+
+    def test_should_raise_exception_if_batch_has_mixed_datatypes(self):
+        with self.assertRaises(ValueError):
+            self.process.to_downstream_many([PointA(1, 2), PointB(3, 4)])
+
+    @mock.patch("drama.process.Process._consumer")
+    def test_should_unpack_batch_messages_from_upstream(self, consumer):
+        upstream = Process(
+            name="test-task-0",
+            module="",
+            params={},
+            parent="test-workflow-1",
+            storage=self.process.storage,
+        )
+
+        with mock.patch("drama.transport.backend.kafka.KafkaTransport.send"):
+            batch = upstream.to_downstream_many([Point(1, 2), Point(3, 4)])
+        assert isinstance(batch, Message)
+
+        def poll(**kwargs):
+            _TopicPartition = collections.namedtuple("TopicPartition", [])
+            _ConsumerRecord = collections.namedtuple("ConsumerRecord", ["key", "value", "offset"], defaults=[0])
+
+            batch_record = _ConsumerRecord(key=b"test-task-0", value=serialize(batch.dict(), Process.MESSAGE_SCHEMA))
+
+            stop_record = _ConsumerRecord(
+                key=b"test-task-0",
+                value=b"\x0cSIGNAL\x12undefined\x18POISSON_PILL\x12undefined\x12undefined",
+            )
+
+            return {_TopicPartition: [batch_record, stop_record]}
+
+        mocked_consumer = MagicMock()
+        mocked_consumer.poll = poll
+
+        consumer.return_value = mocked_consumer  # mock self._consumer() to avoid kafka consumer
+
+        records = self.process.get_from_upstream()
+        self.assertEqual([{"x": 1, "y": 2}, {"x": 3, "y": 4}], records["point"])
+
     @mock.patch("drama.process.Process._consumer")
     def test_should_poll_messages_from_upstream(self, consumer):
         def poll(**kwargs):
             _TopicPartition = collections.namedtuple("TopicPartition", [])
-            _ConsumerRecord = collections.namedtuple("ConsumerRecord", ["key", "value"])
+            _ConsumerRecord = collections.namedtuple("ConsumerRecord", ["key", "value", "offset"], defaults=[0])
 
             point_record = _ConsumerRecord(
                 key=b"test-task-0",
-                value=b'\nBLOCK"test-task-0.Point\x04\x02\x04\x08AVRO\xd8\x03{"namespace": "drama.examples.publisher.DemoSinglePublisherPoint", "name": "Point", "type": "record", "fields": [{"name": "x", "type": "int"}, {"name": "y", "type": "int"}]}',
+                value=b'\nBLOCK"test-task-0.Point\x04\x02\x04\x08AVRO\xda\x02{"namespace": "drama.examples.publisher.DemoSinglePublisherPoint", "name": "Point", "type": "record", "fields": [{"name": "x", "type": "int"}, {"name": "y", "type": "int"}]}',
             )
 
             stop_record = _ConsumerRecord(
@@ -86,11 +152,11 @@ class ProcessWithOneInputOneUpstreamTestCase(unittest.TestCase):
     def test_should_get_messages_from_upstream(self, consumer):
         def poll(**kwargs):
             _TopicPartition = collections.namedtuple("TopicPartition", [])
-            _ConsumerRecord = collections.namedtuple("ConsumerRecord", ["key", "value"])
+            _ConsumerRecord = collections.namedtuple("ConsumerRecord", ["key", "value", "offset"], defaults=[0])
 
             point_record = _ConsumerRecord(
                 key=b"test-task-0",
-                value=b'\nBLOCK"test-task-0.Point\x04\x02\x04\x08AVRO\xd8\x03{"namespace": "drama.examples.publisher.DemoSinglePublisherPoint", "name": "Point", "type": "record", "fields": [{"name": "x", "type": "int"}, {"name": "y", "type": "int"}]}',
+                value=b'\nBLOCK"test-task-0.Point\x04\x02\x04\x08AVRO\xda\x02{"namespace": "drama.examples.publisher.DemoSinglePublisherPoint", "name": "Point", "type": "record", "fields": [{"name": "x", "type": "int"}, {"name": "y", "type": "int"}]}',
             )
 
             stop_record = _ConsumerRecord(
@@ -113,7 +179,7 @@ class ProcessWithOneInputOneUpstreamTestCase(unittest.TestCase):
     def test_should_raise_exception_if_some_inputs_are_missing(self, consumer):
         def poll(**kwargs):
             _TopicPartition = collections.namedtuple("TopicPartition", [])
-            _ConsumerRecord = collections.namedtuple("ConsumerRecord", ["key", "value"])
+            _ConsumerRecord = collections.namedtuple("ConsumerRecord", ["key", "value", "offset"], defaults=[0])
 
             stop_record = _ConsumerRecord(
                 key=b"test-task-0",
@@ -130,6 +196,35 @@ class ProcessWithOneInputOneUpstreamTestCase(unittest.TestCase):
         with self.assertRaises(Exception):
             self.process.get_from_upstream()
 
+    @mock.patch("drama.process.Process._consumer")
+    def test_should_raise_timeout_if_upstream_does_not_finish(self, consumer):
+        mocked_consumer = MagicMock()
+        mocked_consumer.poll = MagicMock(return_value={})
+
+        consumer.return_value = mocked_consumer  # mock self._consumer() to avoid kafka consumer
+
+        with self.assertRaises(UpstreamTimeoutError):
+            self.process.get_from_upstream(timeout=0.01)
+
+        self.assertTrue(all(call.kwargs["timeout_ms"] <= 10 for call in mocked_consumer.poll.call_args_list))
+        mocked_consumer.close.assert_called_once()
+
+    @mock.patch("drama.transport.backend.kafka.KafkaTransport.send")
+    def test_should_wait_for_upload_of_referenced_files(self, send):
+        with mock.patch.object(self.process.storage, "wait") as wait:
+            self.process.to_downstream(TempFile(resource=LocalResource(resource="/tmp/output.txt")))
+
+        self.assertEqual(["/tmp/output.txt"], list(wait.call_args.args[0]))
+
+    @mock.patch("drama.process.Process._send")
+    @mock.patch("drama.transport.backend.kafka.KafkaTransport.flush")
+    def test_should_interrupt_downstream_if_upload_fails(self, flush, send):
+        with mock.patch.object(self.process.storage, "wait", side_effect=ConnectionError()):
+            with self.assertRaises(ConnectionError):
+                self.process.close()
+
+        self.assertEqual(SignalType.INTE, send.call_args.args[0].data)
+
     def tearDown(self) -> None:
         self.process.storage.remove_local_dir()
 
@@ -150,16 +245,16 @@ class ProcessWithTwoInputsOneUpstreamTestCase(unittest.TestCase):
     def test_should_get_all_messages_from_upstream(self, consumer):
         def poll(**kwargs):
             _TopicPartition = collections.namedtuple("TopicPartition", [])
-            _ConsumerRecord = collections.namedtuple("ConsumerRecord", ["key", "value"])
+            _ConsumerRecord = collections.namedtuple("ConsumerRecord", ["key", "value", "offset"], defaults=[0])
 
             point_record_a = _ConsumerRecord(
                 key=b"test-task-0",
-                value=b'\nBLOCK$test-task-0.PointA\x04\x02\x04\x08AVRO\xda\x03{"namespace": "drama.examples.publisher.DemoSinglePublisherPoint", "name": "PointA", "type": "record", "fields": [{"name": "x", "type": "int"}, {"name": "y", "type": "int"}]}',
+                value=b'\nBLOCK$test-task-0.PointA\x04\x02\x04\x08AVRO\xdc\x02{"namespace": "drama.examples.publisher.DemoSinglePublisherPoint", "name": "PointA", "type": "record", "fields": [{"name": "x", "type": "int"}, {"name": "y", "type": "int"}]}',
             )
 
             point_record_b = _ConsumerRecord(
                 key=b"test-task-0",
-                value=b'\nBLOCK$test-task-0.PointB\x04\x06\x08\x08AVRO\xda\x03{"namespace": "drama.examples.publisher.DemoSinglePublisherPoint", "name": "PointB", "type": "record", "fields": [{"name": "x", "type": "int"}, {"name": "y", "type": "int"}]}',
+                value=b'\nBLOCK$test-task-0.PointB\x04\x06\x08\x08AVRO\xdc\x02{"namespace": "drama.examples.publisher.DemoSinglePublisherPoint", "name": "PointB", "type": "record", "fields": [{"name": "x", "type": "int"}, {"name": "y", "type": "int"}]}',
             )
 
             stop_record = _ConsumerRecord(
@@ -183,5 +278,69 @@ class ProcessWithTwoInputsOneUpstreamTestCase(unittest.TestCase):
         self.process.storage.remove_local_dir()
 
 
+class ProcessWithTaskRoutingTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        storage = LocalStorage(bucket_name="ProcessWithTaskRoutingTestCase", folder_name=["setUp"])
+        self.process = Process(
+            name="test-task-1",
+            module="",
+            params={},
+            parent="test-workflow-3",
+            inputs={"point_a": "test-task-0.PointA", "point_b": "test-task-2.PointB"},
+            storage=storage,
+        )
+
+    @mock.patch.object(settings, "KAFKA_ROUTING", KafkaRouting.TASK)
+    @mock.patch("drama.transport.backend.kafka.KafkaTransport.send")
+    def test_should_send_to_own_topic(self, send):
+
+        self.process.to_downstream(data=Point(1, 2))
+
+        self.assertEqual("test-workflow-3.test-task-1", send.call_args.kwargs["topic"])
+
+    @mock.patch.object(settings, "KAFKA_ROUTING", KafkaRouting.TASK)
+    @mock.patch("drama.transport.backend.kafka.KafkaConsumer")
+    def test_should_subscribe_to_input_topics(self, kafka_consumer):
+        self.process._consumer()
+
+        self.assertEqual(
+            ["test-workflow-3", "test-workflow-3.test-task-0", "test-workflow-3.test-task-2"],
+            kafka_consumer.return_value.subscribe.call_args.kwargs["topics"],
+        )
+
+    @mock.patch("drama.transport.backend.kafka.KafkaConsumer")
+    def test_should_subscribe_to_workflow_topic_by_default(self, kafka_consumer):
+        self.process._consumer()
+
+        self.assertEqual(["test-workflow-3"], kafka_consumer.return_value.subscribe.call_args.kwargs["topics"])
+
+    @mock.patch("drama.transport.backend.kafka.KafkaConsumer")
+    def test_should_join_task_consumer_group(self, kafka_consumer):
+        self.process._consumer()
+
+        self.assertEqual("drama.test-workflow-3.test-task-1", kafka_consumer.call_args.kwargs["group_id"])
+        self.assertFalse(kafka_consumer.call_args.kwargs["enable_auto_commit"])
+
+    @mock.patch("drama.transport.backend.kafka.KafkaConsumer")
+    def test_should_rewind_partitions_only_when_first_assigned(self, kafka_consumer):
+        self.process._consumer()
+
+        listener = kafka_consumer.return_value.subscribe.call_args.kwargs["listener"]
+        listener.on_partitions_assigned([TopicPartition("test-workflow-3", 0)])
+        listener.on_partitions_assigned([TopicPartition("test-workflow-3", 0)])
+
+        kafka_consumer.return_value.seek_to_beginning.assert_called_once_with(TopicPartition("test-workflow-3", 0))
+
+    @mock.patch("drama.transport.backend.kafka.KafkaConsumer")
+    def test_should_not_rewind_partitions_when_resuming(self, kafka_consumer):
+        self.process.resume = True
+        self.process._consumer()
+
+        self.assertIsNone(kafka_consumer.return_value.subscribe.call_args.kwargs["listener"])
+
+    def tearDown(self) -> None:
+        self.process.storage.remove_local_dir()
+
+
 if __name__ == "__main__":
     unittest.main()
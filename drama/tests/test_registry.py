@@ -0,0 +1,92 @@
+import shutil
+import tempfile
+import unittest
+from dataclasses import dataclass
+from pathlib import Path
+from unittest import mock
+
+from drama.datatype import DataType, get_schema, is_integer
+from drama.models.messages import Message, Servo
+from drama.process import Process
+from drama.registry import FileSchemaRegistry, SchemaNotFound
+from drama.storage.backend.local import LocalStorage
+
+
+@dataclass
+class Point(DataType):
+    x: int = is_integer()
+    y: int = is_integer()
+
+
+class FileSchemaRegistryTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.registry = FileSchemaRegistry(directory=self.directory)
+
+    def test_should_register_schema_and_return_fingerprint(self):
+        schema = get_schema(Point(1, 2))
+
+        fingerprint = self.registry.register(schema)
+
+        self.assertEqual(fingerprint, FileSchemaRegistry.fingerprint(schema))
+        self.assertEqual(fingerprint, self.registry.register(schema))
+
+    def test_should_fingerprint_schema_once(self):
+        schema = get_schema(Point(1, 2))
+
+        with mock.patch.object(FileSchemaRegistry, "fingerprint", wraps=FileSchemaRegistry.fingerprint) as fingerprint:
+            for _ in range(5):
+                self.registry.register(schema)
+
+        fingerprint.assert_called_once()
+
+    def test_should_not_leave_temporary_files(self):
+        fingerprint = self.registry.register(get_schema(Point(1, 2)))
+
+        self.assertEqual([f"{fingerprint}.avsc"], [path.name for path in Path(self.directory).iterdir()])
+
+    def test_should_get_schema_registered_by_another_process(self):
+        schema = get_schema(Point(1, 2))
+        fingerprint = self.registry.register(schema)
+
+        parsed_schema = FileSchemaRegistry(directory=self.directory).get(fingerprint)
+
+        self.assertEqual(schema["fields"], parsed_schema["fields"])
+
+    def test_should_raise_exception_when_fingerprint_not_found(self):
+        with self.assertRaises(SchemaNotFound):
+            self.registry.get("0000000000000000")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ProcessWithSchemaRegistryTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        storage = LocalStorage(bucket_name="ProcessWithSchemaRegistryTestCase", folder_name=["setUp"])
+        self.process = Process(
+            name="test-task-1",
+            module="",
+            params={},
+            parent="test-workflow-1",
+            storage=storage,
+            registry=FileSchemaRegistry(directory=self.directory),
+        )
+
+    @mock.patch("drama.transport.backend.kafka.KafkaTransport.send")
+    def test_should_send_fingerprint_instead_of_schema(self, send):
+        message = self.process.to_downstream(data=Point(1, 2))
+        assert isinstance(message, Message)
+
+        self.assertEqual(Servo.AVRO_FINGERPRINT, message.servo)
+        self.assertEqual(FileSchemaRegistry.fingerprint(get_schema(Point(1, 2))), message.schem)
+        self.assertEqual({"x": 1, "y": 2}, next(self.process._unpack(message, message.data, apply_servo=True)))
+
+    def tearDown(self) -> None:
+        self.process.storage.remove_local_dir()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
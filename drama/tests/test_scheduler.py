@@ -1,8 +1,14 @@
 import unittest
+from unittest import mock
+from unittest.mock import MagicMock
+
+from dramatiq.brokers.rabbitmq import RabbitmqBroker
 
 from drama.models.task import Task
-from drama.models.workflow import Workflow
+from drama.models.workflow import Workflow, WorkflowStatus
+from drama.worker import enqueue_many
 from drama.worker.scheduler import Scheduler
+from drama.worker.worker import derive_workflow_status
 
 
 class SchedulerTestCase(unittest.TestCase):
@@ -61,7 +67,7 @@ class SchedulerTestCase(unittest.TestCase):
 
         workflow = Workflow(tasks=[task_one, task_two, task_three, task_four])
 
-        self.assertEqual(["First", "Second", "Three", "Fourth"], Scheduler.sorted_tasks(workflow))
+        self.assertEqual(["First", "Fourth", "Second", "Three"], Scheduler.sorted_tasks(workflow))
 
     def test_should_compute_dag_from_workflow_case_c(self) -> None:
         task_one = Task(
@@ -117,7 +123,7 @@ class SchedulerTestCase(unittest.TestCase):
         workflow = Workflow(tasks=[task_one, task_two, task_three, task_four, task_five, task_six, task_seven])
 
         self.assertEqual(
-            ["First", "Third", "Fifth", "Fourth", "Sixth", "Seventh", "Second"], Scheduler.sorted_tasks(workflow)
+            ["First", "Second", "Third", "Fourth", "Fifth", "Sixth", "Seventh"], Scheduler.sorted_tasks(workflow)
         )
 
     def test_should_compute_dag_from_workflow_case_d(self) -> None:
@@ -180,16 +186,90 @@ class SchedulerTestCase(unittest.TestCase):
         self.assertEqual(
             [
                 "ComponentImportFile0",
+                "ComponentImportFile1",
                 "ComponentTrophPos0",
                 "ComponentShapeFileCreator0",
                 "ComponentSpatialViewer0",
                 "ComponentCopernicusLink0",
-                "ComponentImportFile1",
                 "ComponentModeler0",
             ],
             Scheduler.sorted_tasks(workflow),
         )
 
+    @mock.patch("drama.worker.scheduler.dramatiq.get_broker")
+    @mock.patch("drama.worker.scheduler.TaskManager.bulk_create_or_update")
+    def test_should_only_enqueue_source_tasks(self, bulk_create_or_update, get_broker) -> None:
+        task_one = Task(
+            name="First",
+            module="test",
+        )
+
+        task_two = Task(
+            name="Second",
+            module="test",
+            inputs={
+                "Input1": "First.Data",
+                "Input2": "First.Other",
+            },
+        )
+
+        db = MagicMock()
+        db.dramaworkflow.find_one_and_update.return_value = None
+        Scheduler(db=db).run(Workflow(tasks=[task_one, task_two]))
+
+        enqueued = [call.args[0].args[0]["name"] for call in get_broker.return_value.enqueue.call_args_list]
+        self.assertEqual(["First"], enqueued)
+
+        # every task is registered at once
+        bulk_create_or_update.assert_called_once()
+        tasks = bulk_create_or_update.call_args.args[0]
+        held = list(bulk_create_or_update.call_args.kwargs["extra_fields"].values())
+        self.assertEqual(["First", "Second"], [task.name for task in tasks])
+        self.assertEqual(1, len(held))
+        self.assertEqual(["First"], held[0]["pending_upstream"])
+        self.assertEqual("Second", held[0]["message"]["args"][0]["name"])
+
+    @mock.patch("drama.worker.worker.dramatiq.get_broker")
+    def test_should_publish_messages_within_transaction(self, get_broker) -> None:
+        broker = get_broker.return_value = MagicMock(spec=RabbitmqBroker)
+        channel = broker.connection.channel.return_value
+        messages = [Scheduler(db=MagicMock()).build_message(Task(name=name, module="test"), "id") for name in "AB"]
+
+        enqueue_many(messages)
+
+        channel.tx_select.assert_called_once()
+        self.assertEqual(2, channel.basic_publish.call_count)
+        channel.tx_commit.assert_called_once()
+        broker.enqueue.assert_not_called()
+
+    @mock.patch("drama.worker.scheduler.settings.RABBIT_MAX_PRIORITY", 10)
+    @mock.patch("drama.worker.scheduler.dramatiq.get_broker")
+    def test_should_enqueue_critical_path_first(self, get_broker) -> None:
+        tasks = [
+            Task(name="Leaf", module="leaf"),
+            Task(name="First", module="first"),
+            Task(name="Second", module="second", inputs={"Input": "First.Data"}),
+        ]
+
+        db = MagicMock()
+        db.dramaworkflow.find_one_and_update.return_value = None
+        db.dramatask.aggregate.return_value = [{"_id": "first", "duration": 1000}, {"_id": "leaf", "duration": 1000}]
+        Scheduler(db=db).run(Workflow(tasks=tasks))
+
+        enqueued = [call.args[0] for call in get_broker.return_value.enqueue.call_args_list]
+        self.assertEqual(["First", "Leaf"], [message.args[0]["name"] for message in enqueued])
+        self.assertEqual([10, 5], [message.options["broker_priority"] for message in enqueued])
+
+
+class WorkflowStatusTestCase(unittest.TestCase):
+    def test_should_derive_workflow_status_from_task_counts(self) -> None:
+        self.assertEqual(WorkflowStatus.STATUS_PENDING, derive_workflow_status({"PENDING": 2}))
+        self.assertEqual(WorkflowStatus.STATUS_PENDING, derive_workflow_status({"PENDING": 1, "RUNNING": 1}))
+        self.assertEqual(WorkflowStatus.STATUS_RUNNING, derive_workflow_status({"PENDING": 0, "RUNNING": 1, "DONE": 1}))
+        self.assertEqual(WorkflowStatus.STATUS_FAILED, derive_workflow_status({"PENDING": 1, "FAILED": 1}))
+        self.assertEqual(WorkflowStatus.STATUS_DONE, derive_workflow_status({"PENDING": 0, "RUNNING": 0, "DONE": 2}))
+        self.assertEqual(WorkflowStatus.STATUS_REVOKED, derive_workflow_status({"DONE": 2}, is_revoked=True))
+
 
 if __name__ == "__main__":
     unittest.main()
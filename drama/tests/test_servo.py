@@ -1,7 +1,7 @@
-import os
+import json
 import unittest
 
-from drama.servo import deserialize, serialize
+from drama.servo import deserialize, parse, parse_json, serialize
 
 
 class ServoTestCase(unittest.TestCase):
@@ -36,6 +36,31 @@ class ServoTestCase(unittest.TestCase):
             {"station": "012650-99999", "temp": 111, "time": 1433275478},
         )
 
+    def test_parsed_schema_is_cached(self):
+        self.assertIs(parse(self.weather_schema), parse(self.weather_schema))
+
+    def test_parsed_schema_is_cached_by_key(self):
+        stringified_schema = json.dumps(self.weather_schema)
+        self.assertIs(parse_json(stringified_schema), parse_json(stringified_schema))
+
+    def test_can_deserialize_bytes_with_parsed_schema(self):
+        b_record = b"\x18012650-99999\xac\xb1\xf0\xd6\n\xde\x01"
+        record = deserialize(b_record, parse(self.weather_schema))
+
+        self.assertEqual(
+            record,
+            {"station": "012650-99999", "temp": 111, "time": 1433275478},
+        )
+
+    def test_can_deserialize_memoryview(self):
+        b_record = memoryview(b"\x00\x18012650-99999\xac\xb1\xf0\xd6\n\xde\x01")[1:]
+        record = deserialize(b_record, self.weather_schema)
+
+        self.assertEqual(
+            record,
+            {"station": "012650-99999", "temp": 111, "time": 1433275478},
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,12 +1,25 @@
+import hashlib
 import os
+import shutil
+import socket
+import stat
+import subprocess
+import tempfile
+import threading
 import unittest
 from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
+from hdfs.util import HdfsError
 from pydantic.error_wrappers import ValidationError
 
-from drama.storage import LocalStorage
+from drama.config import settings
+from drama.storage import HDFSStorage, LocalStorage, MinIOStorage
 from drama.storage.backend.local import LocalResource
-from drama.storage.base import Resource
+from drama.storage.base import Resource, link_file
+from drama.storage.cache import ObjectCache
+from drama.storage.stream import RangeReader
 
 ABS_DIRNAME = os.path.dirname(os.path.abspath(__file__))
 
@@ -42,12 +55,90 @@ class LocalStorageTestCase(unittest.TestCase):
         self.assertTrue(Path(self.storage.local_dir, "test_storage.py").is_file())
         self.assertIs(type(resource), LocalResource)
 
+    def test_resource_is_known_before_upload(self):
+        curr_file = Path(ABS_DIRNAME, "test_storage.py")
+
+        self.assertEqual(self.storage._resource("test_storage.py"), self.storage.put_file(curr_file))
+
     def test_file_can_be_put_and_renamed(self):
         curr_file = Path(ABS_DIRNAME, "test_storage.py")
         _ = self.storage.put_file(curr_file, rename="storage_test.py")
 
         self.assertTrue(Path(self.storage.local_dir, "storage_test.py").is_file())
 
+    def test_file_is_linked_instead_of_copied(self):
+        src_dir = tempfile.mkdtemp()
+        src_file = Path(src_dir, "output.txt")
+        src_file.write_text("output")
+
+        with mock.patch("shutil.copy") as copy:
+            resource = self.storage.put_file(src_file)
+
+        copy.assert_not_called()
+        self.assertEqual(str(Path(self.storage.local_dir, "output.txt")), resource.resource)
+        self.assertEqual("output", Path(resource.resource).read_text())
+        self.assertTrue(src_file.is_file())
+        shutil.rmtree(src_dir, ignore_errors=True)
+
+    def test_file_is_copied_when_it_can_not_be_linked(self):
+        curr_file = Path(ABS_DIRNAME, "test_storage.py")
+
+        with mock.patch("drama.storage.backend.local.link_file", return_value=False):
+            resource = self.storage.put_file(curr_file)
+
+        self.assertEqual(curr_file.read_bytes(), Path(resource.resource).read_bytes())
+
+    def test_file_in_task_directory_is_renamed(self):
+        file_path = Path(self.storage.local_dir, "output.txt")
+        file_path.write_text("output")
+
+        resource = self.storage.put_file(file_path, rename="renamed.txt")
+
+        self.assertEqual(str(Path(self.storage.local_dir, "renamed.txt")), resource.resource)
+        self.assertTrue(Path(resource.resource).is_file())
+        self.assertFalse(file_path.exists())
+
+    def test_file_in_task_directory_is_put_from_relative_path(self):
+        file_path = Path(self.storage.local_dir, "output.txt")
+        file_path.write_text("output")
+
+        cwd = os.getcwd()
+        os.chdir(self.storage.local_dir)
+        try:
+            resource = self.storage.put_file("output.txt")
+        finally:
+            os.chdir(cwd)
+
+        self.assertEqual(str(file_path), resource.resource)
+        self.assertEqual("output", file_path.read_text())
+
+    def test_linked_file_is_kept_if_it_already_is_destination(self):
+        src_dir = tempfile.mkdtemp()
+        src_file = Path(src_dir, "output.txt")
+        src_file.write_text("output")
+        # same directory under another path, e.g., a symlinked `DATA_DIR`
+        symlinked_dir = Path(tempfile.mkdtemp(), "symlinked")
+        symlinked_dir.symlink_to(src_dir)
+
+        self.assertTrue(link_file(src_file, Path(symlinked_dir, "output.txt")))
+        self.assertEqual("output", src_file.read_text())
+
+        shutil.rmtree(symlinked_dir.parent, ignore_errors=True)
+        shutil.rmtree(src_dir, ignore_errors=True)
+
+    def test_destination_is_kept_when_file_can_not_be_linked(self):
+        src_dir = tempfile.mkdtemp()
+        src_file, dst_file = Path(src_dir, "output.txt"), Path(src_dir, "previous.txt")
+        src_file.write_text("output")
+        dst_file.write_text("previous")
+
+        with mock.patch.dict("sys.modules", fcntl=None), mock.patch("os.link", side_effect=OSError):
+            self.assertFalse(link_file(src_file, dst_file))
+
+        self.assertEqual("previous", dst_file.read_text())
+        self.assertEqual(["output.txt", "previous.txt"], sorted(os.listdir(src_dir)))
+        shutil.rmtree(src_dir, ignore_errors=True)
+
     def test_raised_exception_when_file_not_found(self):
         with self.assertRaises(FileNotFoundError):
             self.storage.get_file("tests.py")
@@ -58,5 +149,400 @@ class LocalStorageTestCase(unittest.TestCase):
         self.assertFalse(self.storage.local_dir.is_dir())
 
 
+class _Response:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.position = 0
+        self.closed = False
+
+    def stream(self, amt: int):
+        for offset in range(0, len(self.data), amt):
+            yield self.data[offset : offset + amt]
+
+    def read(self, amt: int) -> bytes:
+        # responses return short reads, as sockets do
+        data = self.data[self.position : self.position + min(amt, 100)]
+        self.position += len(data)
+        return data
+
+    def close(self):
+        self.closed = True
+
+    def release_conn(self):
+        pass
+
+
+class _MinioClient:
+    """
+    In-memory stand-in for the S3 api used by `MinIOStorage`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.objects = {}
+        self.uploads = {}
+        self.ranged_gets = []
+        self._lock = threading.Lock()
+
+    def make_bucket(self, bucket_name):
+        pass
+
+    def fput_object(self, bucket_name, object_name, file_path):
+        self.objects[(bucket_name, object_name)] = Path(file_path).read_bytes()
+
+    def fget_object(self, bucket_name, object_name, file_path):
+        Path(file_path).write_bytes(self.objects[(bucket_name, object_name)])
+
+    def stat_object(self, bucket_name, object_name):
+        data = self.objects[(bucket_name, object_name)]
+        return SimpleNamespace(size=len(data), etag=hashlib.md5(data).hexdigest())
+
+    def get_object(self, bucket_name, object_name, offset=0, length=0):
+        with self._lock:
+            self.ranged_gets.append((offset, length))
+        data = self.objects[(bucket_name, object_name)]
+        return _Response(data[offset : offset + length] if length else data[offset:])
+
+    def _create_multipart_upload(self, bucket_name, object_name, headers):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {}
+        return upload_id
+
+    def _upload_part(self, bucket_name, object_name, data, headers, upload_id, part_number):
+        with self._lock:
+            self.uploads[upload_id][part_number] = data
+        return f"etag-{part_number}"
+
+    def _complete_multipart_upload(self, bucket_name, object_name, upload_id, parts):
+        uploaded = self.uploads.pop(upload_id)
+        self.objects[(bucket_name, object_name)] = b"".join(uploaded[part.part_number] for part in parts)
+
+    def _abort_multipart_upload(self, bucket_name, object_name, upload_id):
+        self.uploads.pop(upload_id)
+
+
+@mock.patch.object(settings, "MINIO_BUCKET", None)
+@mock.patch.object(settings, "MINIO_PART_SIZE", 1024)
+@mock.patch("drama.storage.backend.minio.MIN_PART_SIZE", 1024)
+@mock.patch("drama.storage.backend.minio.Minio", _MinioClient)
+class MinIOStorageTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.data = os.urandom(10 * 1024 + 100)
+
+        self.cache = ObjectCache(Path(self.directory, ".cache"), max_bytes=1024 * 1024)
+        patcher = mock.patch("drama.storage.base.get_cache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _storage(self, task_name: str) -> MinIOStorage:
+        with mock.patch.object(settings, "DATA_DIR", self.directory):
+            storage = MinIOStorage(bucket_name="tests", folder_name=[task_name])
+        storage.setup()
+        return storage
+
+    def test_small_file_is_transferred_in_single_request(self):
+        storage = self._storage("test_minio")
+        file_path = Path(storage.local_dir, "small.bin")
+        file_path.write_bytes(self.data[:100])
+
+        resource = storage.put_file(file_path)
+        file_path.unlink()
+
+        self.assertEqual({}, storage.client.uploads)
+        self.assertEqual(self.data[:100], Path(storage.get_file(resource.resource)).read_bytes())
+        self.assertEqual([], storage.client.ranged_gets)
+
+    def test_large_file_is_uploaded_in_parts(self):
+        storage = self._storage("test_minio")
+        file_path = Path(storage.local_dir, "large.bin")
+        file_path.write_bytes(self.data)
+
+        with mock.patch.object(storage.client, "fput_object") as fput_object:
+            storage.put_file(file_path)
+
+        fput_object.assert_not_called()
+        self.assertEqual(self.data, storage.client.objects[("tests", "test_minio/large.bin")])
+
+    def test_large_file_is_downloaded_with_ranged_requests(self):
+        storage = self._storage("test_minio")
+        storage.client.objects[("upstream", "task/large.bin")] = self.data
+
+        file_path = storage.get_file("minio://upstream/task/large.bin")
+
+        self.assertEqual(self.data, Path(file_path).read_bytes())
+        self.assertEqual(11, len(storage.client.ranged_gets))
+        self.assertFalse(Path(f"{file_path}.part").exists())
+
+    def test_object_read_by_several_workflows_is_downloaded_once(self):
+        storage, other_storage = self._storage("test_minio"), self._storage("test_minio_other")
+        storage.client.objects[("upstream", "task/large.bin")] = self.data
+        other_storage.client = storage.client
+
+        file_path = storage.get_file("minio://upstream/task/large.bin")
+        other_file_path = other_storage.get_file("minio://upstream/task/large.bin")
+
+        self.assertEqual(file_path, other_file_path)
+        self.assertEqual(dict(hits=1, misses=1, evictions=0), self.cache.stats())
+
+    def test_modified_object_is_downloaded_again(self):
+        storage = self._storage("test_minio")
+        storage.client.objects[("upstream", "task/large.bin")] = self.data
+        storage.get_file("minio://upstream/task/large.bin")
+
+        storage.client.objects[("upstream", "task/large.bin")] = self.data[::-1]
+        file_path = storage.get_file("minio://upstream/task/large.bin")
+
+        self.assertEqual(self.data[::-1], Path(file_path).read_bytes())
+        self.assertEqual(2, self.cache.stats()["misses"])
+
+    def test_object_is_streamed_without_download(self):
+        storage = self._storage("test_minio")
+        storage.client.objects[("upstream", "task/large.bin")] = self.data
+
+        with storage.open("minio://upstream/task/large.bin") as reader:
+            header = reader.read(10)
+            reader.seek(-10, os.SEEK_END)
+            footer = reader.read()
+
+        self.assertEqual(self.data[:10], header)
+        self.assertEqual(self.data[-10:], footer)
+        # object fits in read-ahead buffer
+        self.assertEqual([(0, 0)], storage.client.ranged_gets)
+        self.assertEqual(0, self.cache.stats()["misses"])
+
+    def test_object_is_streamed_as_text(self):
+        storage = self._storage("test_minio")
+        storage.client.objects[("upstream", "task/dataset.tsv")] = b"a\tb\n" * 1000
+
+        with storage.open("minio://upstream/task/dataset.tsv", "r") as reader:
+            rows = [line.split() for line in reader]
+
+        self.assertEqual([["a", "b"]] * 1000, rows)
+
+    def test_object_can_not_be_opened_for_writing(self):
+        storage = self._storage("test_minio")
+        storage.client.objects[("upstream", "task/dataset.tsv")] = b""
+
+        with self.assertRaises(ValueError):
+            storage.open("minio://upstream/task/dataset.tsv", "wb")
+
+    def test_file_outside_task_directory_is_uploaded_without_copy(self):
+        storage = self._storage("test_minio")
+        file_path = Path(self.directory, "output.bin")
+        file_path.write_bytes(self.data[:100])
+
+        with mock.patch("drama.storage.base.link_file", return_value=False):
+            storage.put_file(file_path, rename="renamed.bin")
+
+        self.assertFalse(Path(storage.local_dir, "renamed.bin").exists())
+        self.assertEqual(self.data[:100], storage.client.objects[("tests", "test_minio/renamed.bin")])
+
+    @mock.patch.object(settings, "ASYNC_UPLOADS", 2)
+    def test_file_is_uploaded_in_background(self):
+        storage = self._storage("test_minio")
+        file_path = Path(storage.local_dir, "small.bin")
+        file_path.write_bytes(self.data[:100])
+
+        uploading = threading.Event()
+        fput_object = storage.client.fput_object
+
+        def blocking_fput_object(**kwargs):
+            uploading.wait()
+            fput_object(**kwargs)
+
+        with mock.patch.object(storage.client, "fput_object", side_effect=blocking_fput_object):
+            resource = storage.put_file(file_path)
+            self.assertEqual({}, storage.client.objects)
+
+            uploading.set()
+            storage.wait([resource.resource])
+
+        self.assertEqual(self.data[:100], storage.client.objects[("tests", "test_minio/small.bin")])
+
+    @mock.patch.object(settings, "ASYNC_UPLOADS", 2)
+    def test_background_upload_failure_is_raised_on_wait(self):
+        storage = self._storage("test_minio")
+        file_path = Path(storage.local_dir, "small.bin")
+        file_path.write_bytes(self.data[:100])
+
+        with mock.patch.object(storage.client, "fput_object", side_effect=ConnectionError()):
+            storage.put_file(file_path)
+
+            with self.assertRaises(ConnectionError):
+                storage.wait()
+
+        # errors are raised once
+        storage.wait()
+
+    def test_multipart_upload_is_aborted_on_failure(self):
+        storage = self._storage("test_minio")
+        file_path = Path(storage.local_dir, "large.bin")
+        file_path.write_bytes(self.data)
+
+        with mock.patch.object(storage.client, "_upload_part", side_effect=ConnectionError()):
+            with self.assertRaises(ConnectionError):
+                storage.put_file(file_path)
+
+        self.assertEqual({}, storage.client.uploads)
+        self.assertEqual({}, storage.client.objects)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class HDFSStorageTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+
+    def test_should_raise_exception_when_file_can_not_be_downloaded(self):
+        with mock.patch.object(settings, "DATA_DIR", self.directory):
+            storage = HDFSStorage(bucket_name="tests", folder_name="test_hdfs")
+        storage.client = mock.MagicMock()
+        storage.client.checksum.side_effect = HdfsError("File does not exist")
+
+        with self.assertRaises(HdfsError):
+            storage.get_file("hdfs:/tests/test_hdfs/missing.bin")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class RangeReaderTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.data = os.urandom(3 * 1024 * 1024)
+        self.responses = []
+
+    def _open_range(self, offset, stack):
+        response = _Response(self.data[offset:])
+        stack.callback(response.close)
+        self.responses.append((offset, response))
+        return response
+
+    def test_reads_into_buffer(self):
+        reader = RangeReader(len(self.data), self._open_range)
+        buffer = bytearray(1000)
+
+        n = reader.readinto(buffer)
+
+        self.assertEqual(self.data[:n], buffer[:n])
+        self.assertEqual(n, reader.tell())
+
+    def test_short_forward_seek_reuses_stream(self):
+        reader = RangeReader(len(self.data), self._open_range)
+        reader.read(10)
+
+        reader.seek(1000, os.SEEK_CUR)
+
+        self.assertEqual(self.data[1010:1020], reader.read(10))
+        self.assertEqual(1, len(self.responses))
+
+    def test_backward_seek_opens_new_range(self):
+        reader = RangeReader(len(self.data), self._open_range)
+        reader.read(10)
+
+        reader.seek(5)
+
+        self.assertEqual(self.data[5:15], reader.read(10))
+        self.assertEqual([0, 5], [offset for offset, _ in self.responses])
+        self.assertTrue(self.responses[0][1].closed)
+
+    def test_reads_nothing_past_end(self):
+        reader = RangeReader(len(self.data), self._open_range)
+        reader.seek(0, os.SEEK_END)
+
+        self.assertEqual(b"", reader.read(10))
+        self.assertEqual([], self.responses)
+
+    def test_close_releases_stream(self):
+        reader = RangeReader(len(self.data), self._open_range)
+        reader.read(10)
+
+        reader.close()
+
+        self.assertTrue(self.responses[0][1].closed)
+
+
+class ObjectCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.cache = ObjectCache(Path(self.directory), max_bytes=100)
+
+    def _get(self, etag: str, file_name: str, size: int = 40) -> Path:
+        return self.cache.get(etag, file_name, lambda path: path.write_bytes(os.urandom(size)))
+
+    def test_objects_are_named_after_file(self):
+        file_path = self._get("etag-1", "dataset.tsv")
+        other_file_path = self._get("etag-1", "copy.tsv")
+
+        self.assertEqual("dataset.tsv", file_path.name)
+        self.assertEqual(file_path.read_bytes(), other_file_path.read_bytes())
+        self.assertEqual(dict(hits=1, misses=1, evictions=0), self.cache.stats())
+
+    def test_least_recently_used_objects_are_evicted(self):
+        paths = {}
+        for mtime, etag in enumerate(("etag-1", "etag-2"), start=1):
+            paths[etag] = self._get(etag, "dataset.tsv")
+            self.cache.unpin(etag)
+            os.utime(Path(paths[etag].parent, "data"), (mtime, mtime))
+
+        self._get("etag-1", "dataset.tsv")
+        self.cache.unpin("etag-1")
+        self._get("etag-3", "dataset.tsv")
+
+        self.assertTrue(paths["etag-1"].is_file())
+        self.assertFalse(paths["etag-2"].is_file())
+        self.assertEqual(dict(hits=1, misses=3, evictions=1), self.cache.stats())
+
+    def test_pinned_objects_are_not_evicted(self):
+        file_path = self._get("etag-1", "dataset.tsv", size=150)
+        self._get("etag-2", "dataset.tsv", size=150)
+
+        self.assertTrue(file_path.is_file())
+        self.assertEqual(0, self.cache.stats()["evictions"])
+
+        self.cache.unpin("etag-1")
+        self.cache.evict()
+
+        self.assertFalse(file_path.is_file())
+        self.assertFalse(Path(f"{file_path.parent}.lock").exists())
+
+    def test_pins_of_crashed_workers_are_ignored_unless_in_another_host(self):
+        file_path = self._get("etag-1", "dataset.tsv", size=150)
+        self.cache.unpin("etag-1")
+
+        pins_dir = Path(file_path.parent, ".pins")
+        crashed = subprocess.Popen(["true"])
+        crashed.wait()
+        Path(pins_dir, f"another-host.{crashed.pid}").touch()
+        self.cache.evict()
+
+        self.assertTrue(file_path.is_file())
+
+        Path(pins_dir, f"another-host.{crashed.pid}").unlink()
+        Path(pins_dir, f"{socket.gethostname()}.{crashed.pid}").touch()
+        self.cache.evict()
+
+        self.assertFalse(file_path.is_file())
+
+    def test_objects_are_read_only(self):
+        file_path = self._get("etag-1", "dataset.tsv")
+
+        self.assertEqual(0, file_path.stat().st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+    def test_failed_fetch_is_not_cached(self):
+        def fetch(path):
+            path.write_bytes(b"partial")
+            raise ConnectionError()
+
+        with self.assertRaises(ConnectionError):
+            self.cache.get("etag-1", "dataset.tsv", fetch)
+
+        self.assertEqual(40, self._get("etag-1", "dataset.tsv").stat().st_size)
+        self.assertEqual(dict(hits=0, misses=1, evictions=0), self.cache.stats())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,352 @@
+import shutil
+import socket
+import subprocess
+import tempfile
+import unittest
+from dataclasses import dataclass
+from pathlib import Path
+from unittest import mock
+from unittest.mock import MagicMock
+
+from kafka import TopicPartition
+
+from drama.config import settings
+from drama.core.catalog.load import ImportTSV
+from drama.core.catalog.read import ReadTSV
+from drama.datatype import DataType, is_integer
+from drama.models.messages import MessageType, ObjectMessage, SignalMessage, SignalType
+from drama.process import Process
+from drama.storage.backend.local import LocalStorage
+from drama.transport import KafkaTransport, MemoryTransport
+from drama.transport.backend.kafka import _producer_pool
+from drama.transport.shm import (
+    SegmentNotReachable,
+    SegmentReader,
+    SegmentWriter,
+    register_consumer,
+    unregister_consumer,
+)
+
+
+@dataclass
+class Point(DataType):
+    x: int = is_integer()
+    y: int = is_integer()
+
+
+class CatalogWithMemoryTransportTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        transport = MemoryTransport()
+        self.directory = tempfile.mkdtemp()
+
+        self.import_tsv = Process(
+            name="ImportTSV",
+            module="drama.core.catalog.load.ImportTSV",
+            params={},
+            parent="test-workflow-1",
+            storage=LocalStorage(bucket_name="CatalogWithMemoryTransportTestCase", folder_name=["ImportTSV"]),
+            transport=transport,
+        )
+        self.read_tsv = Process(
+            name="ReadTSV",
+            module="drama.core.catalog.read.ReadTSV",
+            params={},
+            parent="test-workflow-1",
+            inputs={"TabularDataset": "ImportTSV.SimpleTabularDataset"},
+            storage=LocalStorage(bucket_name="CatalogWithMemoryTransportTestCase", folder_name=["ReadTSV"]),
+            transport=transport,
+        )
+
+    def test_should_run_catalog_components(self):
+        tsv_file = Path(self.directory, "dataset.tsv")
+        tsv_file.write_text("# comment\na\tb\nc\td\n")
+
+        ImportTSV.execute(self.import_tsv, url=str(tsv_file))
+        self.import_tsv.close()
+
+        with mock.patch.object(self.read_tsv, "info") as info:
+            ReadTSV.execute(self.read_tsv)
+
+        self.assertEqual([mock.call(["a", "b"]), mock.call(["c", "d"])], info.call_args_list)
+
+    def tearDown(self) -> None:
+        self.import_tsv.storage.remove_local_dir()
+        self.read_tsv.storage.remove_local_dir()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class KafkaTransportTestCase(unittest.TestCase):
+    @mock.patch("drama.transport.backend.kafka.KafkaProducer")
+    def test_should_reuse_pooled_producer_between_messages(self, kafka_producer):
+        kafka_producer.return_value = MagicMock()
+
+        transport = KafkaTransport()
+        transport.send(topic="test-topic", key=b"key", value=b"1")
+        transport.send(topic="test-topic", key=b"key", value=b"2")
+        transport.flush()
+
+        kafka_producer.assert_called_once()
+        self.assertEqual(2, kafka_producer.return_value.send.call_count)
+        kafka_producer.return_value.close.assert_not_called()
+
+        _producer_pool.close()
+
+    @mock.patch("drama.transport.backend.kafka.KafkaConsumer")
+    def test_should_commit_offsets_by_partition(self, kafka_consumer):
+        consumer = KafkaTransport().consumer(["test-topic"], group_id="group")
+        consumer.commit({TopicPartition("test-topic", 0): 5})
+
+        offsets = kafka_consumer.return_value.commit.call_args.args[0]
+        self.assertEqual(5, offsets[TopicPartition("test-topic", 0)].offset)
+
+
+class MemoryTransportTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.transport = MemoryTransport()
+
+    def test_should_poll_records_sent_to_subscribed_topics(self):
+        self.transport.send(topic="topic-a", key=b"a", value=1)
+        self.transport.send(topic="topic-b", key=b"b", value=2)
+
+        consumer = self.transport.consumer(["topic-a"])
+
+        self.assertEqual([1], [record.value for record in consumer.poll()["topic-a"]])
+        self.assertEqual({}, consumer.poll())
+
+    def test_should_poll_at_most_max_records(self):
+        for value in range(3):
+            self.transport.send(topic="topic-a", key=b"a", value=value)
+
+        consumer = self.transport.consumer(["topic-a"])
+
+        self.assertEqual([0, 1], [record.value for record in consumer.poll(max_records=2)["topic-a"]])
+        self.assertEqual([2], [record.value for record in consumer.poll(max_records=2)["topic-a"]])
+
+    def test_should_resume_from_committed_offset(self):
+        self.transport.send(topic="topic-a", key=b"a", value=1)
+
+        consumer = self.transport.consumer(["topic-a"], group_id="group")
+        consumer.poll()
+        consumer.commit()
+
+        self.transport.send(topic="topic-a", key=b"a", value=2)
+
+        resumed = self.transport.consumer(["topic-a"], group_id="group", rewind=False)
+        self.assertEqual([2], [record.value for record in resumed.poll()["topic-a"]])
+
+        rewound = self.transport.consumer(["topic-a"], group_id="group")
+        self.assertEqual([1, 2], [record.value for record in rewound.poll()["topic-a"]])
+
+
+class ProcessWithMemoryTransportTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        transport = MemoryTransport()
+        storage = LocalStorage(bucket_name="ProcessWithMemoryTransportTestCase", folder_name=["setUp"])
+
+        self.upstream = Process(
+            name="test-task-0",
+            module="",
+            params={},
+            parent="test-workflow-1",
+            storage=storage,
+            transport=transport,
+        )
+        self.downstream = Process(
+            name="test-task-1",
+            module="",
+            params={},
+            parent="test-workflow-1",
+            inputs={"point": "test-task-0.Point"},
+            storage=storage,
+            transport=transport,
+        )
+
+    def test_should_pass_datatypes_without_serialization(self):
+        message = self.upstream.to_downstream(Point(1, 2))
+        self.upstream.to_downstream_many([Point(3, 4), Point(5, 6)])
+        self.upstream._send(SignalMessage(data=SignalType.STOP))
+
+        self.assertEqual(ObjectMessage(type=MessageType.BLOCK, key="test-task-0.Point", records=[Point(1, 2)]), message)
+
+        records = self.downstream.get_from_upstream()
+        self.assertEqual([{"x": 1, "y": 2}, {"x": 3, "y": 4}, {"x": 5, "y": 6}], records["point"])
+
+    def test_should_resume_after_all_inputs_were_consumed(self):
+        self.upstream.to_downstream(Point(1, 2))
+        self.upstream._send(SignalMessage(data=SignalType.STOP))
+
+        self.assertEqual([{"x": 1, "y": 2}], self.downstream.get_from_upstream()["point"])
+
+        # retry of the same task, resuming from offsets committed by the previous run
+        self.downstream.resume = True
+        self.assertEqual({}, self.downstream.get_from_upstream(timeout=2))
+
+    def test_should_serialize_datatypes_without_servo(self):
+        self.upstream.to_downstream(Point(1, 2))
+        self.upstream._send(SignalMessage(data=SignalType.STOP))
+
+        records = self.downstream.get_from_upstream(apply_servo=False)
+        self.assertEqual([b"\x02\x04"], records["point"])
+
+    def tearDown(self) -> None:
+        self.upstream.storage.remove_local_dir()
+
+
+class SharedMemoryTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        for name, value in (("DATA_DIR", self.directory), ("SHM_THRESHOLD_BYTES", 1)):
+            patcher = mock.patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # memory transport which exchanges serialized messages, as kafka does
+        transport = MemoryTransport()
+        transport.serializes = True
+        storage = LocalStorage(bucket_name="SharedMemoryTestCase", folder_name=["setUp"])
+
+        self.upstream = Process(
+            name="test-task-0",
+            module="",
+            params={},
+            parent="test-workflow-1",
+            storage=storage,
+            transport=transport,
+            downstream=["test-task-1"],
+        )
+        self.downstream = Process(
+            name="test-task-1",
+            module="",
+            params={},
+            parent="test-workflow-1",
+            inputs={"point": "test-task-0.Point"},
+            storage=storage,
+            transport=transport,
+        )
+
+    def test_should_read_written_payloads(self):
+        writer = SegmentWriter("test-workflow-1", "test-task-0", readers=["test-task-1"])
+        first, second = writer.write(b"first"), writer.write(b"second")
+
+        reader = SegmentReader()
+        self.assertEqual(b"first", reader.read(first).tobytes())
+        self.assertEqual(b"second", reader.read(second).tobytes())
+
+        writer.close()
+        reader.close()
+
+    def test_should_send_inline_until_downstream_is_colocated(self):
+        self.assertEqual(MessageType.BLOCK, self.upstream.to_downstream(Point(1, 2)).type)
+
+        register_consumer("test-workflow-1", "test-task-1")
+
+        self.assertEqual(MessageType.REFERENCE, self.upstream.to_downstream(Point(3, 4)).type)
+        batch = self.upstream.to_downstream_many([Point(5, 6), Point(7, 8)])
+        assert batch is not None
+        self.assertEqual(MessageType.REFERENCE, batch.type)
+
+    def test_should_dereference_payloads(self):
+        register_consumer("test-workflow-1", "test-task-1")
+
+        self.upstream.to_downstream(Point(1, 2))
+        self.upstream.to_downstream_many([Point(3, 4), Point(5, 6)])
+        self.upstream._send(SignalMessage(data=SignalType.STOP))
+
+        records = self.downstream.get_from_upstream()
+        self.assertEqual([{"x": 1, "y": 2}, {"x": 3, "y": 4}, {"x": 5, "y": 6}], records["point"])
+
+    def test_should_raise_exception_when_segment_is_not_reachable(self):
+        with self.assertRaises(SegmentNotReachable):
+            SegmentReader().read(dict(host="another-host", path="/dev/null", offset=0, length=1))
+
+    def test_should_ignore_registrations_of_previous_attempts(self):
+        register_consumer("test-workflow-1", "test-task-1")
+        unregister_consumer("test-workflow-1", "test-task-1")
+
+        self.assertEqual(MessageType.BLOCK, self.upstream.to_downstream(Point(1, 2)).type)
+
+        # registration left behind by a crashed worker
+        crashed = subprocess.Popen(["true"])
+        crashed.wait()
+        register_consumer("test-workflow-1", "test-task-1")
+        Path(self.directory, "test-workflow-1", ".segments", "test-task-1.host").write_text(
+            f"{socket.gethostname()} {crashed.pid}"
+        )
+
+        self.assertEqual(MessageType.BLOCK, self.upstream.to_downstream(Point(3, 4)).type)
+
+    def test_should_remove_segments_and_registrations_once_released(self):
+        register_consumer("test-workflow-1", "test-task-1")
+
+        self.upstream.to_downstream(Point(1, 2))
+        self.upstream._send(SignalMessage(data=SignalType.STOP))
+        segment_writer = self.upstream._segment_writer
+        assert segment_writer is not None
+        segment_writer.close()
+
+        self.downstream.get_from_upstream()
+        self.downstream.release_segments()
+
+        self.assertEqual([], list(Path(self.directory, "test-workflow-1", ".segments").iterdir()))
+
+    def test_should_keep_segments_for_retries(self):
+        register_consumer("test-workflow-1", "test-task-1")
+
+        self.upstream.to_downstream(Point(1, 2))
+        self.upstream._send(SignalMessage(data=SignalType.STOP))
+        segment_writer = self.upstream._segment_writer
+        assert segment_writer is not None
+        segment_writer.close()
+
+        self.assertEqual([{"x": 1, "y": 2}], self.downstream.get_from_upstream()["point"])
+
+        # failed attempt is retried in the same host, after upstream task closed
+        self.assertEqual([{"x": 1, "y": 2}], self.downstream.get_from_upstream()["point"])
+
+    def test_should_resend_payloads_inline_when_segment_is_not_reachable(self):
+        register_consumer("test-workflow-1", "test-task-1")
+
+        self.upstream.to_downstream(Point(1, 2))
+        self.upstream.to_downstream_many([Point(3, 4), Point(5, 6)])
+
+        # downstream task is rescheduled in another host
+        unregister_consumer("test-workflow-1", "test-task-1")
+        self.upstream._resend_offloaded()
+        self.upstream._send(SignalMessage(data=SignalType.STOP))
+
+        with mock.patch("drama.transport.shm.socket.gethostname", return_value="another-host"):
+            records = self.downstream.get_from_upstream()
+
+        self.assertEqual([{"x": 1, "y": 2}, {"x": 3, "y": 4}, {"x": 5, "y": 6}], records["point"])
+
+    def test_should_skip_resent_payloads_when_segment_is_reachable(self):
+        register_consumer("test-workflow-1", "test-task-1")
+
+        self.upstream.to_downstream(Point(1, 2))
+
+        unregister_consumer("test-workflow-1", "test-task-1")
+        self.upstream._resend_offloaded()
+        self.upstream._send(SignalMessage(data=SignalType.STOP))
+
+        records = self.downstream.get_from_upstream()
+        self.assertEqual([{"x": 1, "y": 2}], records["point"])
+
+    def test_should_raise_exception_when_payloads_are_not_resent(self):
+        register_consumer("test-workflow-1", "test-task-1")
+
+        self.upstream.to_downstream(Point(1, 2))
+        self.upstream._send(SignalMessage(data=SignalType.STOP))
+
+        with mock.patch("drama.transport.shm.socket.gethostname", return_value="another-host"):
+            with self.assertRaises(SegmentNotReachable):
+                self.downstream.get_from_upstream()
+
+    def tearDown(self) -> None:
+        if self.upstream._segment_writer is not None:
+            self.upstream._segment_writer.close()
+        self.upstream.storage.remove_local_dir()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
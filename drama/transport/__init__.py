@@ -0,0 +1,4 @@
+from .backend.kafka import KafkaTransport
+from .backend.memory import MemoryTransport
+
+__all__ = ["KafkaTransport", "MemoryTransport"]
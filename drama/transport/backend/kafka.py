@@ -0,0 +1,142 @@
+import atexit
+import os
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from kafka import (
+    ConsumerRebalanceListener,
+    KafkaConsumer,
+    KafkaProducer,
+    TopicPartition,
+)
+from kafka.structs import OffsetAndMetadata
+
+from drama.config import settings
+from drama.transport.base import Consumer, Transport
+
+
+class _SeekToBeginning(ConsumerRebalanceListener):
+    """
+    Rewinds partitions the first time they are assigned, ignoring offsets committed by the consumer group.
+    """
+
+    def __init__(self, consumer: KafkaConsumer):
+        self.consumer = consumer
+        self.rewound: Set[TopicPartition] = set()
+
+    def on_partitions_revoked(self, revoked):
+        pass
+
+    def on_partitions_assigned(self, assigned):
+        partitions = [partition for partition in assigned if partition not in self.rewound]
+        if partitions:
+            self.consumer.seek_to_beginning(*partitions)
+            self.rewound.update(partitions)
+
+
+class _ProducerPool:
+    """
+    Long-lived Kafka producers shared by every process running inside the same worker process.
+    Producers are keyed by PID so that forked workers never reuse a connection inherited from their parent.
+    """
+
+    def __init__(self):
+        self._producers: Dict[Tuple[int, tuple], KafkaProducer] = {}
+        self._lock = threading.Lock()
+
+    def get(self, **kwargs) -> KafkaProducer:
+        """
+        Returns pooled producer for the current PID and `kwargs`, creating it on first use.
+        """
+        key = (os.getpid(), tuple(sorted(kwargs.items())))
+
+        with self._lock:
+            producer = self._producers.get(key)
+            if producer is None:
+                options = dict(
+                    linger_ms=settings.KAFKA_PRODUCER_LINGER_MS,
+                    batch_size=settings.KAFKA_PRODUCER_BATCH_SIZE,
+                    compression_type=settings.KAFKA_PRODUCER_COMPRESSION_TYPE,
+                )
+                options.update(kwargs)
+                producer = KafkaProducer(bootstrap_servers=[settings.KAFKA_CONN], **options)
+                self._producers[key] = producer
+
+        return producer
+
+    def close(self) -> None:
+        """
+        Flushes and closes producers owned by the current PID.
+        """
+        with self._lock:
+            for (pid, options), producer in list(self._producers.items()):
+                if pid == os.getpid():
+                    producer.close()
+                    del self._producers[(pid, options)]
+
+
+_producer_pool = _ProducerPool()
+atexit.register(_producer_pool.close)
+
+
+class _KafkaConsumer(Consumer):
+    """
+    Kafka consumer whose commits take plain offsets by partition.
+    """
+
+    def __init__(self, consumer: KafkaConsumer):
+        self.consumer = consumer
+
+    def poll(self, timeout_ms: int = 0, max_records: Optional[int] = None) -> Dict[Any, list]:
+        return self.consumer.poll(timeout_ms=timeout_ms, max_records=max_records)
+
+    def commit(self, offsets: Optional[Dict[Any, int]] = None) -> None:
+        if offsets is None:
+            self.consumer.commit()
+            return
+
+        # `leader_epoch` was added to offsets in kafka-python 2.1
+        epoch = (-1,) if "leader_epoch" in OffsetAndMetadata._fields else ()
+        self.consumer.commit(
+            {partition: OffsetAndMetadata(offset, "", *epoch) for partition, offset in offsets.items()}
+        )
+
+    def close(self) -> None:
+        self.consumer.close()
+
+
+class KafkaTransport(Transport):
+    """
+    Transport based on Apache Kafka. Messages are serialized with Avro.
+    """
+
+    def send(self, topic: str, key: Optional[bytes], value: bytes, **kwargs) -> None:
+        # records are batched by the pooled producer until flushed
+        self._producer().send(topic=topic, value=value, key=key, **kwargs)
+
+    def flush(self) -> None:
+        # producer is shared with other tasks in this worker, so it is flushed but never closed
+        self._producer().flush()
+
+    def consumer(self, topics: List[str], group_id: Optional[str] = None, rewind: bool = True, **kwargs) -> Consumer:
+        """
+        Creates a new Kafka consumer. Offsets are only committed explicitly, once records are processed.
+        """
+        options = dict(
+            bootstrap_servers=[settings.KAFKA_CONN],
+            group_id=group_id,
+            auto_offset_reset="earliest",
+            enable_auto_commit=False,
+        )
+        options.update(kwargs)
+
+        consumer = KafkaConsumer(**options)
+        consumer.subscribe(topics=topics, listener=_SeekToBeginning(consumer) if rewind else None)
+
+        return _KafkaConsumer(consumer)
+
+    def _producer(self, **kwargs) -> KafkaProducer:
+        """
+        Returns long-lived Kafka producer from worker's pool.
+        """
+        return _producer_pool.get(**kwargs)
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from drama.transport.base import Consumer, Record, Transport
+
+
+class MemoryConsumer(Consumer):
+    def __init__(self, transport: "MemoryTransport", topics: List[str], group_id: Optional[str], rewind: bool):
+        self.transport = transport
+        self.group_id = group_id
+        self.positions = {topic: 0 if rewind else transport.committed(group_id, topic) for topic in topics}
+
+    def poll(self, timeout_ms: int = 0, max_records: Optional[int] = None) -> Dict[Any, List[Record]]:
+        deadline = time.monotonic() + timeout_ms / 1000
+
+        with self.transport.condition:
+            while True:
+                records = self._fetch(max_records)
+                remaining = deadline - time.monotonic()
+                if records or remaining <= 0:
+                    return records
+                self.transport.condition.wait(remaining)
+
+    def _fetch(self, max_records: Optional[int]) -> Dict[Any, List[Record]]:
+        """
+        Returns pending records of every topic and advances positions.
+        """
+        records: Dict[Any, List[Record]] = {}
+        budget = max_records or float("inf")
+
+        for topic, position in self.positions.items():
+            pending = self.transport.topics[topic][position:]
+            if budget < len(pending):
+                pending = pending[: int(budget)]
+            if pending:
+                records[topic] = pending
+                self.positions[topic] = position + len(pending)
+                budget -= len(pending)
+            if budget <= 0:
+                break
+
+        return records
+
+    def commit(self, offsets: Optional[Dict[Any, int]] = None) -> None:
+        self.transport.commit(self.group_id, self.positions if offsets is None else offsets)
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryTransport(Transport):
+    """
+    In-process transport. Messages are kept in memory and delivered as Python objects, without serialization,
+    hence all tasks of a workflow must run in the same process.
+    """
+
+    serializes = False
+
+    def __init__(self):
+        self.topics: Dict[str, List[Record]] = defaultdict(list)
+        self.offsets: Dict[Tuple[Optional[str], str], int] = {}
+        self.condition = threading.Condition()
+
+    def send(self, topic: str, key: Optional[bytes], value: Any, **kwargs) -> None:
+        with self.condition:
+            self.topics[topic].append(Record(topic=topic, key=key, value=value, offset=len(self.topics[topic])))
+            self.condition.notify_all()
+
+    def flush(self) -> None:
+        pass
+
+    def consumer(
+        self, topics: List[str], group_id: Optional[str] = None, rewind: bool = True, **kwargs
+    ) -> MemoryConsumer:
+        with self.condition:
+            return MemoryConsumer(self, topics, group_id, rewind)
+
+    def committed(self, group_id: Optional[str], topic: str) -> int:
+        """
+        Returns last committed offset of `group_id` in `topic`.
+        """
+        return self.offsets.get((group_id, topic), 0)
+
+    def commit(self, group_id: Optional[str], positions: Dict[str, int]) -> None:
+        if group_id is None:
+            return
+        with self.condition:
+            for topic, position in positions.items():
+                self.offsets[(group_id, topic)] = position
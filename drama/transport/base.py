@@ -0,0 +1,73 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class Record(NamedTuple):
+    """
+    Record as returned by consumers, mimicking Kafka's `ConsumerRecord`.
+    """
+
+    topic: str
+    # records published by tasks are keyed by their name
+    key: Optional[bytes]
+    value: Any
+    # position of the record in its topic (or partition)
+    offset: int = 0
+
+
+class Consumer(ABC):
+    """
+    Subscribes to a list of topics and polls records from them.
+    """
+
+    @abstractmethod
+    def poll(self, timeout_ms: int = 0, max_records: Optional[int] = None) -> Dict[Any, List[Record]]:
+        """
+        Waits up to `timeout_ms` for records and returns them grouped by topic (or partition).
+        """
+        pass
+
+    @abstractmethod
+    def commit(self, offsets: Optional[Dict[Any, int]] = None) -> None:
+        """
+        Commits the position of records returned so far or, if given, `offsets` (i.e., the offset of the next
+        record to read) by topic (or partition), as keyed by `poll`.
+        """
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+
+class Transport(ABC):
+    """
+    Channel used by processes to exchange messages.
+    """
+
+    # if false, messages are delivered as Python objects and do not need to be serialized
+    serializes: bool = True
+
+    @abstractmethod
+    def send(self, topic: str, key: Optional[bytes], value: Any, **kwargs) -> None:
+        """
+        Publishes `value` to `topic`. Messages might be buffered until `flush` is called.
+        """
+        pass
+
+    @abstractmethod
+    def flush(self) -> None:
+        """
+        Blocks until all buffered messages have been sent.
+        """
+        pass
+
+    @abstractmethod
+    def consumer(self, topics: List[str], group_id: Optional[str] = None, rewind: bool = True, **kwargs) -> Consumer:
+        """
+        Creates a new consumer subscribed to `topics`.
+
+        :param group_id: Consumer group, used to keep committed offsets between runs.
+        :param rewind: If true, topics are read from the beginning regardless of committed offsets.
+        """
+        pass
@@ -0,0 +1,29 @@
+from typing import Dict
+
+from drama.config import settings
+from drama.logger import get_logger
+from drama.transport.backend.kafka import KafkaTransport
+from drama.transport.backend.memory import MemoryTransport
+from drama.transport.base import Transport
+
+logger = get_logger(__name__)
+
+_transports: Dict[str, Transport] = {}
+
+
+def get_available_transport() -> Transport:
+    """
+    Get transport based on settings. Transports are shared by every process in the worker.
+    """
+    backend = settings.TRANSPORT
+
+    if backend not in _transports:
+        if backend == "kafka":
+            _transports[backend] = KafkaTransport()
+        elif backend == "memory":
+            logger.warning("MemoryTransport does not support distributed execution")
+            _transports[backend] = MemoryTransport()
+        else:
+            raise ValueError(f"Unknown transport `{backend}`: expected `kafka` or `memory`")
+
+    return _transports[backend]
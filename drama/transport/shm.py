@@ -0,0 +1,149 @@
+import mmap
+import os
+import socket
+import threading
+from pathlib import Path
+from typing import IO, Dict, List, Optional
+
+from drama.config import settings
+from drama.storage.cache import _is_alive
+
+
+class SegmentNotReachable(Exception):
+    """
+    Raised when a payload descriptor points to a segment in another host.
+    """
+
+    pass
+
+
+def _segments_dir(parent: str) -> Path:
+    return Path(settings.DATA_DIR, parent, ".segments")
+
+
+def register_consumer(parent: str, name: str) -> None:
+    """
+    Announces that task `name` consumes from this host, so that co-located upstream tasks can share
+    payloads through memory-mapped segments. Registrations belong to the worker process running the current
+    attempt of the task, see `unregister_consumer`.
+    """
+    directory = _segments_dir(parent)
+    directory.mkdir(parents=True, exist_ok=True)
+    Path(directory, f"{name}.host").write_text(f"{socket.gethostname()} {os.getpid()}")
+
+
+def unregister_consumer(parent: str, name: str) -> None:
+    """
+    Withdraws registration of task `name`, once its current attempt stops consuming.
+    """
+    try:
+        Path(_segments_dir(parent), f"{name}.host").unlink()
+    except FileNotFoundError:
+        pass
+
+
+def are_colocated(parent: str, names: List[str]) -> bool:
+    """
+    Returns true if all tasks in `names` have registered as consumers in this host.
+    """
+    hostname = socket.gethostname()
+    for name in names:
+        try:
+            host, pid = Path(_segments_dir(parent), f"{name}.host").read_text().split()
+        except (FileNotFoundError, ValueError):
+            return False
+        # registrations of crashed attempts are ignored, as the task might have been rescheduled in another host
+        if host != hostname or not _is_alive(int(pid)):
+            return False
+    return True
+
+
+def release_segment(parent: str, name: str, reader: str) -> None:
+    """
+    Reports that task `reader` will no longer read the segment of task `name`. The segment is removed once
+    all its readers have released it.
+    """
+    readers_dir = Path(_segments_dir(parent), f"{name}.readers")
+    try:
+        Path(readers_dir, reader).unlink()
+        # fails unless this was the last reader, so that only one of them removes the segment
+        readers_dir.rmdir()
+        Path(_segments_dir(parent), f"{name}.seg").unlink()
+    except OSError:
+        # segment is still read by other tasks, or was already removed
+        pass
+
+
+class SegmentWriter:
+    """
+    Append-only file under `DATA_DIR` where a task writes payloads that co-located tasks read with `mmap`.
+    The segment is kept until all `readers` release it, see `release_segment`.
+    """
+
+    def __init__(self, parent: str, name: str, readers: List[str]):
+        self.path = Path(_segments_dir(parent), f"{name}.seg")
+        readers_dir = Path(_segments_dir(parent), f"{name}.readers")
+        readers_dir.mkdir(parents=True, exist_ok=True)
+        for reader in readers:
+            Path(readers_dir, reader).touch()
+        self._file: Optional[IO[bytes]] = None
+        self._lock = threading.Lock()
+
+    def write(self, payload: bytes) -> dict:
+        """
+        Appends `payload` to segment and returns its descriptor.
+        """
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "ab")
+            offset = self._file.tell()
+            self._file.write(payload)
+            # make data visible to readers thought the page cache, no need to sync to disk
+            self._file.flush()
+
+        return dict(host=socket.gethostname(), path=str(self.path), offset=offset, length=len(payload))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class SegmentReader:
+    """
+    Maps segments written by upstream tasks. Segments are remapped whenever they grow beyond the mapped region.
+    """
+
+    def __init__(self):
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._stale: List[mmap.mmap] = []
+
+    def read(self, segment: dict) -> memoryview:
+        """
+        Returns a zero-copy view of the payload referenced by `segment` descriptor.
+        """
+        if segment["host"] != socket.gethostname() or not os.path.isfile(segment["path"]):
+            raise SegmentNotReachable(f"Segment {segment['path']} from host {segment['host']} is not reachable")
+
+        end = segment["offset"] + segment["length"]
+
+        segment_map = self._maps.get(segment["path"])
+        if segment_map is None or len(segment_map) < end:
+            if segment_map is not None:
+                # views of the previous map might still be in use
+                self._stale.append(segment_map)
+            with open(segment["path"], "rb") as f:
+                segment_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment["path"]] = segment_map
+
+        return memoryview(segment_map)[segment["offset"] : end]
+
+    def close(self) -> None:
+        for segment_map in [*self._maps.values(), *self._stale]:
+            try:
+                segment_map.close()
+            except BufferError:
+                # exported views are still alive, the map is released once they are garbage collected
+                pass
+        self._maps, self._stale = {}, []
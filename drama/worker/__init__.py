@@ -1,8 +1,9 @@
-from .worker import set_failure, set_running, set_success, worker
+from .worker import enqueue_many, set_failure, set_running, set_success, worker
 
 __all__ = [
     "worker",
     "set_running",
     "set_success",
     "set_failure",
+    "enqueue_many",
 ]
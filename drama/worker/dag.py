@@ -0,0 +1,117 @@
+from typing import Dict, List
+
+from drama.models.task import Task
+from drama.models.workflow import Workflow
+
+
+class CyclicWorkflowError(ValueError):
+    """
+    Raised when tasks of a workflow depend on each other.
+    """
+
+    pass
+
+
+class MissingInputError(ValueError):
+    """
+    Raised when a task input references a task which is not part of the workflow.
+    """
+
+    pass
+
+
+class DuplicateTaskError(ValueError):
+    """
+    Raised when several tasks of a workflow have the same name.
+    """
+
+    pass
+
+
+class WorkflowGraph:
+    """
+    Dependency graph of a workflow, where edges go from upstream to downstream tasks.
+    """
+
+    def __init__(self, workflow: Workflow):
+        # workflows are not validated when built without pydantic (e.g., with `construct`)
+        self.tasks: Dict[str, Task] = {}
+        for task in workflow.tasks:
+            if task.name in self.tasks:
+                raise DuplicateTaskError(f"Task name `{task.name}` is not unique")
+            self.tasks[task.name] = task
+
+        self.upstream: Dict[str, List[str]] = {name: [] for name in self.tasks}
+        self.downstream: Dict[str, List[str]] = {name: [] for name in self.tasks}
+
+        for task in workflow.tasks:
+            for task_input in task.inputs.values():
+                upstream_name = task_input.split(".")[0]
+                if upstream_name not in self.upstream[task.name]:
+                    self.upstream[task.name].append(upstream_name)
+                    self.downstream.setdefault(upstream_name, []).append(task.name)
+
+    @property
+    def sources(self) -> List[str]:
+        """
+        Tasks without upstream tasks, which can be executed right away.
+        """
+        return [name for name, upstream in self.upstream.items() if not upstream]
+
+    def levels(self) -> List[List[str]]:
+        """
+        Returns execution levels (Kahn's algorithm), where tasks of each level only depend on tasks
+        of previous levels and thus can run in parallel. Tasks keep their declaration order within levels.
+        """
+        for task_name, upstream in self.upstream.items():
+            for upstream_name in upstream:
+                if upstream_name not in self.tasks:
+                    raise MissingInputError(f"Task `{task_name}` references unknown task `{upstream_name}`")
+
+        order = {task_name: index for index, task_name in enumerate(self.tasks)}
+        pending_upstream = {task_name: len(upstream) for task_name, upstream in self.upstream.items()}
+
+        levels = []
+        level = self.sources
+        while level:
+            levels.append(level)
+            next_level = []
+            for task_name in level:
+                for downstream_name in self.downstream[task_name]:
+                    pending_upstream[downstream_name] -= 1
+                    if pending_upstream[downstream_name] == 0:
+                        next_level.append(downstream_name)
+            level = sorted(next_level, key=order.__getitem__)
+
+        if sum(len(level) for level in levels) < len(self.tasks):
+            cyclic_tasks = [task_name for task_name, pending in pending_upstream.items() if pending > 0]
+            raise CyclicWorkflowError(f"Tasks {cyclic_tasks} are part of (or depend on) a cycle")
+
+        return levels
+
+    def remaining_paths(self, durations: Dict[str, float]) -> Dict[str, float]:
+        """
+        Returns, for each task, the estimated duration of the longest path from the task (included) to any sink.
+        Durations are given per module; tasks with unknown modules are weighted with the mean known duration.
+        """
+        known_durations = [durations[task.module] for task in self.tasks.values() if task.module in durations]
+        default_duration = sum(known_durations) / len(known_durations) if known_durations else 1.0
+
+        # downstream tasks are always in later levels, so they are visited first
+        paths: Dict[str, float] = {}
+        for level in reversed(self.levels()):
+            for task_name in level:
+                longest_downstream = max((paths[d] for d in self.downstream[task_name]), default=0.0)
+                paths[task_name] = durations.get(self.tasks[task_name].module, default_duration) + longest_downstream
+
+        return paths
+
+    def priorities(self, durations: Dict[str, float], max_priority: int) -> Dict[str, int]:
+        """
+        Maps remaining paths onto priorities between 0 and `max_priority`, so that tasks in the
+        critical path get the highest priority.
+        """
+        paths = self.remaining_paths(durations)
+        longest_path = max(paths.values(), default=0.0)
+
+        return {name: round(max_priority * path / longest_path) if longest_path else 0 for name, path in paths.items()}
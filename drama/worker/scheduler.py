@@ -1,5 +1,5 @@
-from collections import defaultdict
 from datetime import datetime
+from typing import List, Optional, Tuple
 
 import dramatiq
 
@@ -9,7 +9,8 @@ from drama.logger import get_logger
 from drama.manager import TaskManager, WorkflowManager
 from drama.models.task import Task, TaskInDb, TaskStatus
 from drama.models.workflow import Workflow, WorkflowInDb, WorkflowStatus
-from drama.worker import set_failure, worker
+from drama.worker import enqueue_many, set_failure, worker
+from drama.worker.dag import WorkflowGraph
 
 logger = get_logger(__name__)
 
@@ -22,7 +23,16 @@ class Scheduler:
         """
         Send workflow request to main `drama` actor.
         Workflow is divided into individual tasks and processed by the former actor.
+        Raises `CyclicWorkflowError`, `MissingInputError` or `DuplicateTaskError` if the workflow is not valid.
         """
+        for task in workflow.tasks:
+            # Update task to include workflow metadata.
+            task.metadata.update(workflow.metadata)
+
+        # Validates workflow before anything is created.
+        graph = WorkflowGraph(workflow)
+        sorted_tasks = [task_name for level in graph.levels() for task_name in level]
+
         # Creates workflow in database.
         workflow_in_db = WorkflowManager(self.db).create_or_update_from_id(
             workflow.id,
@@ -32,16 +42,32 @@ class Scheduler:
             status=WorkflowStatus.STATUS_PENDING,
         )
 
-        tasks = {}
-        for task in workflow.tasks:
-            # Update task to include workflow metadata.
-            task.metadata.update(workflow.metadata)
-            tasks[task.name] = task
+        # Tasks in the critical path (i.e., longest remaining path) are prioritized by the broker.
+        priorities = {}
+        if settings.RABBIT_MAX_PRIORITY:
+            modules = list({task.module for task in workflow.tasks})
+            durations = TaskManager(self.db).mean_durations(modules)
+            priorities = graph.priorities(durations, max_priority=settings.RABBIT_MAX_PRIORITY)
 
-        # Execute workflow in order.
-        sorted_tasks = self.sorted_tasks(workflow)
+        messages = {}
         for task_name in sorted_tasks:
-            self.enqueue(task_request=tasks[task_name], workflow_id=workflow.id)
+            messages[task_name] = self.build_message(
+                task_request=graph.tasks[task_name],
+                workflow_id=workflow.id,
+                downstream=graph.downstream[task_name],
+                priority=priorities.get(task_name),
+            )
+
+        # Register every task before sending any of them, so that no upstream task can start
+        # before its downstream tasks are waiting for it.
+        self.register(
+            [(graph.tasks[task_name], messages[task_name], graph.upstream[task_name]) for task_name in sorted_tasks],
+            workflow_id=workflow.id,
+        )
+
+        # Execute source tasks, the rest are sent by the worker once their upstream tasks have started.
+        sources = sorted(graph.sources, key=lambda name: priorities.get(name, 0), reverse=True)
+        enqueue_many([messages[task_name] for task_name in sources])
 
         return workflow_in_db
 
@@ -67,35 +93,70 @@ class Scheduler:
         """
         Send task request to main `drama` actor.
         """
+        message = self.build_message(task_request, workflow_id)
+        task = self.register([(task_request, message, [])], workflow_id=workflow_id)[0]
+
         # Triggers actor execution
+        broker = dramatiq.get_broker()
+        broker.enqueue(message)
+
+        return task
+
+    def build_message(
+        self,
+        task_request: Task,
+        workflow_id: str,
+        downstream: Optional[List[str]] = None,
+        priority: Optional[int] = None,
+    ) -> dramatiq.Message:
+        """
+        Returns message for the main `drama` actor. Its id is also the id of the task.
+        """
         task_dict = task_request.dict()
+        task_dict["downstream"] = downstream or []
+        options = {"broker_priority": priority} if priority is not None else {}
         _message = worker.message_with_options(
             args=(task_dict, workflow_id),
             on_failure=set_failure,
+            **options,
         )
         _message = _message.copy(
             queue_name=task_request.options.queue_name or settings.DEFAULT_ACTOR_OPTS.queue_name,
         )
 
-        broker = dramatiq.get_broker()
-        message = broker.enqueue(_message)
-
-        # Creates task on database
-        task = TaskManager(self.db).create_or_update_from_id(
-            message.message_id,
-            name=task_request.name,
-            parent=workflow_id,
-            module=task_request.module,
-            params=task_request.params,
-            inputs=task_request.inputs,
-            labels=task_request.labels,
-            options=task_request.options,
-            metadata=task_request.metadata,
-            status=TaskStatus.STATUS_PENDING,
-            created_at=datetime.now(),
-        )
+        return _message
 
-        return task
+    def register(self, tasks: List[Tuple[Task, dramatiq.Message, List[str]]], workflow_id: str) -> List[TaskInDb]:
+        """
+        Creates tasks on database within a single round trip, given as (`task_request`, `message`, `upstream`).
+        Tasks with `upstream` tasks hold their message until all of them have started.
+        """
+        tasks_in_db = []
+        held_messages = {}
+
+        for task_request, message, upstream in tasks:
+            tasks_in_db.append(
+                TaskInDb(
+                    id=message.message_id,
+                    name=task_request.name,
+                    parent=workflow_id,
+                    module=task_request.module,
+                    params=task_request.params,
+                    inputs=task_request.inputs,
+                    labels=task_request.labels,
+                    options=task_request.options,
+                    metadata=task_request.metadata,
+                    status=TaskStatus.STATUS_PENDING,
+                    created_at=datetime.now(),
+                )
+            )
+            if upstream:
+                held_messages[message.message_id] = {"pending_upstream": upstream, "message": message.asdict()}
+
+        TaskManager(self.db).bulk_create_or_update(tasks_in_db, extra_fields=held_messages)
+        WorkflowManager(self.db).count_tasks(workflow_id, to_status=TaskStatus.STATUS_PENDING, amount=len(tasks_in_db))
+
+        return tasks_in_db
 
     def status(self, workflow_id: str) -> WorkflowInDb:
         workflow = WorkflowManager(self.db).find_one(id=workflow_id)
@@ -104,37 +165,12 @@ class Scheduler:
         return workflow
 
     @staticmethod
-    def sorted_tasks(workflow: Workflow) -> list:
-        def iterative_topological_sort(graph, start):
-            seen = set()
-            stack = []  # path variable is gone, stack and order are new
-            order = []  # order will be in reverse order at first
-            q = [s for s in start]
-            while q:
-                v = q.pop()
-                if v not in seen:
-                    seen.add(v)  # no need to append to path any more
-                    q.extend(graph[v])
-
-                    while stack and v not in graph[stack[-1]]:  # new stuff here!
-                        order.append(stack.pop())
-                    stack.append(v)
-
-            return stack + order[::-1]  # new return value!
-
-        sources = []
-        graph = defaultdict(list)
-
-        for task in workflow.tasks:
-            if not task.inputs:
-                sources.append(task.name)
-            else:
-                for _, task_input in task.inputs.items():
-                    graph[task_input.split(".")[0]].append(task.name)
-
-        ordered_workflow_tasks = iterative_topological_sort(graph, sources)
-
-        return ordered_workflow_tasks
+    def sorted_tasks(workflow: Workflow) -> List[str]:
+        """
+        Returns workflow tasks in topological order (i.e., flattened execution levels).
+        Raises `CyclicWorkflowError`, `MissingInputError` or `DuplicateTaskError` if the workflow is not valid.
+        """
+        return [task_name for level in WorkflowGraph(workflow).levels() for task_name in level]
 
     def __enter__(self):
         return self
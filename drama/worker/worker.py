@@ -1,9 +1,9 @@
 import traceback
 from datetime import datetime
-from typing import Callable
-import time 
+from typing import Dict, List, Optional, Tuple
 
 import dramatiq
+import pika
 from dramatiq import MessageProxy
 from dramatiq.brokers.rabbitmq import RabbitmqBroker
 from dramatiq.middleware import CurrentMessage
@@ -11,9 +11,9 @@ from dramatiq.middleware import CurrentMessage
 from drama.config import settings
 from drama.database import get_db_connection
 from drama.logger import get_logger
-from drama.manager import TaskManager, WorkflowManager
-from drama.models.task import TaskResult, TaskSecret, TaskStatus
-from drama.models.workflow import WorkflowStatus
+from drama.manager import EventManager, TaskManager, WorkflowManager
+from drama.models.task import TaskInDb, TaskResult, TaskSecret, TaskStatus
+from drama.models.workflow import WorkflowEvent, WorkflowStatus
 from drama.process import Process
 from drama.storage.helpers import get_available_storage
 from drama.worker.helpers import get_process_func
@@ -21,7 +21,7 @@ from drama.worker.helpers import get_process_func
 logger = get_logger(__name__)
 
 logger.info("Setting up RabbitMQ broker")
-broker = RabbitmqBroker(url=settings.RABBIT_DNS)
+broker = RabbitmqBroker(url=settings.RABBIT_DNS, max_priority=settings.RABBIT_MAX_PRIORITY)
 broker.add_middleware(CurrentMessage())
 
 dramatiq.set_broker(broker)
@@ -48,7 +48,7 @@ def worker(task_request: dict, workflow_id: str):
     # Optional task attributes.
     task_params = task_request["params"]
     task_inputs = task_request["inputs"]
-    task_inputs_names = [inn.split(".")[0] for inn in task_inputs]
+    task_downstream = task_request.get("downstream", [])
 
     task_secrets = task_request["secrets"]
     task_unsealed_secrets = []
@@ -56,35 +56,11 @@ def worker(task_request: dict, workflow_id: str):
     for secret in task_secrets:
         task_unsealed_secrets.append(TaskSecret(**secret).unseal(settings.SECRETS_SK_KEY.get_secret_value()))
 
-    # To this point, we can check if the task can be executed or not
-    # i.e., if any input tasks are in pending state then there's no reason
-    #   to execute this task yet.
-    # -- start fix
-    db = get_db_connection()
-    are_pending = []
-
-    time.sleep(5)
-
-    tasks = TaskManager(db).find(parent=workflow_id)
-    if not tasks:
-        # Very strange, but we have no tasks (¿TODO?)
-        raise ValueError(f"Tasks for workflow `{workflow_id}` not found")
-
-    for task in tasks:
-        if task in task_inputs_names:
-            task_with_status = TaskManager(db).find_one(id=task_id)
-            are_pending.append(task_with_status["status"] == TaskStatus.STATUS_PENDING)
-
-    if any(are_pending):
-        # Enqueue task again to be executed later.
-        dramatiq.get_broker().enqueue(message)
-        return
-    # -- end fix
-
     # Task options.
     task_opts = task_request["options"]
     force_interruption = task_opts["on_fail_force_interruption"]
     remove_local_dir = task_opts["on_fail_remove_local_dir"]
+    resume = task_opts.get("resume", False)
 
     # Configure data file storage.
     storage = get_available_storage()
@@ -100,6 +76,8 @@ def worker(task_request: dict, workflow_id: str):
         inputs=task_inputs,
         secrets=task_unsealed_secrets,
         storage=dfs,
+        resume=resume,
+        downstream=task_downstream,
     )
 
     task_process.debug(f"Running task {task_id} with name {task_name}")
@@ -133,6 +111,9 @@ def worker(task_request: dict, workflow_id: str):
         task_process.close(force_interruption=force_interruption, remove_local_dir=remove_local_dir)
         raise
 
+    # Segments shared by upstream tasks are kept until now, as retries read them again.
+    task_process.release_segments()
+
     # Append logging file to task result.
     remote_logging_file = task_process.close()
     task_process.info(f"Task {task_id} successfully executed")
@@ -148,43 +129,111 @@ def worker(task_request: dict, workflow_id: str):
     return data_as_json
 
 
-def set_workflow_run_state(workflow_id: str):
+def derive_workflow_status(task_counts: Dict[str, int], is_revoked: bool = False) -> WorkflowStatus:
     """
-    Sets workflow run status.
-    TODO Global lock to update status.
+    Derives workflow status from the number of its tasks per status.
+    """
+    total = sum(task_counts.values())
+
+    def _count(status: TaskStatus) -> int:
+        return task_counts.get(status.value, 0)
+
+    if is_revoked:
+        return WorkflowStatus.STATUS_REVOKED
+    elif _count(TaskStatus.STATUS_DONE) == total:
+        return WorkflowStatus.STATUS_DONE
+    elif _count(TaskStatus.STATUS_FAILED) > 0:
+        return WorkflowStatus.STATUS_FAILED
+    elif _count(TaskStatus.STATUS_PENDING) > 0:
+        return WorkflowStatus.STATUS_PENDING
+    elif _count(TaskStatus.STATUS_RUNNING) > 0:
+        return WorkflowStatus.STATUS_RUNNING
+    else:
+        return WorkflowStatus.STATUS_UNKNOWN
+
+
+def set_workflow_run_state(
+    workflow_id: str, from_status: Optional[TaskStatus], to_status: TaskStatus
+) -> Tuple[Optional[WorkflowStatus], int]:
+    """
+    Sets workflow run status after one of its tasks moved from `from_status` to `to_status`.
+    Task counters are updated atomically, and statuses derived from outdated counters are discarded.
+    Returns the new status, or `None` if it was discarded, along with the version of the task counters.
     """
     db = get_db_connection()
 
-    workflow = WorkflowManager(db).find_one(id=workflow_id)
-    tasks = TaskManager(db).find(parent=workflow_id)
-
-    tasks_statuses_only = []
-    for task in tasks:
-        status = task.status.upper()
-        tasks_statuses_only.append(status)
-
-    # Append global status based on task statuses.
-    def _check(comp: Callable, stats: list) -> bool:
-        return comp([s in stats for s in tasks_statuses_only])
-
-    if workflow.is_revoked:
-        workflow_status = WorkflowStatus.STATUS_REVOKED
-    elif _check(all, [TaskStatus.STATUS_DONE]):
-        workflow_status = WorkflowStatus.STATUS_DONE
-    elif _check(any, [TaskStatus.STATUS_FAILED]):
-        workflow_status = WorkflowStatus.STATUS_FAILED
-    elif _check(all, [TaskStatus.STATUS_PENDING]):
-        workflow_status = WorkflowStatus.STATUS_PENDING
-    elif _check(any, [TaskStatus.STATUS_PENDING]) and not _check(any, [TaskStatus.STATUS_FAILED]):
-        workflow_status = WorkflowStatus.STATUS_PENDING
-    elif _check(any, [TaskStatus.STATUS_RUNNING]) and not _check(any, [TaskStatus.STATUS_FAILED]):
-        workflow_status = WorkflowStatus.STATUS_RUNNING
-    else:
-        workflow_status = WorkflowStatus.STATUS_UNKNOWN
+    workflow, seq = WorkflowManager(db).count_tasks(workflow_id, from_status=from_status, to_status=to_status)
+
+    if workflow:
+        workflow_status = derive_workflow_status(workflow.task_counts, is_revoked=workflow.is_revoked)
+        if WorkflowManager(db).set_status(workflow_id, workflow_status, seq=seq):
+            return workflow_status, seq
+
+    return None, seq
+
 
-    WorkflowManager(db).create_or_update_from_id(
-        workflow_id=workflow_id, updated_at=datetime.now(), status=workflow_status
+def on_transition(task: TaskInDb, to_status: TaskStatus):
+    """
+    Propagates the transition of `task` (as it was before) to `to_status`: releases its downstream tasks,
+    updates workflow status and notifies watchers of the workflow.
+    """
+    dispatch_downstream(task)
+    workflow_status, seq = set_workflow_run_state(task.parent, from_status=task.status, to_status=to_status)
+
+    event = WorkflowEvent(
+        seq=seq,
+        workflow_id=task.parent,
+        task_id=task.id,
+        task_name=task.name,
+        task_status=to_status,
+        workflow_status=workflow_status,
+        created_at=datetime.now(),
     )
+    EventManager(get_db_connection()).publish(event)
+
+
+def dispatch_downstream(task: TaskInDb):
+    """
+    Sends the tasks waiting for `task` which are not waiting for any other task.
+    """
+    db = get_db_connection()
+
+    messages = TaskManager(db).release(parent=task.parent, upstream_name=task.name)
+    enqueue_many([dramatiq.Message(**message) for message in messages])
+
+
+def enqueue_many(messages: List[dramatiq.Message]):
+    """
+    Sends `messages` to the broker at once. With RabbitMQ, messages are published within a single
+    transaction on a dedicated channel, so that the broker confirms all of them in one round trip.
+    """
+    broker = dramatiq.get_broker()
+
+    if len(messages) < 2 or not isinstance(broker, RabbitmqBroker):
+        for message in messages:
+            broker.enqueue(message)
+        return
+
+    for queue_name in {message.queue_name for message in messages}:
+        broker.declare_queue(queue_name, ensure=True)
+
+    channel = broker.connection.channel()
+    try:
+        channel.tx_select()
+        for message in messages:
+            broker.emit_before("enqueue", message, None)
+            channel.basic_publish(
+                exchange="",
+                routing_key=message.queue_name,
+                body=message.encode(),
+                properties=pika.BasicProperties(delivery_mode=2, priority=message.options.get("broker_priority")),
+            )
+        channel.tx_commit()
+    finally:
+        channel.close()
+
+    for message in messages:
+        broker.emit_after("enqueue", message, None)
 
 
 def set_running(message: MessageProxy):
@@ -193,14 +242,15 @@ def set_running(message: MessageProxy):
     """
     db = get_db_connection()
 
-    task = TaskManager(db).create_or_update_from_id(
+    task = TaskManager(db).update_status(
         message.message_id,
         status=TaskStatus.STATUS_RUNNING,
+        started_at=datetime.now(),
         updated_at=datetime.now(),
     )
 
-    task_with_status = TaskManager(db).find_one(id=task.id)
-    set_workflow_run_state(workflow_id=task_with_status.parent)
+    if task:
+        on_transition(task, to_status=TaskStatus.STATUS_RUNNING)
 
 
 def set_success(message_id: str, result_data: str):
@@ -210,15 +260,15 @@ def set_success(message_id: str, result_data: str):
     db = get_db_connection()
     task_result = TaskResult.parse_raw(result_data)
 
-    task = TaskManager(db).create_or_update_from_id(
+    task = TaskManager(db).update_status(
         message_id,
         status=TaskStatus.STATUS_DONE,
         updated_at=datetime.now(),
         result=task_result,
     )
 
-    task_with_status = TaskManager(db).find_one(id=task.id)
-    set_workflow_run_state(workflow_id=task_with_status.parent)
+    if task:
+        on_transition(task, to_status=TaskStatus.STATUS_DONE)
 
 
 @dramatiq.actor(queue_name=settings.DEFAULT_ACTOR_OPTS.queue_name)
@@ -229,12 +279,12 @@ def set_failure(message, exception_data):
     db = get_db_connection()
     task_result = TaskResult(message=exception_data)
 
-    task = TaskManager(db).create_or_update_from_id(
+    task = TaskManager(db).update_status(
         message["message_id"],
         status=TaskStatus.STATUS_FAILED,
         updated_at=datetime.now(),
         result=task_result,
     )
 
-    task_with_status = TaskManager(db).find_one(id=task.id)
-    set_workflow_run_state(workflow_id=task_with_status.parent)
+    if task:
+        on_transition(task, to_status=TaskStatus.STATUS_FAILED)
@@ -20,10 +20,11 @@ def execute(pcs: Process, x: int, y: int):
     """
     pcs.info([f"Generating point ({x},{y},?)"])
 
-    # send to downstream
+    points = []
     for i in range(10):
         z = random.randint(0, 10)
-        point = Point(x, y, z)
+        points.append(Point(x, y, z))
 
-        pcs.info([f"Sending {i}"])
-        pcs.to_downstream(point)
+    # send to downstream as a single batch
+    pcs.info([f"Sending {len(points)} points"])
+    pcs.to_downstream_many(points)